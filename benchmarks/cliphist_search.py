@@ -0,0 +1,84 @@
+"""Per-keystroke latency of clipboard history search over 5,000 entries.
+
+Compares the in-memory `ClipModel` (ranked fuzzy search) against the previous
+approach of re-parsing the whole `cliphist list` output on every keystroke with
+a plain substring test. The subprocess spawn and the widget rebuild of the old
+path are not included, so its numbers are a lower bound.
+
+    python benchmarks/cliphist_search.py [entries]
+"""
+import random
+import statistics
+import string
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from utils.cliphist import ClipModel
+
+
+QUERIES = ("h", "ht", "htt", "http", "https", "https:", "git", "grep -r", "image", "пароль")
+
+
+def make_listing(count: int) -> str:
+    rnd = random.Random(42)
+    words = ["".join(rnd.choices(string.ascii_letters, k=rnd.randint(3, 10))) for _ in range(2000)]
+    words += ["https://example.org/path", "git", "commit", "grep", "-r", "пароль", "Привет"]
+    lines = []
+    for clip_id in range(count, 0, -1):
+        if rnd.random() < 0.1:
+            w, h = rnd.choice(((1920, 1080), (3840, 2160), (800, 600)))
+            lines.append(f"{clip_id}\t[[ binary data {rnd.randint(50, 9000)} KiB png {w}x{h} ]]")
+        else:
+            lines.append(f"{clip_id}\t{' '.join(rnd.choices(words, k=rnd.randint(1, 20)))}")
+    return "\n".join(lines)
+
+
+def old_filter(raw: str, search: str):
+    result = []
+    for line in raw.splitlines():
+        if search and search not in line.lower():
+            continue
+        parts = line.split("\t", 1)
+        result.append((parts[0], parts[1] if len(parts) > 1 else line))
+    return result
+
+
+def measure(fn, queries, repeat=20):
+    samples = []
+    for _ in range(repeat):
+        for query in queries:
+            start = time.perf_counter()
+            fn(query)
+            samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return statistics.mean(samples), samples[int(len(samples) * 0.95)], samples[-1]
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    raw = make_listing(count)
+
+    model = ClipModel()
+    start = time.perf_counter()
+    model.apply_listing(raw)
+    load_ms = (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    model.apply_listing(raw)
+    reload_ms = (time.perf_counter() - start) * 1000
+
+    # Печать по символу: каждый запрос — отдельное нажатие клавиши
+    typed = [q[:i] for q in QUERIES for i in range(1, len(q) + 1)]
+
+    print(f"entries: {count}")
+    print(f"initial load: {load_ms:.2f} ms, unchanged reload: {reload_ms:.2f} ms")
+    for name, fn in (("in-memory model", model.filter), ("re-parse listing", lambda q: old_filter(raw, q.lower()))):
+        mean, p95, worst = measure(fn, typed)
+        print(f"{name:>17}: mean {mean:.3f} ms, p95 {p95:.3f} ms, max {worst:.3f} ms per keystroke")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+"""Time-to-all-thumbnails and peak RSS for the wallpaper picker.
+
+Compares the process-pool `Thumbnailer` (JPEG decoded at reduced scale,
+crop + reduce + LANCZOS in one resize) against the previous approach: full
+decode, crop, `thumbnail(LANCZOS)` and an optimized PNG save in a 4-thread
+pool. Each engine runs in a fresh interpreter so peak RSS is not shared
+between them; for the process pool the largest worker is reported as well.
+
+The image set (JPEG/PNG/WebP at 3840x2160 and 7680x4320) is generated once
+into the directory and reused on later runs.
+
+    python benchmarks/wallpaper_thumbnails.py [directory] [count]
+"""
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from PIL import Image, ImageDraw
+
+from utils.image_pool import get_image_pool
+from utils.thumbnailer import Thumbnailer
+
+
+SIZE = 96
+RESOLUTIONS = ((3840, 2160), (7680, 4320))
+FORMATS = (("jpg", "JPEG", {"quality": 90}), ("png", "PNG", {"compress_level": 1}), ("webp", "WEBP", {"quality": 85}))
+
+
+def make_images(directory: Path, count: int):
+    rnd = random.Random(42)
+    directory.mkdir(parents=True, exist_ok=True)
+    existing = {p.name for p in directory.iterdir()}
+    # Один шаблон на разрешение; файлы отличаются прямоугольниками поверх него
+    bases = {}
+    for res in RESOLUTIONS:
+        gradient = Image.linear_gradient("L").resize(res)
+        bases[res] = Image.merge("RGB", (gradient, gradient.transpose(Image.Transpose.ROTATE_180), gradient.rotate(90, expand=False)))
+
+    for i in range(count):
+        res = RESOLUTIONS[1] if i % 4 == 0 else RESOLUTIONS[0]  # четверть — 8K
+        ext, fmt, params = FORMATS[i % len(FORMATS)]
+        name = f"wall-{i:04d}.{ext}"
+        if name in existing:
+            continue
+        img = bases[res].copy()
+        draw = ImageDraw.Draw(img)
+        w, h = res
+        for _ in range(12):
+            x, y = rnd.randrange(w), rnd.randrange(h)
+            draw.rectangle((x, y, x + rnd.randrange(w // 4), y + rnd.randrange(h // 4)),
+                           fill=tuple(rnd.randrange(256) for _ in range(3)))
+        img.save(directory / name, fmt, **params)
+        print(f"generated {name}", file=sys.stderr)
+
+
+def old_thumbnail(source: Path, dest: Path):
+    try:
+        with Image.open(source) as img:
+            w, h = img.size
+            side = min(w, h)
+            left, top = (w - side) // 2, (h - side) // 2
+            img_cropped = img.crop((left, top, left + side, top + side))
+            img_cropped.thumbnail((SIZE, SIZE), Image.Resampling.LANCZOS)
+            img_cropped.save(dest, "PNG", optimize=True)
+        return True
+    except Exception:
+        return False
+
+
+def run_old(files, out: Path):
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        first = []
+        def job(path):
+            ok = old_thumbnail(path, out / f"{path.stem}.png")
+            if not first:
+                first.append(time.perf_counter())
+            return ok
+        start = time.perf_counter()
+        done = sum(executor.map(job, files))
+    return done, first[0] - start if first else 0.0, time.perf_counter() - start, None
+
+
+def pool_peak_rss():
+    # Процессы пула — дети сервера forkserver, а не этого процесса, поэтому
+    # RUSAGE_CHILDREN их не видит: пик читается из /proc, пока они живы
+    executor = get_image_pool()._executor
+    peak = 0
+    for pid in list(executor._processes) if executor is not None else ():
+        try:
+            with open(f"/proc/{pid}/status") as f:
+                for line in f:
+                    if line.startswith("VmHWM:"):
+                        peak = max(peak, int(line.split()[1]))
+        except OSError:
+            continue
+    return peak / 1024
+
+
+def run_new(files, out: Path):
+    finished = threading.Event()
+    state = {"left": len(files), "done": 0, "first": None}
+    lock = threading.Lock()
+
+    def on_ready(key, data, _token):
+        with lock:
+            if state["first"] is None:
+                state["first"] = time.perf_counter()
+            state["done"] += data is not None
+            state["left"] -= 1
+            if not state["left"]:
+                finished.set()
+
+    thumbnailer = Thumbnailer(SIZE, on_ready)
+    start = time.perf_counter()
+    for priority, path in enumerate(files):
+        thumbnailer.request(path.name, str(path), priority)
+    finished.wait()
+    elapsed = time.perf_counter() - start
+    worker_rss = pool_peak_rss()
+    thumbnailer.shutdown(wait=True)
+    get_image_pool().shutdown(wait=True)
+    return state["done"], state["first"] - start, elapsed, worker_rss
+
+
+def child(engine: str, directory: Path):
+    files = sorted(p for p in directory.iterdir() if p.suffix in (".jpg", ".png", ".webp"))
+    with tempfile.TemporaryDirectory() as out:
+        done, first, total, worker_rss = (run_new if engine == "new" else run_old)(files, Path(out))
+    self_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    workers = f", largest worker {worker_rss:.0f} MiB" if worker_rss is not None else ""
+    print(f"{engine:>3}: {done}/{len(files)} thumbnails, first after {first * 1000:.0f} ms, "
+          f"all after {total:.2f} s, peak RSS {self_rss:.0f} MiB{workers}")
+
+
+def main():
+    if len(sys.argv) > 3 and sys.argv[1] == "--generate":
+        make_images(Path(sys.argv[2]), int(sys.argv[3]))
+        return
+    if len(sys.argv) > 3 and sys.argv[1] == "--engine":
+        child(sys.argv[2], Path(sys.argv[3]))
+        return
+
+    directory = Path(sys.argv[1]) if len(sys.argv) > 1 else Path(tempfile.gettempdir()) / "vidgex-wallpaper-bench"
+    count = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+    # Всё тяжёлое — в отдельных процессах: Linux переносит ru_maxrss через
+    # fork + exec, и пик генератора иначе попал бы в замеры
+    subprocess.run([sys.executable, __file__, "--generate", str(directory), str(count)], check=True)
+
+    print(f"images: {count} in {directory}, cpus: {os.cpu_count()}")
+    for engine in ("old", "new"):
+        subprocess.run([sys.executable, __file__, "--engine", engine, str(directory)], check=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,22 +2,19 @@ import sys
 import signal
 import atexit
 import setproctitle
-from typing import Dict, List, Optional, Tuple, Callable, Any
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple, Callable, Any
 
-from fabric import Application
-from fabric.utils import get_relative_path
-
-from modules.Panel.Dashboard_Bar.Widgets.Notifications.popup import NotificationPopup
-from modules.Panel.notch import Notch
-from modules.Panel.Dashboard_Bar.bar import Bar
-from widgets.corners import Corners
-from modules.Dock.dock import Dock
+# Fabric, GTK и модули UI импортируются только при запуске: процессы пула
+# изображений (utils.image_pool, forkserver) заново импортируют main.py как
+# __mp_main__, и там он не должен тянуть за собой UI
+if TYPE_CHECKING:
+    from fabric import Application
 
 class ShellManager:
     __slots__ = ('app', 'components', 'cleanup_handlers', '_cleaned_up')
 
     def __init__(self):
-        self.app: Optional[Application] = None
+        self.app: Optional["Application"] = None
         self.components: Dict[int, Dict[str, Any]] = {}
         self.cleanup_handlers: List[Callable[[], None]] = []
         self._cleaned_up: bool = False
@@ -78,6 +75,12 @@ class ShellManager:
             return None, False, [{'id': 0, 'name': 'default'}]
 
     def create_components(self, monitor_id: int, multi_monitor: bool, app_widgets: List[Any], monitor_manager: Optional[Any]) -> Dict[str, Any]:
+        from modules.Panel.Dashboard_Bar.Widgets.Notifications.popup import NotificationPopup
+        from modules.Panel.notch import Notch
+        from modules.Panel.Dashboard_Bar.bar import Bar
+        from widgets.corners import Corners
+        from modules.Dock.dock import Dock
+
         args = (monitor_id,) if multi_monitor else ()
         
         bar = Bar(*args)
@@ -115,6 +118,9 @@ class ShellManager:
         return instances
 
     def run(self) -> int:
+        from fabric import Application
+        from fabric.utils import get_relative_path
+
         setproctitle.setproctitle("vidgex-shell")
         
         monitor_manager, multi_monitor, monitors = self.setup_monitors()
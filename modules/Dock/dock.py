@@ -1,7 +1,6 @@
 from typing import Any, Dict, List, Optional, Union
 from fabric.hyprland.widgets import get_hyprland_connection
 from fabric.utils import exec_shell_command, exec_shell_command_async
-from fabric.utils.helpers import get_desktop_applications
 from fabric.widgets.box import Box
 from fabric.widgets.button import Button
 from fabric.widgets.eventbox import EventBox
@@ -12,7 +11,9 @@ import json
 import cairo
 
 from widgets.corners import MyCorner
-from utils.icon_resolver import IconResolver
+from utils.icon_resolver import get_icon_resolver
+from services.desktop_apps import DesktopAppIndex, normalize_class
+from services.windows import WindowIndex
 from widgets.wayland import WaylandWindow as Window
 
 def createSurfaceFromWidget(widget):
@@ -64,11 +65,16 @@ class Dock(Window):
         Dock._instances.append(self)
         
         self.conn = get_hyprland_connection()
-        self.icon_resolver = IconResolver()
-
-        self._all_apps = get_desktop_applications()
-        self.app_identifiers = self._build_app_identifiers_map()
+        # Геометрия окон и активный рабочий стол — общие для всех доков
+        self.window_index = WindowIndex.get_initial()
+        self._window_index_handlers = []
+        self.icon_resolver = get_icon_resolver()
+
+        # Приложения и карта идентификаторов общие для всех доков
+        self.app_index = DesktopAppIndex.get_initial()
+        self._app_index_handler = self.app_index.connect("changed", self._schedule_full_update)
         
+        self._buttons: Dict[str, Button] = {}  # класс окна -> кнопка
         self._drag_in_progress = False
         self.is_mouse_over_dock_area = False
         self._current_active_window_class: Optional[str] = None
@@ -151,17 +157,21 @@ class Dock(Window):
         self.view.connect("drag-end", self.on_drag_end)
 
     def _setup_event_handlers(self):
+        # Окна, рабочие столы и фокус приходят из общего индекса: один запрос
+        # j/clients на все доки, смена рабочего стола — вообще без IPC
+        index_events = [
+            ("clients-changed", self._schedule_full_update),
+            ("workspace-changed", self._schedule_occlusion_check),
+            ("active-changed", self._on_active_window_event),
+        ]
+        for event, handler in index_events:
+            self._window_index_handlers.append(self.window_index.connect(event, handler))
+
         events = [
-            ("event::openwindow", self._schedule_full_update),
-            ("event::closewindow", self._schedule_full_update),
-            ("event::movewindow", self._schedule_occlusion_check),
-            ("event::resizewindow", self._schedule_occlusion_check),
-            ("event::workspace", self._schedule_occlusion_check),
-            ("event::activewindow", self._on_active_window_event),
             ("event::monitoradded", self._update_monitor_info_once),
             ("event::monitorremoved", self._update_monitor_info_once)
         ]
-        
+
         for event, handler in events:
             self.conn.connect(event, handler)
 
@@ -194,20 +204,18 @@ class Dock(Window):
         self._update_pending = False
         if self._destroyed: return False
 
-        clients = self._get_hyprland_json("j/clients")
-        self._rebuild_dock_icons(clients)
-        
+        self._reconcile_dock_icons(self.window_index.clients)
+
         if not self.integrated_mode:
-            self._perform_occlusion_logic(clients)
-            
+            self._perform_occlusion_logic()
+
         return False
 
     def _perform_occlusion_check(self):
         self._occlusion_pending = False
         if self._destroyed or self.integrated_mode: return False
-        
-        clients = self._get_hyprland_json("j/clients")
-        self._perform_occlusion_logic(clients)
+
+        self._perform_occlusion_logic()
         return False
 
     def _get_hyprland_json(self, command: str) -> List[Dict[str, Any]]:
@@ -264,41 +272,18 @@ class Dock(Window):
             'h': estimated_dock_height
         }
 
-    def _perform_occlusion_logic(self, clients: List[Dict[str, Any]]) -> None:
+    def _perform_occlusion_logic(self) -> None:
         if self.integrated_mode: return
 
         self._ensure_geometry()
-        
-        if not self.dock_geometry: return
-
-        try:
-            active_ws_data = json.loads(self.conn.send_command("j/activeworkspace").reply.decode())
-            current_ws_id = active_ws_data.get("id", 0)
-        except:
-            current_ws_id = 0
-
-        d_x = self.dock_geometry['x']
-        d_y = self.dock_geometry['y']
-        d_w = self.dock_geometry['w']
-        d_h = self.dock_geometry['h']
-        
-        overlap = False
-        for win in clients:
-            if win.get("workspace", {}).get("id") != current_ws_id:
-                continue
-            if win.get("monitor") != self.monitor_id:
-                continue
 
-            if win.get("floating") and not win.get("fullscreen"):
-                 continue
+        if not self.dock_geometry: return
 
-            w_at = win.get("at", [0, 0])
-            w_sz = win.get("size", [0, 0])
-            
-            if (w_at[0] < d_x + d_w) and (w_at[0] + w_sz[0] > d_x):
-                if (w_at[1] < d_y + d_h) and (w_at[1] + w_sz[1] > d_y):
-                    overlap = True
-                    break
+        g = self.dock_geometry
+        # Прямоугольник дока регистрируется в индексе; повторная регистрация
+        # того же прямоугольника ничего не пересчитывает
+        self.window_index.set_region(self, self.monitor_id, (g['x'], g['y'], g['w'], g['h']))
+        overlap = self.window_index.is_occluded(self)
 
         should_hide = overlap and not self.is_mouse_over_dock_area and not self._drag_in_progress
         
@@ -311,24 +296,14 @@ class Dock(Window):
         else:
             if not is_revealed: self.dock_revealer.set_reveal_child(True)
 
-    def _build_app_identifiers_map(self) -> Dict[str, Any]:
-        identifiers = {}
-        for app in self._all_apps:
-            keys = [app.name, app.display_name, app.window_class]
-            if app.executable: keys.append(app.executable.split('/')[-1])
-            if app.command_line: keys.append(app.command_line.split()[0].split('/')[-1])
-            for k in keys:
-                if k: identifiers[str(k).lower()] = app
-        return identifiers
+    @property
+    def app_identifiers(self) -> Dict[str, Any]:
+        return self.app_index.identifiers
 
     def _normalize_class(self, name: str) -> str:
-        if not name: return ""
-        n = name.lower()
-        for s in (".bin", ".exe", ".so", "-bin", "-gtk"):
-            if n.endswith(s): return n[:-len(s)]
-        return n
+        return normalize_class(name)
 
-    def _rebuild_dock_icons(self, clients: List[Dict[str, Any]]) -> None:
+    def _reconcile_dock_icons(self, clients: List[Dict[str, Any]]) -> None:
         running_windows: Dict[str, List[Dict[str, Any]]] = {}
         for c in clients:
             raw_id = c.get("initialClass") or c.get("class") or c.get("title", "")
@@ -341,17 +316,23 @@ class Dock(Window):
             if norm != raw_id_lower:
                 running_windows.setdefault(norm, []).extend(running_windows[raw_id_lower])
 
-        new_children = []
+        # Сверка с текущими кнопками: новые создаются, исчезнувшие удаляются,
+        # остальные обновляются на месте вместе с уже загруженными иконками
         processed_classes = set()
+        layout_changed = False
 
         for class_name, instances in running_windows.items():
             if class_name in processed_classes: continue
-            
-            app = self.app_identifiers.get(class_name)
-            if not app:
-                norm = self._normalize_class(class_name)
-                app = self.app_identifiers.get(norm)
-            
+            processed_classes.add(class_name)
+
+            # Общий для всех доков резолвер с кэшем (включая промахи)
+            app = self.app_index.resolve_class(class_name)
+
+            btn = self._buttons.get(class_name)
+            if btn is not None and btn.app_data["app"] is app:
+                self._update_button(btn, instances)
+                continue
+
             identifier = {
                 "name": app.name,
                 "display_name": app.display_name,
@@ -360,46 +341,62 @@ class Dock(Window):
                 "command_line": app.command_line
             } if app else class_name
 
-            btn = self.create_button(identifier, instances, class_name)
-            new_children.append(btn)
-            processed_classes.add(class_name)
+            new_btn = self.create_button(identifier, instances, class_name, app)
+            self.view.add(new_btn)
+            if btn is not None:
+                # Приложение для класса сменилось (обновился индекс) — на то же место
+                self.view.reorder_child(new_btn, self.view.get_children().index(btn))
+                btn.destroy()
+            new_btn.show_all()
+            self._buttons[class_name] = new_btn
+            layout_changed = True
+
+        for class_name in [c for c in self._buttons if c not in processed_classes]:
+            self._buttons.pop(class_name).destroy()
+            layout_changed = True
+
+        if layout_changed and not self.integrated_mode:
+            self.dock_geometry = None
 
-        old_children = self.view.get_children()
-        for child in old_children:
-            child.destroy() 
-            
-        self.view.children = new_children
-        
-        if not self.integrated_mode:
-            self.dock_geometry = None 
-            
         self._update_active_window_state()
 
-    def create_button(self, app_identifier: Union[Dict[str, Any], str], instances: List[Dict[str, Any]], window_class: str):
-        desktop_app = None
-        if isinstance(app_identifier, dict) and "name" in app_identifier:
-             desktop_app = self.app_identifiers.get(str(app_identifier["name"]).lower())
-        
-        icon_pixbuf = None
-        display_name = None
-        
+    def _update_button(self, btn: Button, instances: List[Dict[str, Any]]) -> None:
+        btn.app_data["instances"] = instances
+        if instances:
+            btn.add_style_class("instance")
+        else:
+            btn.remove_style_class("instance")
+        if not btn.app_data["app"] and instances and instances[0].get("title"):
+            btn.set_tooltip_text(instances[0]["title"])
+        # Размер иконок сменился (другое разрешение монитора) — перезагружаем на месте
+        if btn.app_data["icon_size"] != self.icon_size:
+            btn.app_data["icon_size"] = self.icon_size
+            btn.app_data["image"].set_from_pixbuf(self._load_icon(btn.app_data["id"], btn.app_data["app"]))
+
+    def _load_icon(self, app_identifier: Union[Dict[str, Any], str], desktop_app=None):
         # Используем self.icon_size, который вычисляется математически
         current_icon_size = self.icon_size
+        icon_pixbuf = desktop_app.get_icon_pixbuf(size=current_icon_size) if desktop_app else None
 
-        if desktop_app:
-            icon_pixbuf = desktop_app.get_icon_pixbuf(size=current_icon_size)
-            display_name = desktop_app.display_name or desktop_app.name
-        
         id_val = app_identifier["name"] if isinstance(app_identifier, dict) else app_identifier
-        
+
         if not icon_pixbuf:
             icon_pixbuf = self.icon_resolver.get_icon_pixbuf(id_val, current_icon_size)
         if not icon_pixbuf:
             icon_pixbuf = self.icon_resolver.get_icon_pixbuf("application-x-executable-symbolic", current_icon_size)
         if not icon_pixbuf: 
             icon_pixbuf = self.icon_resolver.get_icon_pixbuf("image-missing", current_icon_size)
+        return icon_pixbuf
 
-        content = Box(name="dock-icon", orientation="v", h_align="center", children=[Image(pixbuf=icon_pixbuf)])
+    def create_button(self, app_identifier: Union[Dict[str, Any], str], instances: List[Dict[str, Any]], window_class: str, desktop_app=None):
+        if desktop_app is None and isinstance(app_identifier, dict) and "name" in app_identifier:
+             desktop_app = self.app_identifiers.get(str(app_identifier["name"]).lower())
+        
+        display_name = (desktop_app.display_name or desktop_app.name) if desktop_app else None
+        id_val = app_identifier["name"] if isinstance(app_identifier, dict) else app_identifier
+
+        image = Image(pixbuf=self._load_icon(app_identifier, desktop_app))
+        content = Box(name="dock-icon", orientation="v", h_align="center", children=[image])
         
         tooltip = display_name or str(id_val)
         if not display_name and instances and instances[0].get("title"):
@@ -407,7 +404,8 @@ class Dock(Window):
 
         btn = Button(
             child=content,
-            on_clicked=lambda *a: self.handle_app(app_identifier, instances, desktop_app),
+            # Окна берутся из app_data в момент клика: сверка обновляет их на месте
+            on_clicked=lambda b: self.handle_app(b.app_data["id"], b.app_data["instances"], b.app_data["app"]),
             tooltip_text=tooltip,
             name="dock-app-button",
         )
@@ -416,7 +414,9 @@ class Dock(Window):
             "id": app_identifier,
             "app": desktop_app,
             "instances": instances,
-            "win_class": window_class
+            "win_class": window_class,
+            "image": image,
+            "icon_size": self.icon_size,
         }
 
         if instances:
@@ -450,10 +450,7 @@ class Dock(Window):
                     cmd = app_identifier
                 if cmd: exec_shell_command_async(f"nohup {cmd} &")
         else:
-            try:
-                focused_addr = json.loads(self.conn.send_command("j/activewindow").reply.decode()).get("address")
-            except:
-                focused_addr = ""
+            focused_addr = self.window_index.active_address or ""
             idx = -1
             for i, inst in enumerate(instances):
                 if inst["address"] == focused_addr:
@@ -463,12 +460,9 @@ class Dock(Window):
             exec_shell_command(f"hyprctl dispatch focuswindow address:{next_inst['address']}")
 
     def _update_active_window_state(self) -> None:
-        try:
-            aw = json.loads(self.conn.send_command("j/activewindow").reply.decode())
-            cls = aw.get("initialClass") or aw.get("class")
-            self._current_active_window_class = self._normalize_class(cls) if cls else None
-        except:
-            self._current_active_window_class = None
+        aw = self.window_index.active_window()
+        cls = aw.window_class if aw else None
+        self._current_active_window_class = self._normalize_class(cls) if cls else None
         active = self._current_active_window_class
         for btn in self.view.get_children():
             btn_data = getattr(btn, "app_data", {})
@@ -538,14 +532,16 @@ class Dock(Window):
         children = self.view.get_children()
         if target not in children: return
         tgt_idx = children.index(target)
-        if src_idx != tgt_idx:
-            item = children.pop(src_idx)
-            children.insert(tgt_idx, item)
-            for child in children:
-                self.view.remove(child)
-                self.view.add(child)
-            self.view.show_all()
+        if src_idx != tgt_idx and 0 <= src_idx < len(children):
+            self.view.reorder_child(children[src_idx], tgt_idx)
 
     def destroy(self) -> None:
         self._destroyed = True
+        if self._app_index_handler:
+            self.app_index.disconnect(self._app_index_handler)
+            self._app_index_handler = None
+        for handler_id in self._window_index_handlers:
+            self.window_index.disconnect(handler_id)
+        self._window_index_handlers.clear()
+        self.window_index.remove_region(self)
         super().destroy()
\ No newline at end of file
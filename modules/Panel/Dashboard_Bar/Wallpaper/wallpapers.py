@@ -1,45 +1,26 @@
-from fabric.utils.helpers import exec_shell_command_async
 from fabric.widgets.box import Box
 from fabric.widgets.button import Button
 from fabric.widgets.entry import Entry
 from fabric.widgets.label import Label
 from fabric.widgets.scrolledwindow import ScrolledWindow
 
-from gi.repository import Gdk, GdkPixbuf, Gio, GLib, Gtk
+from gi.repository import Gdk, GLib, Gtk
 
-import hashlib
 import random
-import shutil
-import json
-from pathlib import Path
-from PIL import Image
-from concurrent.futures import ThreadPoolExecutor
-import threading
 
 import modules.icons as icons
+from services.wallpapers import WallpaperCatalog
 
 
 class WallpaperSelector(Box):
-    CACHE_DIR = Path(GLib.get_user_cache_dir()) / "vidgex-shell"
-    THUMBS_DIR = CACHE_DIR / "thumbs"
-    CONFIG_FILE = CACHE_DIR / "wallpaper_config.json"
-    WALLPAPERS_DIR = Path.home() / "Wallpapers"
-    CURRENT_WALL = Path.home() / ".current.wall"
-    THUMBNAIL_SIZE = 96
-    MAX_RECENT = 10
-    IMAGE_EXTENSIONS = frozenset({".png", ".jpg", ".jpeg", ".bmp", ".gif", ".webp"})
-    
-    SCHEMES = {
-        "scheme-tonal-spot": "Tonal Spot",
-        "scheme-content": "Content",
-        "scheme-expressive": "Expressive",
-        "scheme-fidelity": "Fidelity",
-        "scheme-fruit-salad": "Fruit Salad",
-        "scheme-monochrome": "Monochrome",
-        "scheme-neutral": "Neutral",
-        "scheme-rainbow": "Rainbow",
-    }
-    
+    """Сетка обоев одного дашборда поверх общего WallpaperCatalog.
+
+    Своими здесь остаются только фильтр поиска, выделение и окно видимых
+    миниатюр; файлы, миниатюры, конфиг и наблюдение за каталогом — общие.
+    """
+
+    PREFETCH_ROWS = 4  # Ряды сверх видимых, чьи миниатюры грузятся заранее
+
     DICE_ICONS = (
         icons.dice_1, icons.dice_2, icons.dice_3,
         icons.dice_4, icons.dice_5, icons.dice_6,
@@ -52,13 +33,11 @@ class WallpaperSelector(Box):
             orientation="v",
             **kwargs,
         )
-        
-        self._init_directories()
+
         self._init_state()
         self._create_ui()
-        self._executor.submit(self._load_wallpapers)
-        self._setup_file_monitor()
-        
+        self._setup_signals()
+
         self.show_all()
         self._randomize_dice_icon()
         self.search_entry.grab_focus()
@@ -66,42 +45,20 @@ class WallpaperSelector(Box):
     # ----------------------
     # Init
     # ----------------------
-    def _init_directories(self):
-        old_cache = self.CACHE_DIR / "wallpapers"
-        if old_cache.exists():
-            shutil.rmtree(old_cache)
-        
-        self.CACHE_DIR.mkdir(parents=True, exist_ok=True)
-        self.THUMBS_DIR.mkdir(parents=True, exist_ok=True)
-        self.WALLPAPERS_DIR.mkdir(parents=True, exist_ok=True)
-
     def _init_state(self):
-        self.files = []
-        self.thumbnails = {}
+        self._catalog = WallpaperCatalog.get_initial()
+        self._query = ""
         self.selected_index = -1
         self.is_applying_scheme = False
-        self.config = self._load_config()
-        self._executor = ThreadPoolExecutor(max_workers=4)
-        self._load_lock = threading.Lock()
-
-    def _load_config(self):
-        defaults = {
-            "current_wallpaper": None,
-            "color_scheme": "scheme-tonal-spot",
-            "recent_wallpapers": []
-        }
-        if self.CONFIG_FILE.exists():
-            with open(self.CONFIG_FILE) as f:
-                config = json.load(f)
-            return {**defaults, **config}
-        return defaults
-
-    def _save_config(self):
-        with open(self.CONFIG_FILE, 'w') as f:
-            json.dump(self.config, f, indent=2)
+        self._visible_id = 0
+        self._prepare_id = 0
+        self._handlers = []
 
     def _create_ui(self):
-        self.model = Gtk.ListStore(GdkPixbuf.Pixbuf, str)
+        # Строки общие для всех дашбордов; поиск лишь фильтрует их.
+        # Колонки: миниатюра, имя файла, имя в casefold для поиска
+        self.model = self._catalog.store.filter_new(None)
+        self.model.set_visible_func(self._row_visible)
         self.viewport = Gtk.IconView(
             name="wallpaper-icons",
             model=self.model,
@@ -133,9 +90,9 @@ class WallpaperSelector(Box):
 
         self.scheme_dropdown = Gtk.ComboBoxText(name="scheme-dropdown")
         self.scheme_dropdown.set_tooltip_text("Select color scheme")
-        for key, name in self.SCHEMES.items():
+        for key, name in WallpaperCatalog.SCHEMES.items():
             self.scheme_dropdown.append(key, name)
-        self.scheme_dropdown.set_active_id(self.config.get("color_scheme", "scheme-tonal-spot"))
+        self.scheme_dropdown.set_active_id(self._catalog.scheme)
         self.scheme_dropdown.connect("changed", self._on_scheme_changed)
 
         self.random_btn = Button(
@@ -153,161 +110,94 @@ class WallpaperSelector(Box):
         self.add(header)
         self.pack_start(self.scrolled_window, True, True, 0)
 
-    def _load_wallpapers(self):
-        files = []
-        for entry in self.WALLPAPERS_DIR.iterdir():
-            if entry.is_file() and self._is_image(entry.name):
-                normalized = self._normalize_filename(entry)
-                if normalized:
-                    files.append(normalized)
-
-        with self._load_lock:
-            self.files = sorted(files)
-
-        GLib.idle_add(self._populate_model_initial)
-        GLib.idle_add(self._load_visible_thumbnails)
-        GLib.idle_add(self._apply_saved_config)
-
-    def _populate_model_initial(self):
-        self.model.clear()
-        for filename in self.files:
-            self.model.append([None, filename])  # Pixbuf пока None
-
-    def _load_visible_thumbnails(self):
-        visible_count = min(len(self.files), 50)  # первые 50
-        for i in range(visible_count):
-            filename = self.files[i]
-            if filename not in self.thumbnails:
-                self._executor.submit(self._load_thumbnail, filename)
-        return False
-
-    def _normalize_filename(self, entry):
-        name = entry.name
-        new_name = name.lower().replace(" ", "-")
-        new_path = self.WALLPAPERS_DIR / new_name
-        if new_name != name and not new_path.exists():
-            entry.rename(new_path)
-            return new_name
-        return name
-
-    def _load_thumbnail(self, filename):
-        cache_path = self._get_cache_path(filename)
-        full_path = self.WALLPAPERS_DIR / filename
-
-        if not cache_path.exists():
-            if not self._generate_thumbnail(full_path, cache_path):
-                return
-
-        def create_pixbuf():
-            pixbuf = GdkPixbuf.Pixbuf.new_from_file(str(cache_path))
-            with self._load_lock:
-                self.thumbnails[filename] = pixbuf
-            # обновляем модель
-            for row in self.model:
-                if row[1] == filename:
-                    row[0] = pixbuf
-            return False
+    def _setup_signals(self):
+        self._handlers = [
+            self._catalog.connect("changed", self._schedule_visible_update),
+            self._catalog.connect("scheme-changed", self._on_catalog_scheme_changed),
+        ]
+        vadj = self.scrolled_window.get_vadjustment()
+        vadj.connect("value-changed", self._schedule_visible_update)
+        # "changed" приходит после раскладки, когда меняется высота содержимого
+        vadj.connect("changed", self._schedule_visible_update)
+        self._schedule_visible_update()
 
-        GLib.idle_add(create_pixbuf)
+    # ----------------------
+    # Миниатюры
+    # ----------------------
+    def _schedule_visible_update(self, *args):
+        if not self._visible_id:
+            self._visible_id = GLib.idle_add(self._update_visible)
 
-    def _generate_thumbnail(self, source, dest):
-        try:
-            with Image.open(source) as img:
-                w, h = img.size
-                side = min(w, h)
-                left, top = (w - side) // 2, (h - side) // 2
-                img_cropped = img.crop((left, top, left + side, top + side))
-                img_cropped.thumbnail((self.THUMBNAIL_SIZE, self.THUMBNAIL_SIZE), Image.Resampling.LANCZOS)
-                img_cropped.save(dest, "PNG", optimize=True)
-            return True
-        except Exception:
+    def _update_visible(self):
+        """Окно миниатюр по расстоянию от реально видимых элементов IconView."""
+        self._visible_id = 0
+        total = len(self.model)
+        if not total:
+            self._catalog.request_thumbnails(self, {})
             return False
+        visible = self.viewport.get_visible_range()
+        if visible:
+            first, last = (path.get_indices()[0] for path in visible[-2:])
+            margin = self._get_columns_count(total) * self.PREFETCH_ROWS
+        else:
+            # Сетка ещё не размещена: число колонок неизвестно, берём с запасом
+            first = last = 0
+            margin = self.PREFETCH_ROWS * 16
+        start, end = max(0, first - margin), min(total - 1, last + margin)
+
+        wanted = {}
+        it = self.model.iter_nth_child(None, start)
+        for i in range(start, end + 1):
+            if it is None:
+                break
+            # Загруженные тоже: каталог держит в памяти миниатюры из окон
+            filename = self.model.get_value(it, 1)
+            wanted[filename] = first - i if i < first else max(0, i - last)
+            it = self.model.iter_next(it)
+
+        self._catalog.request_thumbnails(self, wanted)
+        return False
+
+    def _row_visible(self, model, it, _data):
+        return not self._query or self._query in model.get_value(it, 2)
 
     def _filter_viewport(self, query=""):
-        self.model.clear()
-        query_lower = query.casefold()
-        filtered = sorted(
-            ((name, pb) for name, pb in self.thumbnails.items() if query_lower in name.casefold()),
-            key=lambda x: x[0].lower()
-        )
-        for name, pixbuf in filtered:
-            self.model.append([pixbuf, name])
+        # Без пересоздания строк: незагруженные миниатюры тоже участвуют в поиске
+        self._query = query.casefold()
+        self.model.refilter()
+        self._schedule_visible_update()
         if not query.strip():
             self.viewport.unselect_all()
             self.selected_index = -1
         elif len(self.model) > 0:
             self._update_selection(0)
 
-    def _get_cache_path(self, filename):
-        file_hash = hashlib.md5(filename.encode()).hexdigest()
-        return self.CACHE_DIR / f"{file_hash}.png"
-
-    @staticmethod
-    def _is_image(filename):
-        return Path(filename).suffix.lower() in WallpaperSelector.IMAGE_EXTENSIONS
-
-    def _apply_saved_config(self):
-        saved = self.config.get("current_wallpaper")
-        if saved and Path(saved).exists():
-            name = Path(saved).name
-            if name in self.files:
-                self._apply_wallpaper(name, notify=False)
-
-    def _apply_wallpaper(self, filename, notify=False):
-        if filename not in self.files:
-            return False
-        
-        full_path = self.WALLPAPERS_DIR / filename
-        scheme = self.scheme_dropdown.get_active_id()
-        try:
-            if self.CURRENT_WALL.exists() or self.CURRENT_WALL.is_symlink():
-                self.CURRENT_WALL.unlink()
-            self.CURRENT_WALL.symlink_to(full_path)
-        except OSError:
-            return False
-
-        exec_shell_command_async(f'awww img "{full_path}" --type outer --transition-duration 0.5 --transition-step 255 --transition-fps 60')
-        exec_shell_command_async(f'matugen image "{full_path}" --type {scheme}')
-
-        self.config["current_wallpaper"] = str(full_path)
-        self.config["color_scheme"] = scheme
-        recent = self.config.get("recent_wallpapers", [])
-        if str(full_path) in recent:
-            recent.remove(str(full_path))
-        recent.insert(0, str(full_path))
-        self.config["recent_wallpapers"] = recent[:self.MAX_RECENT]
-        self._save_config()
-
-        if notify:
-            exec_shell_command_async(f"notify-send '🎲 Wallpaper' 'Random wallpaper set 🎨' -a 'Vidgex-Shell' -i '{full_path}' -e")
-        return True
-
+    # ----------------------
+    # Применение
+    # ----------------------
     def _on_wallpaper_activated(self, iconview, path):
         filename = self.model[path][1]
-        self._apply_wallpaper(filename)
+        self._catalog.apply_wallpaper(filename)
 
     def _on_scheme_changed(self, widget):
         if self.is_applying_scheme:
             return
         scheme = widget.get_active_id()
-        if not scheme:
+        if scheme:
+            self._catalog.set_scheme(scheme)
+
+    def _on_catalog_scheme_changed(self, catalog, scheme):
+        # Схему сменили на другом мониторе: только синхронизируем выпадающий список
+        if self.scheme_dropdown.get_active_id() == scheme:
             return
         self.is_applying_scheme = True
         try:
-            self.config["color_scheme"] = scheme
-            self._save_config()
-            if self.CURRENT_WALL.is_symlink():
-                actual = self.CURRENT_WALL.resolve()
-                if actual.exists():
-                    exec_shell_command_async(f'matugen image "{actual}" -t {scheme}')
+            self.scheme_dropdown.set_active_id(scheme)
         finally:
             self.is_applying_scheme = False
 
     def set_random_wallpaper(self, widget=None, external=False):
-        if not self.files:
-            return
-        filename = random.choice(self.files)
-        if self._apply_wallpaper(filename, notify=external):
+        if self._catalog.set_random_wallpaper(notify=external):
             self._randomize_dice_icon()
 
     def _randomize_dice_icon(self):
@@ -315,63 +205,9 @@ class WallpaperSelector(Box):
         if isinstance(label, Label):
             label.set_markup(random.choice(self.DICE_ICONS))
 
-    def _setup_file_monitor(self):
-        gfile = Gio.File.new_for_path(str(self.WALLPAPERS_DIR))
-        self.file_monitor = gfile.monitor_directory(Gio.FileMonitorFlags.NONE, None)
-        self.file_monitor.connect("changed", self._on_dir_changed)
-
-        vadj = self.scrolled_window.get_vadjustment()
-        vadj.connect("value-changed", self._on_scroll)
-
-    def _on_scroll(self, adjustment):
-        start = int(adjustment.get_value())
-        page_size = int(adjustment.get_page_size())
-        total = len(self.files)
-        first_idx = max(0, int(start / self.THUMBNAIL_SIZE) - 5)
-        last_idx = min(total, int((start + page_size) / self.THUMBNAIL_SIZE) + 5)
-        for i in range(first_idx, last_idx):
-            filename = self.files[i]
-            if filename not in self.thumbnails:
-                self._executor.submit(self._load_thumbnail, filename)
-
-    def _on_dir_changed(self, monitor, file, other_file, event_type):
-        filename = file.get_basename()
-        if event_type == Gio.FileMonitorEvent.DELETED:
-            self._handle_file_deleted(filename)
-        elif event_type in (Gio.FileMonitorEvent.CREATED, Gio.FileMonitorEvent.CHANGED):
-            self._handle_file_created_or_changed(filename)
-
-    def _handle_file_deleted(self, filename):
-        if filename not in self.files:
-            return
-        with self._load_lock:
-            self.files.remove(filename)
-            self.thumbnails.pop(filename, None)
-        cache_path = self._get_cache_path(filename)
-        if cache_path.exists():
-            cache_path.unlink()
-        GLib.idle_add(self._filter_viewport, self.search_entry.get_text())
-
-    def _handle_file_created_or_changed(self, filename):
-        if not self._is_image(filename):
-            return
-        full_path = self.WALLPAPERS_DIR / filename
-        new_name = filename.lower().replace(" ", "-")
-        if new_name != filename:
-            new_path = self.WALLPAPERS_DIR / new_name
-            if not new_path.exists():
-                full_path.rename(new_path)
-                filename = new_name
-        with self._load_lock:
-            if filename not in self.files:
-                self.files.append(filename)
-                self.files.sort()
-            self.thumbnails.pop(filename, None)
-        cache_path = self._get_cache_path(filename)
-        if cache_path.exists():
-            cache_path.unlink()
-        self._executor.submit(self._load_thumbnail, filename)
-
+    # ----------------------
+    # Клавиатура
+    # ----------------------
     def _on_key_press(self, widget, event):
         state = event.state
         key = event.keyval
@@ -388,7 +224,7 @@ class WallpaperSelector(Box):
         return False
 
     def _handle_scheme_navigation(self, key):
-        schemes_list = list(self.SCHEMES.keys())
+        schemes_list = list(WallpaperCatalog.SCHEMES)
         current_id = self.scheme_dropdown.get_active_id()
         current_idx = schemes_list.index(current_id) if current_id in schemes_list else 0
         if key == Gdk.KEY_Up:
@@ -441,6 +277,18 @@ class WallpaperSelector(Box):
         self.viewport.select_path(path)
         self.viewport.scroll_to_path(path, False, 0.5, 0.5)
         self.selected_index = index
+        # Выделенные клавиатурой обои, скорее всего, сейчас применят; пока
+        # выделение бежит по сетке, варианты не считаются
+        if self._prepare_id:
+            GLib.source_remove(self._prepare_id)
+        self._prepare_id = GLib.timeout_add(400, self._prepare_selected)
+
+    def _prepare_selected(self):
+        self._prepare_id = 0
+        if 0 <= self.selected_index < len(self.model):
+            filename = self.model[self.selected_index][1]
+            self._catalog.prepare(filename)
+        return False
 
     def _on_focus_out(self, widget, event):
         if self.get_mapped():
@@ -448,16 +296,15 @@ class WallpaperSelector(Box):
         return False
 
     def destroy(self):
-        if hasattr(self, '_executor') and self._executor:
-            self._executor.shutdown(wait=False)
-            self._executor = None
-        if hasattr(self, 'file_monitor') and self.file_monitor:
-            self.file_monitor.cancel()
-            self.file_monitor = None
-        self.thumbnails.clear()
-        self.files.clear()
+        for handler in self._handlers:
+            self._catalog.disconnect(handler)
+        self._handlers.clear()
+        # Каталог общий и живёт дальше; снимаем только заявку на миниатюры
+        self._catalog.request_thumbnails(self, {})
+        if self._visible_id:
+            GLib.source_remove(self._visible_id)
+            self._visible_id = 0
+        if self._prepare_id:
+            GLib.source_remove(self._prepare_id)
+            self._prepare_id = 0
         super().destroy()
-
-    def __del__(self):
-        if hasattr(self, '_executor') and self._executor:
-            self._executor.shutdown(wait=False)
@@ -2,6 +2,7 @@ from fabric.notifications.service import Notifications
 from fabric.widgets.box import Box
 from fabric.widgets.button import Button
 from fabric.widgets.centerbox import CenterBox
+from fabric.widgets.entry import Entry
 from fabric.widgets.label import Label
 from fabric.widgets.revealer import Revealer
 from fabric.widgets.scrolledwindow import ScrolledWindow
@@ -20,6 +21,7 @@ from .notification_box import (
     NotificationBox, cache_notification_pixbuf, load_scaled_pixbuf, 
     get_history_ignored_apps, PERSISTENT_HISTORY_FILE, MAX_NOTIFICATION_HISTORY, 
     MAX_POPUP_NOTIFICATIONS, PERSISTENT_DIR, MAX_CACHED_IMAGES, HistoricalNotification)
+from .search import NotificationIndex
 
 
 class NotificationHistory(Box):
@@ -28,6 +30,11 @@ class NotificationHistory(Box):
 
         self.containers = []
         self._cleanup_timer_id = None
+        self._index = NotificationIndex()
+        self._containers_by_key = {}
+        self._search_query = ""
+        self._search_matches = None
+        self._date_groups = []
         
         self.header_label = Label(name="nhh", label="Notifications", h_align="start", h_expand=True)
         self.header_switch = Gtk.Switch(name="dnd-switch")
@@ -52,6 +59,14 @@ class NotificationHistory(Box):
             center_children=[self.header_label],
             end_children=[self.header_clean],
         )
+
+        self.search_entry = Entry(
+            name="notification-search-entry",
+            placeholder="Search notifications...",
+            h_expand=True,
+            notify_text=lambda entry, *_: self.filter_history(entry.get_text()),
+        )
+        self.search_entry.props.xalign = 0.5
         
         self.notifications_list = Box(
             name="notifications-list",
@@ -98,6 +113,7 @@ class NotificationHistory(Box):
         self.persistent_notifications = []
         
         self.add(self.history_header)
+        self.add(self.search_entry)
         self.add(self.scrolled_window)
         
         GLib.idle_add(self._load_persistent_history().__next__)
@@ -165,6 +181,7 @@ class NotificationHistory(Box):
 
         current_date_header = None
         sorted_containers = sorted(self.containers, key=lambda x: x.arrival_time, reverse=True)
+        self._date_groups = []
         
         for container in sorted_containers:
             arrival_time = container.arrival_time
@@ -173,9 +190,11 @@ class NotificationHistory(Box):
             if date_header != current_date_header:
                 sep = self.create_date_separator(date_header)
                 self.notifications_list.add(sep)
+                self._date_groups.append((sep, []))
                 current_date_header = date_header
             
             self.notifications_list.add(container)
+            self._date_groups[-1][1].append(container)
 
         if not self.containers:
             for child in list(self.notifications_list.get_children()):
@@ -183,8 +202,44 @@ class NotificationHistory(Box):
                     self.notifications_list.remove(child)
 
         self.notifications_list.show_all()
+        self._search_matches = self._index.search(self._search_query)
+        self._apply_search_filter()
         self.update_no_notifications_label_visibility()
 
+    def filter_history(self, query):
+        self._search_query = query
+        self._search_matches = self._index.search(query)
+        self._apply_search_filter()
+        self.update_no_notifications_label_visibility()
+
+    def _apply_search_filter(self):
+        """Toggle row visibility from the index result, no markup is re-scanned"""
+        matches = self._search_matches
+        for sep, members in self._date_groups:
+            any_visible = False
+            for container in members:
+                visible = matches is None or getattr(container, "note_key", None) in matches
+                container.set_visible(visible)
+                any_visible = any_visible or visible
+            sep.set_visible(any_visible)
+
+    def _index_container(self, container, key, summary, body, app_name):
+        key = str(key)
+        container.note_key = key
+        self._containers_by_key[key] = container
+        self._index.add(key, summary or "", body or "", app_name or "")
+
+    def _unindex_container(self, container):
+        key = getattr(container, "note_key", None)
+        if key is None:
+            return
+        if self._containers_by_key.get(key) is container:
+            del self._containers_by_key[key]
+            self._index.remove(key)
+
+    def get_app_count(self, app_name):
+        return self._index.count_for_app(app_name or "")
+
     def on_do_not_disturb_changed(self, switch, pspec):
         self.do_not_disturb_enabled = switch.get_active()
         status = "enabled" if self.do_not_disturb_enabled else "disabled"
@@ -208,6 +263,8 @@ class NotificationHistory(Box):
         
         self.persistent_notifications = []
         self.containers = []
+        self._containers_by_key.clear()
+        self._index.clear()
         self.rebuild_with_separators()
 
     def _load_persistent_history(self):
@@ -245,6 +302,7 @@ class NotificationHistory(Box):
 
         self.persistent_notifications = new_persistent_notifications
         self._save_persistent_history()
+        self._unindex_container(container)
         container.destroy()
         
         new_containers = [c for c in self.containers if c != container]
@@ -336,6 +394,7 @@ class NotificationHistory(Box):
         
         container.add(content_box)
         self.containers.insert(0, container)
+        self._index_container(container, hist_notif.id, hist_notif.summary, hist_notif.body, hist_notif.app_name)
         self.rebuild_with_separators()
         self.update_no_notifications_label_visibility()
 
@@ -353,6 +412,7 @@ class NotificationHistory(Box):
                     if oldest_container.notification_box.cached_image_path and os.path.exists(oldest_container.notification_box.cached_image_path):
                         os.remove(oldest_container.notification_box.cached_image_path)
 
+            self._unindex_container(oldest_container)
             oldest_container.destroy()
 
         def on_container_destroy(container):
@@ -378,6 +438,7 @@ class NotificationHistory(Box):
             
             self_obj = self_ref()
             if self_obj:
+                self_obj._unindex_container(container)
                 new_containers = [c for c in self_obj.containers if c != container]
                 self_obj.containers = new_containers
                 
@@ -440,6 +501,8 @@ class NotificationHistory(Box):
         
         container.add(hist_box)
         self.containers.insert(0, container)
+        notification = notification_box.notification
+        self._index_container(container, notification_box.uuid, notification.summary, notification.body, notification.app_name)
         self.rebuild_with_separators()
         self._append_persistent_notification(notification_box, container.arrival_time)
         self.update_no_notifications_label_visibility()
@@ -531,18 +594,18 @@ class NotificationHistory(Box):
 
     def update_no_notifications_label_visibility(self):
         has_notifications = bool(self.containers)
+        if has_notifications and self._search_matches is not None:
+            has_notifications = any(key in self._containers_by_key for key in self._search_matches)
         self.no_notifications_box.set_visible(not has_notifications)
         self.notifications_list.set_visible(has_notifications)
 
     def clear_history_for_app(self, app_name):
-        containers_to_remove = []
-        persistent_notes_to_remove_ids = set()
-        
-        for container in list(self.containers):
-            if hasattr(container, "notification_box"):
-                if container.notification_box.notification.app_name == app_name:
-                    containers_to_remove.append(container)
-                    persistent_notes_to_remove_ids.add(container.notification_box.uuid)
+        # Per-app membership comes from the search index, no container scan
+        persistent_notes_to_remove_ids = self._index.keys_for_app(app_name or "")
+        containers_to_remove = [
+            self._containers_by_key[key] for key in persistent_notes_to_remove_ids
+            if key in self._containers_by_key
+        ]
 
         for container in containers_to_remove:
             if hasattr(container, "notification_box"):
@@ -550,12 +613,13 @@ class NotificationHistory(Box):
                     if container.notification_box.cached_image_path and os.path.exists(container.notification_box.cached_image_path):
                         os.remove(container.notification_box.cached_image_path)
             
+            self._unindex_container(container)
             self.containers.remove(container)
             self.notifications_list.remove(container)
             container.notification_box.destroy(from_history_delete=True)
             container.destroy()
 
-        new_persistent_notifications = [note for note in self.persistent_notifications if note.get("id") not in persistent_notes_to_remove_ids]
+        new_persistent_notifications = [note for note in self.persistent_notifications if str(note.get("id")) not in persistent_notes_to_remove_ids]
         self.persistent_notifications = new_persistent_notifications
         self._save_persistent_history()
         self.rebuild_with_separators()
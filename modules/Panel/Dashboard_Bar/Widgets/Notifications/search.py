@@ -0,0 +1,118 @@
+import re
+from bisect import bisect_left, insort
+
+
+_MARKUP_RE = re.compile(r"<[^>]*>|&\w+;|&#\d+;")
+_TOKEN_RE = re.compile(r"\w+")
+
+
+def tokenize(text):
+    """Split (possibly Pango-marked-up) text into casefolded word tokens"""
+    if not text:
+        return []
+    return _TOKEN_RE.findall(_MARKUP_RE.sub(" ", str(text)).casefold())
+
+
+class NotificationIndex:
+    """Inverted token index over summary/body/app_name of history entries.
+
+    add/remove only touch the terms of a single entry; prefix lookups bisect
+    into a sorted vocabulary instead of scanning every entry.
+    """
+
+    __slots__ = ("_postings", "_terms", "_doc_terms", "_doc_app", "_apps")
+
+    def __init__(self):
+        self._postings = {}   # term -> set(key)
+        self._terms = []      # sorted vocabulary for prefix lookups
+        self._doc_terms = {}  # key -> frozenset(term)
+        self._doc_app = {}    # key -> app_name
+        self._apps = {}       # app_name -> set(key)
+
+    def __len__(self):
+        return len(self._doc_terms)
+
+    def __contains__(self, key):
+        return key in self._doc_terms
+
+    def add(self, key, summary="", body="", app_name=""):
+        if key in self._doc_terms:
+            self.remove(key)
+
+        terms = frozenset(tokenize(summary) + tokenize(body) + tokenize(app_name))
+        self._doc_terms[key] = terms
+        self._doc_app[key] = app_name
+        self._apps.setdefault(app_name, set()).add(key)
+
+        for term in terms:
+            keys = self._postings.get(term)
+            if keys is None:
+                self._postings[term] = {key}
+                insort(self._terms, term)
+            else:
+                keys.add(key)
+
+    def remove(self, key):
+        terms = self._doc_terms.pop(key, None)
+        if terms is None:
+            return
+
+        app_name = self._doc_app.pop(key, None)
+        app_keys = self._apps.get(app_name)
+        if app_keys is not None:
+            app_keys.discard(key)
+            if not app_keys:
+                del self._apps[app_name]
+
+        for term in terms:
+            keys = self._postings.get(term)
+            if keys is None:
+                continue
+            keys.discard(key)
+            if not keys:
+                del self._postings[term]
+                i = bisect_left(self._terms, term)
+                if i < len(self._terms) and self._terms[i] == term:
+                    del self._terms[i]
+
+    def clear(self):
+        self._postings.clear()
+        self._terms.clear()
+        self._doc_terms.clear()
+        self._doc_app.clear()
+        self._apps.clear()
+
+    def _prefix_keys(self, prefix):
+        terms = self._terms
+        i = bisect_left(terms, prefix)
+        if i < len(terms) and terms[i] == prefix and (i + 1 == len(terms) or not terms[i + 1].startswith(prefix)):
+            return self._postings[prefix]
+
+        result = set()
+        while i < len(terms) and terms[i].startswith(prefix):
+            result |= self._postings[terms[i]]
+            i += 1
+        return result
+
+    def search(self, query):
+        """Keys whose words cover every query token as a prefix, None for an empty query"""
+        tokens = tokenize(query)
+        if not tokens:
+            return None
+
+        result = None
+        for token in sorted(set(tokens), key=len, reverse=True):
+            keys = self._prefix_keys(token)
+            result = set(keys) if result is None else result & keys
+            if not result:
+                return set()
+        return result
+
+    def keys_for_app(self, app_name):
+        return set(self._apps.get(app_name, ()))
+
+    def count_for_app(self, app_name):
+        return len(self._apps.get(app_name, ()))
+
+    def app_counts(self):
+        return {app: len(keys) for app, keys in self._apps.items()}
@@ -6,29 +6,17 @@ from fabric.widgets.label import Label
 from fabric.widgets.overlay import Overlay
 from fabric.widgets.stack import Stack
 
-from gi.repository import Gdk, Gio, GLib, Gtk
+from gi.repository import Gdk, GLib, Gtk
 
 import os
-import tempfile
 import urllib.parse
-import urllib.request
-import atexit
 
 import modules.icons as icons
 from services.mpris import MprisPlayer, MprisPlayerManager
-from widgets.circle_image import CircleImage
+from utils.artwork_cache import get_artwork_cache
+from widgets.circle_image import CircleImage, get_decoded_image_cache
 
 
-_temp_artwork_files = []
-
-def _cleanup_temp_artwork_files():
-    for temp_file in _temp_artwork_files:
-        if os.path.exists(temp_file):
-            os.remove(temp_file)
-    _temp_artwork_files.clear()
-
-atexit.register(_cleanup_temp_artwork_files)
-
 def get_player_icon_markup_by_name(player_name):
     return icons.disc
  
@@ -49,21 +37,25 @@ def add_hover_cursor(widget):
     widget.connect("leave-notify-event", on_leave)
 
 class PlayerBox(Box):
+    COVER_SIZE = 162
+    WALLPAPER = os.path.expanduser("~/.current.wall")
+
     def __init__(self, mpris_player=None):
         super().__init__(orientation="v", h_align="fill", spacing=0, h_expand=False, v_expand=True)
         self.mpris_player = mpris_player
         self._progress_timer_id = None
-        self._wallpaper_monitor = None
         self._destroyed = False
-        self._temp_artwork_files = []
+        self._artwork_url = None  # обложка, которую ждём из кэша
+        self._showing_wallpaper = True  # вместо обложки показаны обои
 
         self.cover = CircleImage(
             name="player-cover",
-            image_file=os.path.expanduser("~/.current.wall"),
-            size=162,
+            image_file=self.WALLPAPER,
+            size=self.COVER_SIZE,
             h_align="center",
             v_align="center",
         )
+        get_decoded_image_cache().watch(self.WALLPAPER, self.on_wallpaper_changed)
         self.cover_placerholder = CircleImage(
             name="player-cover",
             size=198,
@@ -206,20 +198,14 @@ class PlayerBox(Box):
             self.artist.set_text(mp.artist)
         if mp.arturl:
             parsed = urllib.parse.urlparse(mp.arturl)
-            if parsed.scheme == "file":
-                local_arturl = urllib.parse.unquote(parsed.path)
-                self._set_cover_image(local_arturl)
-            elif parsed.scheme in ("http", "https"):
-                self._download_artwork(mp.arturl)
+            if parsed.scheme in ("file", "http", "https"):
+                self._fetch_artwork(mp.arturl)
             else:
+                self._artwork_url = None
                 self._set_cover_image(mp.arturl)
         else:
-            fallback = os.path.expanduser("~/.current.wall")
-            self._set_cover_image(fallback)
-            file_obj = Gio.File.new_for_path(fallback)
-            monitor = file_obj.monitor_file(Gio.FileMonitorFlags.NONE, None)
-            monitor.connect("changed", self.on_wallpaper_changed)
-            self._wallpaper_monitor = monitor
+            self._artwork_url = None
+            self._set_cover_image(None)
         self.update_play_pause_icon()
 
         self.progressbar.set_visible(True)
@@ -260,39 +246,28 @@ class PlayerBox(Box):
         self._update_progress()
 
     def _set_cover_image(self, image_path):
-        if image_path and os.path.isfile(image_path):
-            self.cover.set_image_from_file(image_path)
+        # Файлы декодирует общий кэш CircleImage: все плееры с обоями делят одну копию
+        self._showing_wallpaper = not (image_path and os.path.isfile(image_path))
+        self.cover.set_image_from_file(self.WALLPAPER if self._showing_wallpaper else image_path)
+
+    def _fetch_artwork(self, arturl):
+        # Скачанное лежит в общем дисковом кэше, декодируется сразу в размер обложки;
+        # повтор того же URL (смена статуса воспроизведения) берётся из памяти.
+        # Размер — в пикселях устройства, иначе на HiDPI обложка растягивается
+        self._artwork_url = arturl
+        size = self.COVER_SIZE * self.cover.get_scale_factor()
+        get_artwork_cache().fetch(arturl, size, lambda pixbuf: self._on_artwork_ready(arturl, pixbuf))
+
+    def _on_artwork_ready(self, arturl, pixbuf):
+        # Пока грузилась, трек мог смениться
+        if self._destroyed or arturl != self._artwork_url:
+            return False
+        if pixbuf is not None:
+            self._showing_wallpaper = False
+            self.cover.set_image_from_pixbuf(pixbuf)
         else:
-            fallback = os.path.expanduser("~/.current.wall")
-            self.cover.set_image_from_file(fallback)
-            file_obj = Gio.File.new_for_path(fallback)
-            monitor = file_obj.monitor_file(Gio.FileMonitorFlags.NONE, None)
-            monitor.connect("changed", self.on_wallpaper_changed)
-            self._wallpaper_monitor = monitor
-
-    def _download_artwork(self, arturl):
-        def worker(user_data):
-            if self._destroyed:
-                return
-            try:
-                parsed = urllib.parse.urlparse(arturl)
-                suffix = os.path.splitext(parsed.path)[1] or ".png"
-                with urllib.request.urlopen(arturl, timeout=5) as response:
-                    data = response.read()
-                if len(data) > 5 * 1024 * 1024:
-                    local_arturl = os.path.expanduser("~/.current.wall")
-                else:
-                    temp_file = tempfile.NamedTemporaryFile(delete=False, suffix=suffix)
-                    temp_file.write(data)
-                    temp_file.close()
-                    local_arturl = temp_file.name
-                    _temp_artwork_files.append(local_arturl)
-            except Exception:
-                local_arturl = os.path.expanduser("~/.current.wall")
-            if not self._destroyed:
-                GLib.idle_add(self._set_cover_image, local_arturl)
-
-        GLib.Thread.new("artwork", worker, None)
+            self._set_cover_image(None)
+        return False
 
     def update_play_pause_icon(self):
         if self.mpris_player.playback_status == "playing":
@@ -302,8 +277,10 @@ class PlayerBox(Box):
             self.play_pause.get_child().set_markup(icons.play)
             self.play_pause.remove_style_class("playing")
 
-    def on_wallpaper_changed(self, monitor, file, other_file, event):
-        self.cover.set_image_from_file(os.path.expanduser("~/.current.wall"))
+    def on_wallpaper_changed(self):
+        # Один монитор на ~/.current.wall для всех плееров; обложку трека не трогаем
+        if self._showing_wallpaper:
+            self.cover.set_image_from_file(self.WALLPAPER)
 
     def _on_prev_clicked(self, button):
         if self.mpris_player:
@@ -399,15 +376,9 @@ class PlayerBox(Box):
             GLib.source_remove(self._progress_timer_id)
             self._progress_timer_id = None
 
-        if self._wallpaper_monitor:
-            self._wallpaper_monitor.cancel()
-            self._wallpaper_monitor = None
+        get_decoded_image_cache().unwatch(self.WALLPAPER, self.on_wallpaper_changed)
 
-        if hasattr(self, '_temp_artwork_files'):
-            for temp_file in self._temp_artwork_files:
-                if os.path.exists(temp_file):
-                    os.remove(temp_file)
-            self._temp_artwork_files.clear()
+        self._artwork_url = None
 
         self.mpris_player = None
         
@@ -3,39 +3,62 @@ from fabric.widgets.button import Button
 from fabric.widgets.entry import Entry
 from fabric.widgets.image import Image
 from fabric.widgets.label import Label
-from fabric.widgets.scrolledwindow import ScrolledWindow
-from gi.repository import Gdk, GdkPixbuf, GLib
+from gi.repository import Gdk
 import subprocess
 import modules.icons as icons
+from services.cliphist import ClipboardHistory
+from widgets.virtual_list import VirtualList
+
+ROW_HEIGHT = 64
 
 class ClipHistory(Box):
     def __init__(self, notch, **kwargs):
         # Полное сохранение имен для CSS
         super().__init__(name="clip-history", visible=False, all_visible=False, **kwargs)
         self.notch = notch
-        self.selected_index = -1
+        self._query = ""
+        self.history = ClipboardHistory.get_initial()
+        self._history_handler = self.history.connect("changed", self._on_history_changed)
         self._setup_ui()
         self.show_all()
 
     def _setup_ui(self):
-        self.viewport = Box(name="viewport", spacing=4, orientation="v")
         self.search_entry = Entry(
             name="search-entry",
             placeholder="Поиск в истории буфера...",
             h_expand=True,
-            notify_text=lambda entry, *_: self._render_items(entry.get_text().lower()),
+            notify_text=lambda entry, *_: self._render_items(entry.get_text()),
             on_activate=lambda *_: self._use_selected(),
             on_key_press_event=self._on_search_key_press,
         )
         self.search_entry.props.xalign = 0.5
-        
-        self.scrolled_window = ScrolledWindow(
+
+        # Строки создаются только под видимую область и переиспользуются
+        self.list_view = VirtualList(
             name="scrolled-window",
+            row_height=ROW_HEIGHT,
+            create_row=self._create_row,
+            bind_row=self._bind_row,
+            spacing=4,
             v_expand=True,
-            child=self.viewport,
-            propagate_height=False,
         )
 
+        self.empty_box = Box(
+            name="no-clip-container",
+            v_expand=True,
+            h_expand=True,
+            orientation="v",
+            children=[Label(
+                name="no-clip",
+                markup=icons.clipboard,
+                v_align="center",
+                h_align="center",
+                v_expand=True,
+                h_expand=True
+            )],
+        )
+        self.empty_box.set_no_show_all(True)
+
         # Структура 1-в-1 как в оригинале
         self.add(Box(
             name="launcher-box",
@@ -60,143 +83,114 @@ class ClipHistory(Box):
                         ),
                     ],
                 ),
-                self.scrolled_window,
+                self.list_view,
+                self.empty_box,
             ],
         ))
 
     def _render_items(self, search=""):
-        """Минимальное потребление CPU: рендерим только то, что нужно."""
-        self.viewport.children = []
-        self.selected_index = -1
-        
-        # Читаем историю напрямую
-        raw = subprocess.run(["cliphist", "list"], capture_output=True).stdout.decode(errors='ignore')
-        if not raw:
-            return self._show_empty()
-
-        for line in raw.splitlines():
-            if search and search not in line.lower():
-                continue
-            
-            # Разрезаем строку один раз для экономии ресурсов
-            parts = line.split('\t', 1)
-            idx = parts[0]
-            content = parts[1] if len(parts) > 1 else line
-            
-            self.viewport.add(self._create_item(idx, content))
-        
-        self.show_all()
+        """Минимальное потребление CPU: ранжируем модель в памяти, строки переиспользуем."""
+        self._query = search
+        self.history.thumbnails.cancel_pending()
+
+        empty = not len(self.history.model)
+        self.empty_box.set_visible(empty)
+        self.list_view.set_visible(not empty)
+        self.list_view.set_items([] if empty else self.history.filter(search))
+
+    def _on_history_changed(self, *_):
+        # Перерисовываем только открытый список
+        if self.get_mapped():
+            self._render_items(self._query)
+
+    def _create_row(self):
+        # Обе иконки создаются один раз, привязка лишь переключает видимость
+        image_icon = Image(name="clip-icon")
+        text_icon = Label(name="clip-icon", markup=icons.clip_text)
+        for icon in (image_icon, text_icon):
+            icon.set_no_show_all(True)
+
+        label = Label(
+            name="clip-label",
+            ellipsization="end",
+            h_align="start",
+            h_expand=True,
+        )
 
-    def _create_item(self, idx, content):
-        # Быстрая проверка на изображение
-        is_img = "[[ binary data" in content
-        
-        # Виджеты создаются максимально легковесно
-        icon = Image(name="clip-icon") if is_img else Label(name="clip-icon", markup=icons.clip_text)
-        
         btn = Button(
             name="slot-button",
             child=Box(
                 name="slot-box",
                 orientation="h",
                 spacing=10,
-                children=[
-                    icon,
-                    Label(
-                        name="clip-label",
-                        label="[Изображение]" if is_img else content[:100].strip(),
-                        ellipsization="end",
-                        h_align="start",
-                        h_expand=True,
-                    ),
-                ],
+                children=[image_icon, text_icon, label],
             ),
         )
-        
-        if is_img: # Ленивая отрисовка превью
-            GLib.idle_add(lambda: self._lazy_img(icon, idx))
-
-        btn.connect("clicked", lambda *_: self._paste(idx))
+        btn.image_icon = image_icon
+        btn.text_icon = text_icon
+        btn.label = label
+        btn.entry = None
+        btn.connect("clicked", lambda b: b.entry and self._paste(b.entry.id))
+        btn.show_all()
         return btn
 
-    def _lazy_img(self, widget, idx):
-        """Декодирование картинки только в момент показа."""
-        img_data = subprocess.run(["cliphist", "decode", idx], capture_output=True).stdout
-        if not img_data: return
-        
-        loader = GdkPixbuf.PixbufLoader()
-        try:
-            loader.write(img_data)
-            loader.close()
-            # NEAREST - самый быстрый метод масштабирования для процессора
-            pix = loader.get_pixbuf().scale_simple(64, 64, GdkPixbuf.InterpType.NEAREST)
-            widget.set_from_pixbuf(pix)
-        except: pass
+    def _bind_row(self, btn, entry, index):
+        same = btn.entry is entry
+        if same and not entry.is_image:
+            return
+        btn.entry = entry
+
+        if entry.is_image:
+            btn.text_icon.hide()
+            if not same:
+                btn.image_icon.clear()
+            btn.image_icon.show()
+            btn.label.set_label("[Изображение]")
+            # Превью декодируется в фоне и берётся из кэша
+            self.history.thumbnails.request(entry, btn.image_icon)
+        else:
+            btn.image_icon.hide()
+            btn.image_icon._clip_thumb_key = None
+            btn.text_icon.show()
+            btn.label.set_label(entry.preview[:100].strip())
 
     def _paste(self, idx):
-        data = subprocess.run(["cliphist", "decode", idx], capture_output=True).stdout
+        data = self.history.decode(idx)
         subprocess.run(["wl-copy"], input=data)
         self.close()
 
     def _action(self, op):
-        subprocess.run(["cliphist", op])
-        self._render_items()
+        if op == "wipe":
+            self.history.wipe()
+        else:
+            subprocess.run(["cliphist", op])
+            self.history.reload()
 
     def _on_search_key_press(self, _, event):
         kv = event.keyval
-        if kv == Gdk.KEY_Down: self._move_sel(1)
-        elif kv == Gdk.KEY_Up: self._move_sel(-1)
+        if kv == Gdk.KEY_Down: self.list_view.move_selection(1)
+        elif kv == Gdk.KEY_Up: self.list_view.move_selection(-1)
         elif kv in (Gdk.KEY_Return, Gdk.KEY_KP_Enter): self._use_selected()
         elif kv == Gdk.KEY_Escape: self.close()
         return False
 
-    def _move_sel(self, step):
-        items = self.viewport.get_children()
-        if not items: return
-        self.selected_index = max(0, min(self.selected_index + step, len(items) - 1))
-        
-        for i, child in enumerate(items):
-            if i == self.selected_index:
-                child.get_style_context().add_class("selected")
-                child.grab_focus()
-                # Скролл без таймеров
-                self.scrolled_window.get_vadjustment().set_value(child.get_allocation().y)
-            else:
-                child.get_style_context().remove_class("selected")
-
     def _use_selected(self):
-        items = self.viewport.get_children()
-        if 0 <= self.selected_index < len(items):
-            items[self.selected_index].clicked()
+        entry = self.list_view.selected_item()
+        if entry is not None:
+            self._paste(entry.id)
 
     def open(self):
         self.search_entry.set_text("")
         self._render_items()
         self.search_entry.grab_focus()
 
+    def destroy(self):
+        if self._history_handler:
+            self.history.disconnect(self._history_handler)
+            self._history_handler = None
+        super().destroy()
+
     def close(self):
-        self.viewport.children = [] # Полная очистка памяти при закрытии
+        self.history.thumbnails.cancel_pending()
+        self.list_view.set_items([]) # Строки пула остаются, данные отпускаем
         self.notch.close_notch()
-
-    def _show_empty(self):
-        self.viewport.children = [] 
-        
-        empty_box = Box(
-            name="no-clip-container",
-            v_expand=True,
-            h_expand=True,
-            orientation="v"
-        )
-        
-        empty_label = Label(
-            name="no-clip", 
-            markup=icons.clipboard,
-            v_align="center",
-            h_align="center",
-            v_expand=True,
-            h_expand=True
-        )
-        
-        empty_box.add(empty_label)
-        self.viewport.add(empty_box)
-        self.show_all()
\ No newline at end of file
@@ -1,26 +1,40 @@
-from fabric.utils import DesktopApp, get_desktop_applications
 from fabric.widgets.box import Box
 from fabric.widgets.button import Button
 from fabric.widgets.entry import Entry
 from fabric.widgets.image import Image
 from fabric.widgets.label import Label
-from fabric.widgets.scrolledwindow import ScrolledWindow
-from gi.repository import Gdk
+from gi.repository import Gdk, GLib
+import os
 import modules.icons as icons
+from services.desktop_apps import DesktopAppIndex, DesktopEntry
+from utils.app_icons import get_app_icon_cache
+from utils.frecency import LaunchLog
+from utils.fuzzy import FuzzyIndex
+from widgets.virtual_list import VirtualList
+
+ROW_HEIGHT = 52
+ICON_SIZE = 24
+LAUNCH_LOG = os.path.join(GLib.get_user_cache_dir(), "vidgex-shell", "launches.bin")
 
 class AppLauncher(Box):
     def __init__(self, notch, **kwargs):
         super().__init__(name="app-launcher", visible=False, all_visible=False, **kwargs)
-        
+
         self.notch = notch
-        self.selected_index = -1
-        self._apps_cache = [] # Загружается один раз при запуске системы/окна
-        
+        # Общий индекс приложений: обновляется сам при установке/удалении
+        self.apps = DesktopAppIndex.get_initial()
+        # Поля нормализуются один раз при построении, а не на каждое нажатие
+        self._index = FuzzyIndex(self.apps.apps, fields=lambda a: (a.display_name, a.name, a.command_line, a.description))
+        self._apps_handler = self.apps.connect("changed", self._on_apps_changed)
+        # Журнал читается при первом открытии, а не при старте оболочки
+        self.launch_log = LaunchLog(LAUNCH_LOG)
+        self._boost_version = -1
+        self.icons = get_app_icon_cache()
+
         self._setup_ui()
 
     def _setup_ui(self):
         # Компактная инициализация без лишних переменных в self
-        self.viewport = Box(name="viewport", spacing=4, orientation="v")
         self.search_entry = Entry(
             name="search-entry",
             placeholder="Поиск...",
@@ -30,13 +44,15 @@ class AppLauncher(Box):
             on_key_press_event=self._on_key_press
         )
         self.search_entry.props.xalign = 0.5
-        
-        self.scrolled_window = ScrolledWindow(
+
+        # Пул строк под видимую область, привязанный к результатам по индексу
+        self.list_view = VirtualList(
             name="scrolled-window",
+            row_height=ROW_HEIGHT,
+            create_row=self._create_widget,
+            bind_row=self._update_widget,
+            spacing=4,
             v_expand=True,
-            child=self.viewport,
-            propagate_width=False,
-            propagate_height=False
         )
 
         # Компонуем интерфейс напрямую в один проход
@@ -47,134 +63,103 @@ class AppLauncher(Box):
             orientation="v",
             children=[
                 Box(spacing=10, children=[
-                    self.search_entry, 
+                    self.search_entry,
                     Button(
                         name="close-button",
                         child=Label(name="close-label", markup=icons.cancel),
                         on_clicked=lambda *_: self.close_launcher()
                     )
                 ]),
-                self.scrolled_window
+                self.list_view
             ]
         ))
 
     def open_launcher(self):
-        # Ленивая загрузка приложений только если кэш пуст
-        if not self._apps_cache:
-            self._apps_cache = sorted(
-                get_desktop_applications(), 
-                key=lambda a: (a.display_name or "").casefold()
-            )
-        
+        self._apply_frecency()
         self.search_entry.set_text("")
         self.search_entry.grab_focus()
         self._render_list("")
 
+    def _apply_frecency(self):
+        # Ранги пересчитываются, только если с прошлого раза были запуски
+        if self._boost_version != self.launch_log.version:
+            score = self.launch_log.score
+            self._index.set_boost(lambda app: score(app.desktop_id))
+            self._boost_version = self.launch_log.version
+
+    def _on_apps_changed(self, *_):
+        self._index.build(self.apps.apps)
+        if self.get_mapped():
+            self._render_list(self.search_entry.get_text())
+
     def _on_search_changed(self, entry, *_):
         # Мгновенный поиск без таймеров
         self._render_list(entry.get_text())
 
     def _render_list(self, query: str):
-        query = query.casefold()
-        existing = self.viewport.get_children()
-        idx = 0
-
-        # Линейный проход по приложениям с фильтрацией "на лету"
-        for app in self._apps_cache:
-            # Логика фильтрации (функциональность сохранена)
-            match = not query or any(
-                query in (attr or "").casefold() 
-                for attr in [app.display_name, app.name, app.command_line, app.description]
-            )
-            
-            if match:
-                if idx < len(existing):
-                    widget = existing[idx]
-                    self._update_widget(widget, app)
-                else:
-                    widget = self._create_widget(app)
-                    self.viewport.add(widget)
-                
-                widget.show()
-                idx += 1
-
-        # Скрываем неиспользуемые виджеты вместо их удаления (экономия CPU)
-        for i in range(idx, len(existing)):
-            existing[i].hide()
-            
-        self._update_selection(0 if idx > 0 else -1)
-
-    def _update_widget(self, btn: Button, app: DesktopApp):
-        # Прямое обновление без создания новых объектов Label/Image
-        box_children = btn.get_child().get_children()
-        name = app.display_name or "App"
-        
-        box_children[0].set_from_pixbuf(app.get_icon_pixbuf(size=btn.get_allocated_height() or 24))
-        box_children[1].set_label(name)
-        btn.set_tooltip_text(app.description or name)
-        btn._app = app
-        btn.get_style_context().remove_class("selected")
-
-    def _create_widget(self, app: DesktopApp) -> Button:
-        name = app.display_name or "App"
+        # Иконки для строк прошлой выдачи больше не нужны
+        self.icons.cancel_pending()
+        # Индекс отдаёт приложения уже отранжированными по качеству совпадения
+        self.list_view.set_items(self._index.search(query), selected=0)
+
+    def _update_widget(self, btn: Button, app: DesktopEntry, index: int):
+        # Строка пула уже показывает это приложение — текст не трогаем
+        if btn._app is not app:
+            name = app.display_name or "App"
+            btn._app = app
+            btn.label.set_label(name)
+            btn.set_tooltip_text(app.description or name)
+        # Иконка из общего кэша; если её там нет — заглушка до загрузки в idle
+        self.icons.request(app, ICON_SIZE, btn.icon)
+
+    def _create_widget(self) -> Button:
+        icon = Image(name="app-icon")
+        label = Label(name="app-label", ellipsization="end")
         btn = Button(
             name="slot-button",
-            child=Box(spacing=10, children=[
-                Image(name="app-icon", pixbuf=app.get_icon_pixbuf(size=24)),
-                Label(name="app-label", label=name, ellipsization="end")
-            ]),
+            child=Box(spacing=10, children=[icon, label]),
             on_clicked=self._on_app_clicked
         )
-        btn._app = app
+        btn.icon = icon
+        btn.label = label
+        btn._app = None
+        btn.show_all()
         return btn
 
     def _on_app_clicked(self, btn):
-        btn._app.launch()
+        if btn._app is not None:
+            self._launch_app(btn._app)
+
+    def _launch_app(self, app: DesktopEntry):
+        self.launch_log.record(app.desktop_id)
+        app.launch()
         self.close_launcher()
 
     def _on_search_activate(self, *_):
-        visible = [c for c in self.viewport.get_children() if c.get_visible()]
-        if visible and 0 <= self.selected_index < len(visible):
-            self._on_app_clicked(visible[self.selected_index])
+        app = self.list_view.selected_item()
+        if app is not None:
+            self._launch_app(app)
 
     def _on_key_press(self, _, event) -> bool:
         kv = event.keyval
         # Прямое сравнение без словарей (KEY_MAPPINGS удален для экономии ОЗУ)
         if kv == Gdk.KEY_Escape: self.close_launcher()
         elif kv in (Gdk.KEY_Up, Gdk.KEY_Down):
-            step = 1 if kv == Gdk.KEY_Down else -1
-            visible = [c for c in self.viewport.get_children() if c.get_visible()]
-            if visible:
-                self._update_selection((self.selected_index + step) % len(visible))
+            # Навигация — арифметика индексов в модели, без обхода виджетов
+            self.list_view.move_selection(1 if kv == Gdk.KEY_Down else -1, wrap=True)
         elif kv in (Gdk.KEY_Return, Gdk.KEY_KP_Enter):
             self._on_search_activate()
         else: return False
         return True
 
-    def _update_selection(self, index: int):
-        visible = [c for c in self.viewport.get_children() if c.get_visible()]
-        if not visible:
-            self.selected_index = -1
-            return
-
-        if 0 <= self.selected_index < len(visible):
-            visible[self.selected_index].get_style_context().remove_class("selected")
-        
-        self.selected_index = index
-        target = visible[index]
-        target.get_style_context().add_class("selected")
-        
-        # Скроллинг без лишних вычислений
-        adj = self.scrolled_window.get_vadjustment()
-        alloc = target.get_allocation()
-        if alloc.y < adj.get_value(): adj.set_value(alloc.y)
-        elif alloc.y + alloc.height > adj.get_value() + adj.get_page_size():
-            adj.set_value(alloc.y + alloc.height - adj.get_page_size())
-
     def close_launcher(self):
         self.notch.close_notch()
-        self.selected_index = -1
+        self.icons.cancel_pending()
+        self.list_view.set_items([]) # Строки пула остаются, данные отпускаем
 
     def destroy(self):
-        self._apps_cache.clear()
-        super().destroy()
\ No newline at end of file
+        if self._apps_handler:
+            self.apps.disconnect(self._apps_handler)
+            self._apps_handler = None
+        self._index.build(())
+        super().destroy()
@@ -21,7 +21,8 @@ from modules.Panel.launcher import AppLauncher
 from modules.Panel.overview import Overview
 from modules.Panel.power import PowerMenu
 from modules.Panel.tools import Toolbox
-from utils.icon_resolver import IconResolver
+from utils.icon_resolver import get_icon_resolver
+from services.desktop_apps import DesktopAppIndex
 from widgets.wayland import WaylandWindow as Window
 
 
@@ -114,7 +115,7 @@ class Notch(Window):
         from utils.monitor_manager import get_monitor_manager
         self.monitor_manager = get_monitor_manager()
         
-        self.icon_resolver = IconResolver()
+        self.icon_resolver = get_icon_resolver()
         
         self._setup_widgets()
         self._setup_keybindings()
@@ -726,8 +727,13 @@ class Notch(Window):
         if not app_id or not self._alive or not self.icon_resolver:
             return None
         
+        # Сначала общий резолвер класса окна -> приложение (кэш общий с доками)
+        app = DesktopAppIndex.get_initial().resolve_class(app_id)
+        icon = app.get_icon_pixbuf(size=20, default_icon=None) if app else None
+
         # Ищем через резолвер иконок
-        icon = self.icon_resolver.get_icon_pixbuf(app_id, 20)
+        if not icon:
+            icon = self.icon_resolver.get_icon_pixbuf(app_id, 20)
 
         # Пытаемся найти по первой части идентификатора
         if not icon and "-" in app_id:
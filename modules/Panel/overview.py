@@ -6,48 +6,59 @@ from fabric.widgets.image import Image
 from fabric.widgets.label import Label
 import gi
 gi.require_version("Gtk", "3.0")
-from gi.repository import Gdk, Gtk, GLib, GdkPixbuf
-import json
+from gi.repository import Gdk, Gtk, GLib
 import modules.icons as icons
-from utils.icon_resolver import IconResolver
+from utils.icon_resolver import get_icon_resolver
+from services.windows import WindowIndex
 
 # Синлгтоны для экономии ресурсов
 connection = Hyprland()
-icon_res = IconResolver()
+icon_res = get_icon_resolver()
 TARGET = [Gtk.TargetEntry.new("text/plain", Gtk.TargetFlags.SAME_APP, 0)]
 
 class HyprlandWindowButton(Button):
-    __slots__ = ("addr", "w_id", "pos") # Экономия ОЗУ: запрет на создание __dict__
+    __slots__ = ("addr", "w_id", "pos", "cls", "isize", "image_widget") # Экономия ОЗУ: запрет на создание __dict__
 
     def __init__(self, win, scale, m_x, m_y):
         self.addr = win["address"]
+        self.cls = None
+        self.isize = 0
+        self.image_widget = Image()
+
+        super().__init__(name="overview-client-box", image=self.image_widget)
+
+        # Drag and Drop: легкая реализация
+        self.drag_source_set(Gdk.ModifierType.BUTTON1_MASK, TARGET, Gdk.DragAction.COPY)
+        self.connect("drag-data-get", self._on_drag_data)
+        self.connect("clicked", self._on_click)
+        self.update(win, scale, m_x, m_y)
+
+    def update(self, win, scale, m_x, m_y):
+        """Обновляет кнопку на месте: размер, позицию, заголовок и (при смене) иконку."""
         self.w_id = win["workspace"]["id"]
-        
+
         # Расчет геометрии без лишних объектов
         w, h = win["size"]
         if win.get("transform", 0) in (1, 3): w, h = h, w
-        
+
         sw, sh = int(w * scale), int(h * scale)
         isize = int(min(sw, sh) * 0.5)
+        self.set_size_request(sw, sh)
+        self.set_window_title(win["title"])
+
+        cls = win["initialClass"]
+        if cls != self.cls or isize != self.isize:
+            self.cls, self.isize = cls, isize
+            self.image_widget.set_from_pixbuf(self._get_px(cls, isize))
 
-        super().__init__(
-            name="overview-client-box",
-            image=Image(pixbuf=self._get_px(win["initialClass"], isize)),
-            tooltip_text=win["title"][:100],
-            size=(sw, sh),
-        )
-        
         self.pos = (int(abs(win["at"][0] - m_x) * scale), int(abs(win["at"][1] - m_y) * scale))
-        
-        # Drag and Drop: легкая реализация
-        self.drag_source_set(Gdk.ModifierType.BUTTON1_MASK, TARGET, Gdk.DragAction.COPY)
-        self.connect("drag-data-get", self._on_drag_data)
-        self.connect("clicked", self._on_click)
+
+    def set_window_title(self, title):
+        self.set_tooltip_text(title[:100])
 
     def _get_px(self, cls, size):
-        # Быстрое получение иконки без перебора всех приложений в системе
-        px = icon_res.get_icon_pixbuf(cls, size) or icon_res.get_icon_pixbuf("image-missing", size)
-        return px.scale_simple(size, size, GdkPixbuf.InterpType.NEAREST) if px else None
+        # Иконка уже нужного размера из общего кэша резолвера — без scale_simple
+        return icon_res.get_icon_pixbuf(cls, size) or icon_res.get_icon_pixbuf("image-missing", size)
 
     def _on_click(self, _):
         connection.send_command(f"/dispatch workspace {self.w_id}")
@@ -57,92 +68,153 @@ class HyprlandWindowButton(Button):
         data.set_text(self.addr, -1)
 
 class WorkspaceEventBox(EventBox):
-    __slots__ = ("ws_id",)
+    __slots__ = ("ws_id", "ws_empty")
     def __init__(self, ws_id, content, ws_empty):
         super().__init__(name="overview-workspace-bg")
         self.ws_id = ws_id
+        self.ws_empty = ws_empty
         self.add(content)
-        
+
         self.drag_dest_set(Gtk.DestDefaults.ALL, TARGET, Gdk.DragAction.COPY)
         self.connect("drag-data-received", self._on_drop)
-        if not ws_empty:
-            self.connect("button-press-event", self._on_click)
+        self.connect("button-press-event", self._on_click)
 
     def _on_click(self, _, event):
-        if event.button == 1: # Только ЛКМ для перехода
+        if event.button == 1 and not self.ws_empty: # Только ЛКМ для перехода
             connection.send_command(f"/dispatch workspace {self.ws_id}")
 
     def _on_drop(self, _w, _ctx, _x, _y, data, _info, _time):
         addr = data.get_data().decode()
         connection.send_command(f"/dispatch movetoworkspacesilent {self.ws_id},address:{addr}")
 
+class WorkspaceTile(Box):
+    """Плитка рабочего стола, создаётся один раз; меняется только содержимое."""
+
+    def __init__(self, ws_id):
+        super().__init__(name="overview-workspace-box", orientation="v", spacing=4)
+        self.ws_id = ws_id
+        self.fixed = Gtk.Fixed()
+        self.empty_label = Label(markup=icons.circle_plus, name="overview-add-label")
+        self.empty_label.set_opacity(0.4)
+        self.empty_label.set_no_show_all(True)
+        self.fixed.set_no_show_all(True)
+
+        self.inner = Box(orientation="v", spacing=4)
+        self.inner.pack_start(self.empty_label, True, True, 0)
+        self.inner.add(self.fixed)
+
+        self.event_box = WorkspaceEventBox(ws_id, self.inner, True)
+        self.add(Label(label=f"Workspace {ws_id}", name="overview-workspace-label"))
+        self.add(self.event_box)
+
+    def set_geometry(self, width, height):
+        self.inner.set_size_request(width, height)
+
+    def set_empty(self, empty):
+        self.event_box.ws_empty = empty
+        self.empty_label.set_visible(empty)
+        self.fixed.set_visible(not empty)
+
 class Overview(Box):
     __slots__ = ("mon_id", "upd_id")
     def __init__(self, monitor_id=0, **kwargs):
         super().__init__(name="overview", orientation="v", spacing=8, **kwargs)
         self.mon_id = monitor_id
         self.upd_id = 0
-        
-        # Подписка на ключевые события для обновления
-        for ev in ("openwindow", "closewindow", "movewindow", "windowtitle"):
-            connection.connect(f"event::{ev}", self.schedule_update)
-        self._update_ui()
+        self._dirty = True
+        self._tiles = {}    # ws_id -> WorkspaceTile
+        self._buttons = {}  # адрес окна -> HyprlandWindowButton
+
+        # Сетка 3x3 строится один раз
+        for r in range(3):
+            hbox = Box(spacing=8, orientation="h")
+            self.add(hbox)
+            for c in range(3):
+                ws_id = r * 3 + c + 1
+                self._tiles[ws_id] = WorkspaceTile(ws_id)
+                hbox.add(self._tiles[ws_id])
+
+        # Окна и мониторы берутся из общего индекса: один j/clients на всех
+        self.window_index = WindowIndex.get_initial()
+        self._handlers = [
+            self.window_index.connect("clients-changed", self.schedule_update),
+            self.window_index.connect("title-changed", self._on_title_changed),
+        ]
+        # Пока страница скрыта, обновления только помечаются и выполняются при показе
+        self.connect("map", self._on_map)
+
+    def _on_map(self, *args):
+        if self._dirty:
+            self.schedule_update()
 
     def schedule_update(self, *args):
+        if not self.get_mapped():
+            self._dirty = True
+            return
         if self.upd_id: GLib.source_remove(self.upd_id)
         # Debounce обновления для защиты CPU от спама событий
         self.upd_id = GLib.timeout_add(150, self._perform_update)
 
     def _perform_update(self):
-        self._update_ui()
         self.upd_id = 0
+        self._update_ui()
         return False
 
+    def _on_title_changed(self, _index, address):
+        btn = self._buttons.get(address)
+        if btn is None: return
+        if not self.get_mapped():
+            self._dirty = True
+            return
+        win = next((w for w in self.window_index.clients if w.get("address") == address), None)
+        if win: btn.set_window_title(win["title"])
+
     def _update_ui(self):
-        # Эффективная очистка
-        for child in self.get_children(): self.remove(child)
-        
-        # Прямой парсинг данных без создания промежуточных классов-оберток
-        m_data = json.loads(connection.send_command("j/monitors").reply.decode())
+        self._dirty = False
+        m_data = self.window_index.monitors
+        if not m_data: return
         cur_m = next((m for m in m_data if m["id"] == self.mon_id), m_data[0])
         scale = 0.1 * cur_m.get("scale", 1.0)
-        
-        wins = json.loads(connection.send_command("j/clients").reply.decode())
-        ws_map = {}
-        for w in wins:
-            wid = w["workspace"]["id"]
-            if 1 <= wid <= 9: ws_map.setdefault(wid, []).append(w)
+        m_x, m_y = cur_m["x"], cur_m["y"]
 
-        # Создание сетки
-        for r in range(3):
-            hbox = Box(spacing=8, orientation="h")
-            self.add(hbox)
-            for c in range(3):
-                ws_id = r * 3 + c + 1
-                hbox.add(self._build_ws(ws_id, ws_map.get(ws_id, []), cur_m, scale))
+        seen = set()
+        occupied = set()
+        for w in self.window_index.clients:
+            wid = w["workspace"]["id"]
+            if not 1 <= wid <= 9: continue
+            addr = w["address"]
+            seen.add(addr)
+            occupied.add(wid)
+            tile = self._tiles[wid]
+
+            btn = self._buttons.get(addr)
+            if btn is None:
+                btn = self._buttons[addr] = HyprlandWindowButton(w, scale, m_x, m_y)
+                tile.fixed.put(btn, *btn.pos)
+                btn.show_all()
+                continue
+
+            old_parent = btn.get_parent()
+            btn.update(w, scale, m_x, m_y)
+            if old_parent is tile.fixed:
+                tile.fixed.move(btn, *btn.pos)
+            else:
+                # Окно переехало на другой рабочий стол
+                old_parent.remove(btn)
+                tile.fixed.put(btn, *btn.pos)
+
+        for addr in [a for a in self._buttons if a not in seen]:
+            self._buttons.pop(addr).destroy()
+
+        width, height = int(cur_m["width"] * scale), int(cur_m["height"] * scale)
+        for ws_id, tile in self._tiles.items():
+            tile.set_geometry(width, height)
+            tile.set_empty(ws_id not in occupied)
         self.show_all()
 
-    def _build_ws(self, ws_id, ws_wins, cur_m, scale):
-        fixed = Gtk.Fixed()
-        for w in ws_wins:
-            btn = HyprlandWindowButton(w, scale, cur_m["x"], cur_m["y"])
-            fixed.put(btn, *btn.pos)
-
-        inner = Box(orientation="v", spacing=4)
-        inner.set_size_request(int(cur_m["width"] * scale), int(cur_m["height"] * scale))
-        
-        if not ws_wins:
-            lbl_empty = Label(markup=icons.circle_plus, name="overview-add-label")
-            lbl_empty.set_opacity(0.4)
-            inner.pack_start(lbl_empty, True, True, 0)
-        else:
-            inner.add(fixed)
-
-        ws_box = Box(name="overview-workspace-box", orientation="v", spacing=4)
-        ws_box.add(Label(label=f"Workspace {ws_id}", name="overview-workspace-label"))
-        ws_box.add(WorkspaceEventBox(ws_id, inner, not ws_wins))
-        return ws_box
-
     def destroy(self):
         if self.upd_id: GLib.source_remove(self.upd_id)
-        super().destroy()
\ No newline at end of file
+        for handler_id in self._handlers:
+            self.window_index.disconnect(handler_id)
+        self._handlers.clear()
+        super().destroy()
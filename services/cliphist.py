@@ -0,0 +1,239 @@
+from fabric.core.service import Service, Signal
+from fabric.utils import monitor_file
+
+from gi.repository import GdkPixbuf, GLib
+
+import hashlib
+import os
+import subprocess
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from utils.cliphist import ClipModel
+
+
+def get_cliphist_db_path() -> str:
+    return os.environ.get("CLIPHIST_DB_PATH") or os.path.join(GLib.get_user_cache_dir(), "cliphist", "db")
+
+
+class ClipThumbnailer:
+    """Превью картинок из истории: декодирование в пуле потоков сразу в целевой
+    размер, дисковый кэш по (id записи, хэш содержимого) и небольшой LRU в памяти.
+    """
+
+    CACHE_DIR = Path(GLib.get_user_cache_dir()) / "vidgex-shell" / "clip-thumbs"
+    MAX_MEMORY_ITEMS = 128
+
+    def __init__(self, history, size: int = 64, workers: int = 2):
+        self._history = history
+        self.size = size
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="clip-thumb")
+        self._memory = OrderedDict()  # cache key -> pixbuf
+        self._pending = {}            # cache key -> [widget]
+        self._generation = 0
+        self.CACHE_DIR.mkdir(parents=True, exist_ok=True)
+
+    @staticmethod
+    def cache_key(entry) -> str:
+        # Строка превью cliphist содержит размер, формат и разрешение — это
+        # дешёвый отпечаток содержимого без декодирования самой картинки
+        digest = hashlib.sha1(entry.preview.encode(errors="ignore")).hexdigest()[:16]
+        return f"{entry.id}-{digest}"
+
+    def _cache_path(self, key: str) -> Path:
+        return self.CACHE_DIR / f"{key}.png"
+
+    def request(self, entry, widget):
+        """Назначает превью виджету; результат доставляется, только если строка
+        всё ещё показывает эту запись."""
+        key = self.cache_key(entry)
+        widget._clip_thumb_key = key
+
+        pixbuf = self._memory.get(key)
+        if pixbuf is not None:
+            self._memory.move_to_end(key)
+            widget.set_from_pixbuf(pixbuf)
+            return
+
+        waiters = self._pending.get(key)
+        if waiters is not None:
+            waiters.append(widget)
+            return
+        self._pending[key] = [widget]
+        self._executor.submit(self._load, entry.id, key, self._generation)
+
+    def cancel_pending(self):
+        """Сбрасывает очередь: ещё не начатые задачи для скрытых строк пропускаются."""
+        self._generation += 1
+        self._pending.clear()
+
+    def _load(self, clip_id: str, key: str, generation: int):
+        path = self._cache_path(key)
+        pixbuf = None
+        try:
+            if path.exists():
+                pixbuf = GdkPixbuf.Pixbuf.new_from_file(str(path))
+            elif generation == self._generation:
+                pixbuf = self._decode(clip_id)
+                if pixbuf is not None:
+                    tmp = path.with_suffix(".tmp")
+                    pixbuf.savev(str(tmp), "png", [], [])
+                    os.replace(tmp, path)
+        except Exception:
+            pixbuf = None
+        GLib.idle_add(self._deliver, key, pixbuf, generation)
+
+    def _decode(self, clip_id: str):
+        data = self._history.decode(clip_id)
+        if not data:
+            return None
+        size = self.size
+        loader = GdkPixbuf.PixbufLoader()
+        # Декодер сразу отдаёт картинку нужного размера, без полноразмерного буфера
+        loader.connect("size-prepared", lambda ldr, *_: ldr.set_size(size, size))
+        loader.write(data)
+        loader.close()
+        return loader.get_pixbuf()
+
+    def _deliver(self, key: str, pixbuf, generation: int):
+        if pixbuf is not None:
+            self._memory[key] = pixbuf
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.MAX_MEMORY_ITEMS:
+                self._memory.popitem(last=False)
+
+        # Задача прошлого поколения: ожидающие в _pending уже ждут новую
+        # задачу для того же ключа, и забирать их нельзя
+        if generation != self._generation:
+            return False
+        waiters = self._pending.pop(key, ())
+        if pixbuf is None:
+            return False
+
+        for widget in waiters:
+            if getattr(widget, "_clip_thumb_key", None) == key and widget.get_mapped():
+                widget.set_from_pixbuf(pixbuf)
+        return False
+
+    def prune(self, valid_ids):
+        """Удаляет с диска превью записей, которых больше нет в истории."""
+        valid_ids = set(valid_ids)
+
+        def worker():
+            try:
+                for item in os.scandir(self.CACHE_DIR):
+                    clip_id = item.name.split("-", 1)[0]
+                    if clip_id not in valid_ids:
+                        os.unlink(item.path)
+            except OSError:
+                pass
+
+        self._executor.submit(worker)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self._memory.clear()
+        self._pending.clear()
+
+
+class ClipboardHistory(Service):
+    """Общая для всех мониторов модель `cliphist`, живущая в памяти.
+
+    Загружается один раз в фоне и обновляется по изменению базы cliphist,
+    которую наполняют `wl-paste --watch cliphist store` из автостарта.
+    """
+
+    instance = None
+    RELOAD_DELAY_MS = 150
+
+    @staticmethod
+    def get_initial():
+        if not ClipboardHistory.instance:
+            ClipboardHistory.instance = ClipboardHistory()
+        return ClipboardHistory.instance
+
+    @Signal
+    def changed(self) -> None: ...
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.model = ClipModel()
+        self.loaded = False
+        self._loading = False
+        self._dirty = False
+        self._reload_id = 0
+        self.thumbnails = ClipThumbnailer(self)
+
+        self.monitor = monitor_file(get_cliphist_db_path())
+        self.handler_id = self.monitor.connect("changed", self._on_db_changed)
+        self.reload()
+
+    def _on_db_changed(self, *args):
+        # Одна вставка порождает серию событий — сливаем их в одну перезагрузку
+        if self._reload_id:
+            GLib.source_remove(self._reload_id)
+        self._reload_id = GLib.timeout_add(self.RELOAD_DELAY_MS, self._on_reload_timeout)
+
+    def _on_reload_timeout(self):
+        self._reload_id = 0
+        self.reload()
+        return False
+
+    def reload(self):
+        if self._loading:
+            self._dirty = True
+            return
+        self._loading = True
+        threading.Thread(target=self._load_worker, daemon=True).start()
+
+    def _load_worker(self):
+        try:
+            raw = subprocess.run(["cliphist", "list"], capture_output=True).stdout.decode(errors="ignore")
+        except OSError:
+            raw = ""
+        GLib.idle_add(self._apply_listing, raw)
+
+    def _apply_listing(self, raw: str):
+        self._loading = False
+        changed = self.model.apply_listing(raw) or not self.loaded
+        self.loaded = True
+        if self._dirty:
+            self._dirty = False
+            self.reload()
+        if changed:
+            self.thumbnails.prune(e.id for e in self.model.entries if e.is_image)
+            self.emit("changed")
+        return False
+
+    def filter(self, query: str = ""):
+        return self.model.filter(query)
+
+    def decode(self, clip_id: str) -> bytes:
+        return subprocess.run(["cliphist", "decode", clip_id], capture_output=True).stdout
+
+    def wipe(self):
+        self.model.clear()
+        self.emit("changed")
+        self._run_async(["cliphist", "wipe"])
+
+    def _run_async(self, cmd):
+        def worker():
+            try:
+                subprocess.run(cmd, capture_output=True)
+            except OSError:
+                pass
+            GLib.idle_add(lambda: (self.reload(), False)[1])
+
+        threading.Thread(target=worker, daemon=True).start()
+
+    def destroy(self):
+        if self._reload_id:
+            GLib.source_remove(self._reload_id)
+            self._reload_id = 0
+        if getattr(self, "monitor", None):
+            self.monitor.disconnect(self.handler_id)
+            self.monitor.cancel()
+            self.monitor = None
+        self.thumbnails.shutdown()
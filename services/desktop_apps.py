@@ -0,0 +1,447 @@
+from fabric.core.service import Service, Signal
+
+import gi
+gi.require_version("Gtk", "3.0")
+from gi.repository import GdkPixbuf, Gio, GLib, Gtk
+
+import json
+import os
+import shutil
+import threading
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, List, Optional
+
+
+def get_applications_dirs() -> List[str]:
+    """Каталоги applications по XDG в порядке приоритета (пользовательский первым)."""
+    dirs = [GLib.get_user_data_dir()] + list(GLib.get_system_data_dirs())
+    seen = set()
+    result = []
+    for base in dirs:
+        path = os.path.join(base, "applications")
+        if path not in seen:
+            seen.add(path)
+            result.append(path)
+    return result
+
+
+@lru_cache(maxsize=512)
+def normalize_class(name: str) -> str:
+    """Класс окна без регистра, заголовка и суффиксов вроде -bin/.exe (с мемоизацией)."""
+    if not name: return ""
+    n = name.lower()
+    if " - " in n:
+        n = n.split(" - ")[0].strip()
+    for s in (".bin", ".exe", ".so", "-bin", "-gtk"):
+        if n.endswith(s): return n[:-len(s)]
+    return n
+
+
+def _current_desktops() -> set:
+    return {d for d in os.environ.get("XDG_CURRENT_DESKTOP", "").casefold().split(":") if d}
+
+
+class DesktopEntry:
+    """Разобранный .desktop-файл с тем же API, что и fabric DesktopApp.
+
+    Gio.DesktopAppInfo создаётся лениво — только для запуска.
+    """
+
+    # Порядок полей в дисковом кэше
+    FIELDS = (
+        "desktop_id", "name", "generic_name", "display_name", "description",
+        "window_class", "executable", "command_line", "icon_name",
+        "no_display", "only_show_in", "not_show_in", "try_exec",
+    )
+
+    __slots__ = ("path", "mtime", "_app_info") + FIELDS
+
+    def __init__(self, path: str, mtime: int, values):
+        self.path = path
+        self.mtime = mtime
+        self._app_info = None
+        for field, value in zip(self.FIELDS, values):
+            setattr(self, field, value)
+
+    @classmethod
+    def parse(cls, path: str, mtime: int, desktop_id: str) -> Optional["DesktopEntry"]:
+        kf = GLib.KeyFile.new()
+        try:
+            kf.load_from_file(path, GLib.KeyFileFlags.NONE)
+        except GLib.Error:
+            return None
+
+        group = GLib.KEY_FILE_DESKTOP_GROUP
+
+        def string(key, localized=False):
+            try:
+                if localized:
+                    return kf.get_locale_string(group, key, None)
+                return kf.get_string(group, key)
+            except GLib.Error:
+                return None
+
+        def boolean(key):
+            try:
+                return kf.get_boolean(group, key)
+            except GLib.Error:
+                return False
+
+        def strings(key):
+            try:
+                return [s.casefold() for s in kf.get_string_list(group, key)]
+            except GLib.Error:
+                return []
+
+        # Hidden=true — запись "удалена"; такие файлы перекрывают системные
+        # и должны скрывать их, поэтому сохраняем как пустую запись
+        if string("Type") != "Application" or boolean("Hidden"):
+            return cls(path, mtime, (desktop_id,) + (None,) * 8 + (True, [], [], None))
+
+        name = string("Name", True)
+        command_line = string("Exec")
+        executable = None
+        if command_line:
+            try:
+                executable = GLib.shell_parse_argv(command_line)[1][0]
+            except GLib.Error:
+                executable = command_line.split()[0]
+
+        return cls(path, mtime, (
+            desktop_id,
+            name,
+            string("GenericName", True),
+            string("X-GNOME-FullName", True) or name,
+            string("Comment", True),
+            string("StartupWMClass"),
+            executable,
+            command_line,
+            string("Icon"),
+            boolean("NoDisplay") or not name,
+            strings("OnlyShowIn"),
+            strings("NotShowIn"),
+            string("TryExec"),
+        ))
+
+    def to_cache(self):
+        return [self.mtime] + [getattr(self, field) for field in self.FIELDS]
+
+    @classmethod
+    def from_cache(cls, path: str, data) -> "DesktopEntry":
+        return cls(path, data[0], data[1:])
+
+    def should_show(self, desktops: set) -> bool:
+        if self.no_display:
+            return False
+        if self.only_show_in and not desktops.intersection(self.only_show_in):
+            return False
+        if self.not_show_in and desktops.intersection(self.not_show_in):
+            return False
+        if self.try_exec and not shutil.which(self.try_exec):
+            return False
+        return True
+
+    @property
+    def hidden(self) -> bool:
+        return bool(self.no_display)
+
+    @property
+    def app_info(self) -> Optional[Gio.DesktopAppInfo]:
+        if self._app_info is None:
+            self._app_info = Gio.DesktopAppInfo.new_from_filename(self.path)
+        return self._app_info
+
+    def launch(self) -> bool:
+        info = self.app_info
+        if info is None:
+            return False
+        try:
+            return info.launch([], None)
+        except GLib.Error:
+            return False
+
+    def get_icon_pixbuf(
+        self,
+        size: int = 48,
+        default_icon: Optional[str] = "image-missing",
+        flags: Gtk.IconLookupFlags = Gtk.IconLookupFlags.FORCE_SIZE,
+    ) -> Optional[GdkPixbuf.Pixbuf]:
+        icon = self.icon_name
+        theme = Gtk.IconTheme.get_default()
+        available = bool(icon) and (os.path.exists(icon) if os.path.isabs(icon) else theme.has_icon(icon))
+        if available:
+            if flags == Gtk.IconLookupFlags.FORCE_SIZE:
+                # Общий LRU-кэш резолвера: лаунчер, док и Overview делят отрисовки
+                from utils.icon_resolver import get_icon_resolver
+                pixbuf = get_icon_resolver().load_icon(icon, size)
+                if pixbuf is not None:
+                    return pixbuf
+            try:
+                if os.path.isabs(icon):
+                    return GdkPixbuf.Pixbuf.new_from_file_at_size(icon, size, size)
+                return theme.load_icon(icon, size, flags)
+            except GLib.Error:
+                pass
+        if default_icon:
+            try:
+                return theme.load_icon(default_icon, size, flags)
+            except GLib.Error:
+                pass
+        return None
+
+
+class DesktopAppIndex(Service):
+    """Общий индекс установленных приложений.
+
+    .desktop-файлы разбираются один раз; результат хранится на диске с
+    ключом (путь, mtime), так что холодный старт сводится к stat каталогов.
+    Каталоги applications отслеживаются Gio.FileMonitor, при изменении
+    перечитываются только новые и изменённые файлы.
+    """
+
+    instance = None
+    CACHE_VERSION = 1
+    CACHE_FILE = Path(GLib.get_user_cache_dir()) / "vidgex-shell" / "desktop_apps.json"
+    RESCAN_DELAY_MS = 300
+
+    @staticmethod
+    def get_initial():
+        if not DesktopAppIndex.instance:
+            DesktopAppIndex.instance = DesktopAppIndex()
+        return DesktopAppIndex.instance
+
+    @Signal
+    def changed(self) -> None: ...
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._locale = GLib.get_language_names()[0]
+        self._entries: Dict[str, DesktopEntry] = {}  # путь -> запись
+        self._broken: Dict[str, int] = {}  # путь -> mtime файла, который не разобрался
+        self.apps: List[DesktopEntry] = []
+        self.identifiers: Dict[str, DesktopEntry] = {}
+        self._by_id: Dict[str, DesktopEntry] = {}
+        self._by_id_folded: Dict[str, DesktopEntry] = {}
+        self._wm_classes: Dict[str, DesktopEntry] = {}
+        self._class_cache: Dict[str, Optional[DesktopEntry]] = {}  # класс окна -> приложение или None
+        self._rescan_id = 0
+        self._monitors: Dict[str, Gio.FileMonitor] = {}  # каталог -> монитор
+
+        self._rescan(self._load_cache())
+        self._watch()
+
+    # ----------------------
+    # Дисковый кэш
+    # ----------------------
+    def _load_cache(self) -> Dict[str, DesktopEntry]:
+        try:
+            data = json.loads(self.CACHE_FILE.read_text())
+        except (OSError, ValueError):
+            return {}
+        if data.get("version") != self.CACHE_VERSION or data.get("locale") != self._locale:
+            return {}
+        try:
+            return {path: DesktopEntry.from_cache(path, item) for path, item in data["entries"].items()}
+        except (KeyError, TypeError, ValueError):
+            return {}
+
+    def _save_cache(self):
+        data = {
+            "version": self.CACHE_VERSION,
+            "locale": self._locale,
+            "entries": {path: entry.to_cache() for path, entry in self._entries.items()},
+        }
+
+        def worker():
+            try:
+                self.CACHE_FILE.parent.mkdir(parents=True, exist_ok=True)
+                tmp = self.CACHE_FILE.with_suffix(".tmp")
+                tmp.write_text(json.dumps(data, separators=(",", ":")))
+                os.replace(tmp, self.CACHE_FILE)
+            except OSError:
+                pass
+
+        threading.Thread(target=worker, daemon=True).start()
+
+    # ----------------------
+    # Сканирование
+    # ----------------------
+    def _rescan(self, known: Dict[str, DesktopEntry]) -> bool:
+        """Обходит каталоги; разбирает только файлы с новым mtime.
+
+        Возвращает True, если набор записей изменился.
+        """
+        entries = {}
+        by_id = {}
+        broken = {}
+
+        for root in get_applications_dirs():
+            for dirpath, _, filenames in os.walk(root):
+                for filename in filenames:
+                    if not filename.endswith(".desktop"):
+                        continue
+                    path = os.path.join(dirpath, filename)
+                    try:
+                        mtime = os.stat(path).st_mtime_ns
+                    except OSError:
+                        continue
+                    if self._broken.get(path) == mtime:
+                        # Нечитаемый файл не разбирается заново, пока его не изменят
+                        broken[path] = mtime
+                        continue
+                    entry = known.get(path)
+                    if entry is None or entry.mtime != mtime:
+                        desktop_id = os.path.relpath(path, root).replace(os.sep, "-")
+                        entry = DesktopEntry.parse(path, mtime, desktop_id)
+                        if entry is None:
+                            broken[path] = mtime
+                            continue
+                    entries[path] = entry
+                    # Каталоги идут по приоритету: первый файл с таким id побеждает
+                    by_id.setdefault(entry.desktop_id, entry)
+
+        # Изменение — только другой набор записей, а не сам факт разбора
+        changed = entries.keys() != known.keys() or any(entry is not known[path] for path, entry in entries.items())
+        self._broken = broken
+        self._entries = entries
+        self._by_id = by_id
+        self._rebuild_views()
+        if changed:
+            self._save_cache()
+        return changed
+
+    def _rebuild_views(self):
+        desktops = _current_desktops()
+        apps = [e for e in self._by_id.values() if e.should_show(desktops)]
+        apps.sort(key=lambda a: (a.display_name or "").casefold())
+        self.apps = apps
+        # Без пустых записей Hidden=true и не-Application: скрытый пользователем
+        # firefox.desktop не должен превращать класс окна в кнопку без имени и
+        # иконки. NoDisplay-записи остаются — у них есть Exec и иконка
+        self._by_id_folded = {
+            desktop_id.lower(): app for desktop_id, app in self._by_id.items() if app.name is not None
+        }
+
+        # Те же ключи, что использовал док: имя, класс окна, исполняемый файл
+        identifiers = {}
+        for app in apps:
+            keys = [app.name, app.display_name, app.window_class]
+            if app.executable: keys.append(app.executable.split('/')[-1])
+            if app.command_line: keys.append(app.command_line.split()[0].split('/')[-1])
+            for k in keys:
+                if k: identifiers[str(k).lower()] = app
+        self.identifiers = identifiers
+
+        # StartupWMClass — самое точное соответствие окна приложению,
+        # поэтому учитываем его и у записей, скрытых из меню
+        wm_classes = {}
+        for entry in self._by_id.values():
+            if entry.window_class:
+                wm_classes.setdefault(entry.window_class.lower(), entry)
+        self._wm_classes = wm_classes
+        self._class_cache = {}
+
+    # ----------------------
+    # Отслеживание изменений
+    # ----------------------
+    def _watch(self):
+        """Ставит мониторы на ещё не отслеживаемые каталоги и снимает с исчезнувших.
+
+        Вызывается и после каждого пересмотра, чтобы подхватить каталоги,
+        созданные, пока монитора на них не было.
+        """
+        roots = get_applications_dirs()
+        for path in [p for p in self._monitors if p not in roots and not os.path.isdir(p)]:
+            self._monitors.pop(path).cancel()
+        for root in roots:
+            # Несуществующий корень тоже отслеживается: GIO следит за ближайшим
+            # существующим предком и сообщит о создании каталога (CREATED)
+            self._watch_dir(root)
+            self._watch_tree(root)
+
+    def _watch_tree(self, top: str):
+        for dirpath, _, _ in os.walk(top):
+            self._watch_dir(dirpath)
+
+    def _watch_dir(self, path: str):
+        if path in self._monitors:
+            return
+        try:
+            monitor = Gio.File.new_for_path(path).monitor_directory(Gio.FileMonitorFlags.NONE, None)
+        except GLib.Error:
+            return
+        monitor.connect("changed", self._on_dir_changed)
+        self._monitors[path] = monitor
+
+    def _on_dir_changed(self, monitor, file, other_file, event):
+        if event == Gio.FileMonitorEvent.CREATED:
+            path = file.get_path()
+            # Новый подкаталог (например, kde4/): его файлы тоже должны отслеживаться
+            if path and os.path.isdir(path):
+                self._watch_tree(path)
+        # Установка пакета — это пачка событий: сливаем их в один пересмотр
+        if self._rescan_id:
+            GLib.source_remove(self._rescan_id)
+        self._rescan_id = GLib.timeout_add(self.RESCAN_DELAY_MS, self._on_rescan_timeout)
+
+    def _on_rescan_timeout(self):
+        self._rescan_id = 0
+        if self._rescan(self._entries):
+            self.emit("changed")
+        self._watch()
+        return False
+
+    # ----------------------
+    # Запросы
+    # ----------------------
+    def lookup(self, key: str) -> Optional[DesktopEntry]:
+        """Приложение по имени, классу окна или исполняемому файлу."""
+        if not key:
+            return None
+        return self.identifiers.get(key.lower())
+
+    def resolve_class(self, window_class: str) -> Optional[DesktopEntry]:
+        """Приложение для класса окна; промахи тоже кэшируются до изменения индекса."""
+        if not window_class:
+            return None
+        try:
+            return self._class_cache[window_class]
+        except KeyError:
+            pass
+        app = self._resolve_class(window_class)
+        self._class_cache[window_class] = app
+        return app
+
+    def _resolve_class(self, window_class: str) -> Optional[DesktopEntry]:
+        raw = window_class.lower()
+        norm = normalize_class(window_class)
+        candidates = [raw, norm]
+        # org.gnome.Nautilus -> nautilus
+        if "." in norm:
+            candidates.append(norm.rsplit(".", 1)[-1])
+
+        for key in candidates:
+            app = self._wm_classes.get(key)
+            if app: return app
+        for key in candidates:
+            app = self._by_id_folded.get(key + ".desktop") or self.identifiers.get(key)
+            if app: return app
+        return None
+
+    def entries(self) -> List[DesktopEntry]:
+        """Все действующие записи, включая скрытые из меню (по одной на desktop id)."""
+        return list(self._by_id.values())
+
+    def get_by_id(self, desktop_id: str) -> Optional[DesktopEntry]:
+        if not desktop_id.endswith(".desktop"):
+            desktop_id += ".desktop"
+        return self._by_id.get(desktop_id)
+
+    def destroy(self):
+        if self._rescan_id:
+            GLib.source_remove(self._rescan_id)
+            self._rescan_id = 0
+        for monitor in self._monitors.values():
+            monitor.cancel()
+        self._monitors.clear()
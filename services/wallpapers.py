@@ -0,0 +1,482 @@
+from fabric.core.service import Service, Signal
+from fabric.utils.helpers import exec_shell_command_async
+
+import gi
+gi.require_version("Gtk", "3.0")
+from gi.repository import GdkPixbuf, Gio, GLib, Gtk
+
+import bisect
+import collections
+import json
+import os
+import random
+import re
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict
+
+from utils.palettes import get_palette_cache
+from utils.thumb_store import ThumbStore, file_key
+from utils.thumbnailer import Thumbnailer
+from utils.wallpaper_variants import get_wallpaper_variants
+
+
+class WallpaperCatalog(Service):
+    """Общий каталог обоев для всех дашбордов.
+
+    Один обход ~/Wallpapers, один набор Gio.FileMonitor, одна очередь
+    миниатюр и один конфиг — сколько бы мониторов ни было. Строки живут в
+    общем Gtk.ListStore (миниатюра, имя файла, имя в casefold), а каждый
+    WallpaperSelector показывает его через собственный фильтр со своим
+    поиском. Какие миниатюры нужны, представления сообщают через
+    request_thumbnails(): очередь строится по объединению их окон.
+    """
+
+    instance = None
+    CACHE_DIR = Path(GLib.get_user_cache_dir()) / "vidgex-shell"
+    THUMBS_DIR = CACHE_DIR / "thumbs"
+    CONFIG_FILE = CACHE_DIR / "wallpaper_config.json"
+    WALLPAPERS_DIR = Path.home() / "Wallpapers"
+    CURRENT_WALL = Path.home() / ".current.wall"
+    THUMBNAIL_SIZE = 96
+    MAX_THUMBNAILS = 1024  # Декодированных миниатюр в памяти: ~36 МиБ при 96x96 RGBA
+    SCAN_BATCH_MAX = 1024  # Партии сканирования растут от 64 до этого размера
+    MAX_RECENT = 10
+    IMAGE_EXTENSIONS = frozenset({".png", ".jpg", ".jpeg", ".bmp", ".gif", ".webp"})
+    _LEGACY_THUMB = re.compile(r"[0-9a-f]{32}\.png")
+
+    SCHEMES = {
+        "scheme-tonal-spot": "Tonal Spot",
+        "scheme-content": "Content",
+        "scheme-expressive": "Expressive",
+        "scheme-fidelity": "Fidelity",
+        "scheme-fruit-salad": "Fruit Salad",
+        "scheme-monochrome": "Monochrome",
+        "scheme-neutral": "Neutral",
+        "scheme-rainbow": "Rainbow",
+    }
+
+    @staticmethod
+    def get_initial():
+        if not WallpaperCatalog.instance:
+            WallpaperCatalog.instance = WallpaperCatalog()
+        return WallpaperCatalog.instance
+
+    @Signal
+    def changed(self) -> None: ...
+
+    @Signal
+    def scheme_changed(self, scheme: str) -> None: ...
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._init_directories()
+        self.files = []
+        self.thumbnails = collections.OrderedDict()  # имя файла -> пиксбуф, по давности запроса
+        self.config = self._load_config()
+        self.store = Gtk.ListStore(GdkPixbuf.Pixbuf, str, str)
+        self._rows = {}  # имя файла -> Gtk.TreeRowReference в self.store
+        self._placeholder = self._make_placeholder()
+        self._file_keys = {}  # путь относительно WALLPAPERS_DIR -> (inode, размер, mtime_ns)
+        self._monitors = {}   # каталог -> Gio.FileMonitor
+        self._wants = {}      # представление -> {имя файла: расстояние до видимых}
+        self._next_random = None  # выбран заранее, чтобы его вариант успел подготовиться
+        # Поток — только для чтения каталога; миниатюры считает пул процессов
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._load_lock = threading.Lock()
+        self._thumbnailer = Thumbnailer(self.THUMBNAIL_SIZE, self._on_thumbnail_ready)
+        self._thumb_store = ThumbStore(str(self.THUMBS_DIR), self.THUMBNAIL_SIZE)
+        self._palettes = get_palette_cache()
+        self._variants = get_wallpaper_variants()
+        self._executor.submit(self._load_wallpapers)
+
+    # ----------------------
+    # Init
+    # ----------------------
+    def _init_directories(self):
+        old_cache = self.CACHE_DIR / "wallpapers"
+        if old_cache.exists():
+            shutil.rmtree(old_cache)
+
+        self.CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        self.THUMBS_DIR.mkdir(parents=True, exist_ok=True)
+        self.WALLPAPERS_DIR.mkdir(parents=True, exist_ok=True)
+
+    def _load_config(self):
+        defaults = {
+            "current_wallpaper": None,
+            "color_scheme": "scheme-tonal-spot",
+            "recent_wallpapers": []
+        }
+        if self.CONFIG_FILE.exists():
+            with open(self.CONFIG_FILE) as f:
+                config = json.load(f)
+            return {**defaults, **config}
+        return defaults
+
+    def _save_config(self):
+        with open(self.CONFIG_FILE, 'w') as f:
+            json.dump(self.config, f, indent=2)
+
+    def _make_placeholder(self):
+        # Общая заглушка для строк, чья миниатюра ещё загружается
+        size = self.THUMBNAIL_SIZE
+        pixbuf = GdkPixbuf.Pixbuf.new(GdkPixbuf.Colorspace.RGB, True, 8, size, size)
+        pixbuf.fill(0x80808033)
+        return pixbuf
+
+    # ----------------------
+    # Сканирование
+    # ----------------------
+    def _load_wallpapers(self):
+        # Манифест миниатюр читается одним read(), пакет отображается в память
+        self._thumb_store.load()
+        self._remove_legacy_thumbnails()
+
+        keys = self._scan(str(self.WALLPAPERS_DIR))
+        GLib.idle_add(self._apply_saved_config)
+        self._thumb_store.compact(keys)
+
+    def _scan(self, top):
+        """Рекурсивный обход top в фоне; найденное уходит в модель партиями."""
+        root = str(self.WALLPAPERS_DIR)
+        batch, keys = [], []
+        batch_size = 64
+        stack = [top]
+        while stack:
+            path = stack.pop()
+            GLib.idle_add(self._watch_dir, path)
+            try:
+                it = os.scandir(path)
+            except OSError:
+                continue
+            with it:
+                for entry in it:
+                    if entry.name.startswith("."):
+                        continue
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append(entry.path)
+                            continue
+                        if not (self.is_image(entry.name) and entry.is_file()):
+                            continue
+                        key = file_key(entry.stat())
+                    except OSError:
+                        continue
+                    keys.append(key)
+                    batch.append((entry.path[len(root) + 1:], key))
+                    # Первая партия маленькая — сетка появляется сразу
+                    if len(batch) >= batch_size:
+                        GLib.idle_add(self._add_batch, batch)
+                        batch = []
+                        batch_size = min(batch_size * 2, self.SCAN_BATCH_MAX)
+        if batch:
+            GLib.idle_add(self._add_batch, batch)
+        return keys
+
+    def _add_batch(self, batch):
+        with self._load_lock:
+            for filename, key in batch:
+                self._file_keys[filename] = key
+                if filename in self._rows:
+                    continue
+                position = bisect.bisect(self.files, filename)
+                self.files.insert(position, filename)
+                self._append_row(filename, position)
+        self.emit("changed")
+        return False
+
+    def _row_for(self, filename, pixbuf=None):
+        return [pixbuf or self.thumbnails.get(filename) or self._placeholder, filename, filename.casefold()]
+
+    def _append_row(self, filename, position=-1):
+        it = self.store.insert(position, self._row_for(filename))
+        self._rows[filename] = Gtk.TreeRowReference.new(self.store, self.store.get_path(it))
+
+    def _remove_row(self, filename):
+        ref = self._rows.pop(filename, None)
+        if ref is not None and ref.valid():
+            self.store.remove(self.store.get_iter(ref.get_path()))
+
+    def _remove_legacy_thumbnails(self):
+        # Миниатюры прежнего формата: md5(имя файла).png прямо в CACHE_DIR
+        try:
+            with os.scandir(self.CACHE_DIR) as it:
+                for entry in it:
+                    if self._LEGACY_THUMB.fullmatch(entry.name):
+                        os.unlink(entry.path)
+        except OSError:
+            pass
+
+    @classmethod
+    def is_image(cls, filename):
+        return Path(filename).suffix.lower() in cls.IMAGE_EXTENSIONS
+
+    def __contains__(self, filename):
+        return filename in self._file_keys
+
+    # ----------------------
+    # Миниатюры
+    # ----------------------
+    def request_thumbnails(self, view, wanted: Dict[str, int]):
+        """Окно миниатюр представления view: имя файла -> расстояние до видимых.
+
+        Очередь строится по объединению окон всех представлений (берётся
+        меньшее расстояние); пустой wanted снимает заявку view. Уже
+        загруженные миниатюры тоже входят в окно: по нему решается, какие
+        из них можно выгрузить.
+        """
+        if wanted:
+            self._wants[view] = wanted
+        else:
+            self._wants.pop(view, None)
+        merged = {}
+        for window in self._wants.values():
+            for filename, distance in window.items():
+                if distance < merged.get(filename, distance + 1):
+                    merged[filename] = distance
+        missing = {}
+        with self._load_lock:
+            for filename, distance in merged.items():
+                if filename in self.thumbnails:
+                    self.thumbnails.move_to_end(filename)
+                else:
+                    missing[filename] = distance
+        # Всё, что ушло за пределы окон и ещё не начато, снимается
+        self._thumbnailer.retain(missing)
+        for filename, distance in missing.items():
+            self._load_thumbnail(filename, priority=distance)
+        self._trim_thumbnails(merged)
+
+    def _trim_thumbnails(self, keep):
+        """Выгружает давно не запрошенные миниатюры сверх MAX_THUMBNAILS.
+
+        Строки возвращаются к заглушке; из ThumbStore миниатюра снова
+        читается без пересчёта, когда строка опять попадёт в окно.
+        """
+        evicted = []
+        with self._load_lock:
+            excess = len(self.thumbnails) - self.MAX_THUMBNAILS
+            if excess <= 0:
+                return
+            for filename in self.thumbnails:
+                if len(evicted) >= excess:
+                    break
+                if filename not in keep:
+                    evicted.append(filename)
+            for filename in evicted:
+                del self.thumbnails[filename]
+        for filename in evicted:
+            ref = self._rows.get(filename)
+            if ref is not None and ref.valid():
+                self.store[ref.get_path()][0] = self._placeholder
+
+    def _load_thumbnail(self, filename, priority=0):
+        key = self._file_keys.get(filename)
+        data = self._thumb_store.get(key)
+        if data is not None:
+            self._set_thumbnail(filename, data)
+            return
+        # Чем меньше priority, тем раньше миниатюра будет готова. Ключ
+        # содержимого едет вместе с заданием: файл могут перезаписать, пока
+        # миниатюра считается
+        full_path = self.WALLPAPERS_DIR / filename
+        self._thumbnailer.request(filename, str(full_path), priority, token=key)
+
+    def _on_thumbnail_ready(self, filename, data, key):
+        # Вызывается из служебного потока пула: запись в пакет — здесь же,
+        # под ключом того содержимого, с которого считалась миниатюра
+        if data is None or key is None:
+            return
+        self._thumb_store.put(key, data)
+        if self._file_keys.get(filename) == key:
+            GLib.idle_add(self._set_thumbnail, filename, data)
+
+    def _set_thumbnail(self, filename, data):
+        loader = GdkPixbuf.PixbufLoader.new_with_type("png")
+        try:
+            loader.write(data)
+            loader.close()
+        except GLib.Error:
+            return False
+        pixbuf = loader.get_pixbuf()
+        with self._load_lock:
+            self.thumbnails[filename] = pixbuf
+        ref = self._rows.get(filename)
+        if ref is not None and ref.valid():
+            self.store[ref.get_path()][0] = pixbuf
+        return False
+
+    # ----------------------
+    # Применение
+    # ----------------------
+    @property
+    def scheme(self) -> str:
+        return self.config.get("color_scheme", "scheme-tonal-spot")
+
+    def _apply_saved_config(self):
+        saved = self.config.get("current_wallpaper")
+        if saved and Path(saved).exists():
+            name = os.path.relpath(saved, self.WALLPAPERS_DIR)
+            if name in self._file_keys:
+                self.apply_wallpaper(name, notify=False)
+        self._pick_next_random()
+        return False
+
+    def apply_wallpaper(self, filename, notify=False) -> bool:
+        if filename not in self._file_keys:
+            return False
+
+        full_path = self.WALLPAPERS_DIR / filename
+        scheme = self.scheme
+        try:
+            if self.CURRENT_WALL.exists() or self.CURRENT_WALL.is_symlink():
+                self.CURRENT_WALL.unlink()
+            self.CURRENT_WALL.symlink_to(full_path)
+        except OSError:
+            return False
+
+        for output, path in self._variants.resolve(str(full_path)):
+            # Список аргументов: кавычки и $ в именах файлов не ломают команду
+            target = ["-o", output] if output else []
+            exec_shell_command_async([
+                "awww", "img", *target, path, "--type", "outer",
+                "--transition-duration", "0.5", "--transition-step", "255", "--transition-fps", "60",
+            ])
+        self._palettes.apply(str(full_path), scheme)
+
+        self.config["current_wallpaper"] = str(full_path)
+        recent = self.config.get("recent_wallpapers", [])
+        if str(full_path) in recent:
+            recent.remove(str(full_path))
+        recent.insert(0, str(full_path))
+        self.config["recent_wallpapers"] = recent[:self.MAX_RECENT]
+        self._save_config()
+        self._prefetch_palettes(str(full_path), scheme)
+
+        if notify:
+            exec_shell_command_async([
+                "notify-send", "🎲 Wallpaper", "Random wallpaper set 🎨",
+                "-a", "Vidgex-Shell", "-i", str(full_path), "-e",
+            ])
+        return True
+
+    def set_random_wallpaper(self, notify=False) -> bool:
+        if not self.files:
+            return False
+        filename = self._next_random if self._next_random in self._file_keys else random.choice(self.files)
+        applied = self.apply_wallpaper(filename, notify=notify)
+        self._pick_next_random()
+        return applied
+
+    def _pick_next_random(self):
+        if self.files:
+            self._next_random = random.choice(self.files)
+            self.prepare(self._next_random)
+
+    def prepare(self, filename):
+        """Заранее готовит варианты обоев под мониторы (см. WallpaperVariants)."""
+        if filename in self._file_keys:
+            self._variants.prepare([str(self.WALLPAPERS_DIR / filename)])
+
+    def set_scheme(self, scheme: str):
+        if scheme not in self.SCHEMES or scheme == self.scheme:
+            return
+        self.config["color_scheme"] = scheme
+        self._save_config()
+        if self.CURRENT_WALL.is_symlink():
+            actual = self.CURRENT_WALL.resolve()
+            if actual.exists():
+                self._palettes.apply(str(actual), scheme)
+                self._prefetch_palettes(str(actual), scheme)
+        self.emit("scheme-changed", scheme)
+
+    def _prefetch_palettes(self, wallpaper, scheme):
+        # В простое: остальные схемы для текущих обоев и текущая — для недавних
+        jobs = [(wallpaper, other) for other in self.SCHEMES if other != scheme]
+        jobs += [(recent, scheme) for recent in self.config.get("recent_wallpapers", []) if recent != wallpaper]
+        self._palettes.prefetch(jobs)
+
+    # ----------------------
+    # Отслеживание изменений
+    # ----------------------
+    def _watch_dir(self, path):
+        if path not in self._monitors:
+            try:
+                monitor = Gio.File.new_for_path(path).monitor_directory(Gio.FileMonitorFlags.NONE, None)
+            except GLib.Error:
+                return False
+            monitor.connect("changed", self._on_dir_changed)
+            self._monitors[path] = monitor
+        return False
+
+    def _on_dir_changed(self, monitor, file, other_file, event_type):
+        path = file.get_path()
+        root = str(self.WALLPAPERS_DIR)
+        if not path or not path.startswith(root + os.sep) or file.get_basename().startswith("."):
+            return
+        filename = path[len(root) + 1:]
+        if event_type == Gio.FileMonitorEvent.DELETED:
+            if filename in self._file_keys:
+                self._handle_file_deleted(filename)
+            else:
+                self._handle_dir_deleted(path, filename)
+        elif event_type in (Gio.FileMonitorEvent.CREATED, Gio.FileMonitorEvent.CHANGED):
+            if os.path.isdir(path):
+                if event_type == Gio.FileMonitorEvent.CREATED and path not in self._monitors:
+                    self._executor.submit(self._scan, path)
+            else:
+                self._handle_file_created_or_changed(filename)
+
+    def _handle_dir_deleted(self, path, filename):
+        prefix = filename + os.sep
+        for name in [f for f in self._file_keys if f.startswith(prefix)]:
+            self._handle_file_deleted(name)
+        for watched in [p for p in self._monitors if p == path or p.startswith(path + os.sep)]:
+            self._monitors.pop(watched).cancel()
+
+    def _handle_file_deleted(self, filename):
+        if filename not in self._file_keys:
+            return
+        with self._load_lock:
+            self.files.remove(filename)
+            self.thumbnails.pop(filename, None)
+            # Миниатюра в пакете остаётся: при переименовании ключ тот же,
+            # а мусор уберёт compact() при следующем открытии
+            self._file_keys.pop(filename, None)
+        self._thumbnailer.cancel(filename)
+        self._remove_row(filename)
+        self.emit("changed")
+
+    def _handle_file_created_or_changed(self, filename):
+        if not self.is_image(filename):
+            return
+        try:
+            key = file_key(os.stat(self.WALLPAPERS_DIR / filename))
+        except OSError:
+            return
+        with self._load_lock:
+            if filename not in self._rows:
+                position = bisect.bisect(self.files, filename)
+                self.files.insert(position, filename)
+                self._append_row(filename, position)
+            if self._file_keys.get(filename) == key and filename in self.thumbnails:
+                return
+            # Новое содержимое — новый ключ; переименованный файл найдётся по старому
+            self._file_keys[filename] = key
+            self.thumbnails.pop(filename, None)
+        # Загрузится, если попадает в окно вокруг видимых элементов
+        self.emit("changed")
+
+    def destroy(self):
+        if self._executor:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+        self._thumbnailer.shutdown()
+        self._thumb_store.close()
+        for monitor in self._monitors.values():
+            monitor.cancel()
+        self._monitors.clear()
+        self._wants.clear()
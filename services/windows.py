@@ -0,0 +1,255 @@
+from fabric.core.service import Service, Signal
+from fabric.hyprland.widgets import get_hyprland_connection
+
+from gi.repository import GLib
+
+import json
+from typing import Any, Dict, List, Optional
+
+
+class WindowInfo:
+    __slots__ = ("address", "monitor", "workspace", "rect", "solid", "window_class")
+
+    def __init__(self, client: Dict[str, Any]):
+        self.address = client.get("address")
+        self.monitor = client.get("monitor")
+        self.workspace = (client.get("workspace") or {}).get("id")
+        x, y = client.get("at") or (0, 0)
+        w, h = client.get("size") or (0, 0)
+        self.rect = (x, y, w, h)
+        # Перекрывать док могут только тайловые и полноэкранные окна
+        self.solid = not client.get("floating") or bool(client.get("fullscreen"))
+        self.window_class = client.get("initialClass") or client.get("class")
+
+    def key(self):
+        return (self.monitor, self.workspace, self.rect, self.solid)
+
+
+class Region:
+    """Прямоугольник на мониторе и счётчики перекрывающих его окон по рабочим столам."""
+
+    __slots__ = ("monitor", "rect", "members", "counts")
+
+    def __init__(self, monitor: int, rect):
+        self.monitor = monitor
+        self.rect = rect
+        self.members: Dict[str, int] = {}  # адрес окна -> рабочий стол
+        self.counts: Dict[int, int] = {}    # рабочий стол -> число перекрытий
+
+    def overlaps(self, win: WindowInfo) -> bool:
+        if not win.solid or win.monitor != self.monitor:
+            return False
+        x, y, w, h = win.rect
+        rx, ry, rw, rh = self.rect
+        return x < rx + rw and x + w > rx and y < ry + rh and y + h > ry
+
+    def discard(self, address: str):
+        ws = self.members.pop(address, None)
+        if ws is not None:
+            left = self.counts[ws] - 1
+            if left: self.counts[ws] = left
+            else: del self.counts[ws]
+
+    def update(self, win: WindowInfo):
+        self.discard(win.address)
+        if self.overlaps(win):
+            self.members[win.address] = win.workspace
+            self.counts[win.workspace] = self.counts.get(win.workspace, 0) + 1
+
+
+class WindowIndex(Service):
+    """Общий для доков и Overview индекс окон Hyprland.
+
+    Геометрия окон обновляется одним запросом `j/clients`, причём события,
+    меняющие раскладку, сливаются в один запрос на все мониторы. Смена
+    рабочего стола и активного окна берётся прямо из данных события, без IPC.
+    Для зарегистрированных областей (прямоугольник дока) хранятся счётчики
+    перекрытий по рабочим столам, так что ответ "закрыт ли док" — O(1), а
+    обновление затрагивает только изменившиеся окна.
+    """
+
+    instance = None
+    REFRESH_DELAY_MS = 50
+    LAYOUT_EVENTS = (
+        "openwindow", "closewindow", "movewindowv2", "changefloatingmode",
+        "fullscreen", "moveworkspacev2", "monitoraddedv2", "monitorremoved",
+    )
+
+    @staticmethod
+    def get_initial():
+        if not WindowIndex.instance:
+            WindowIndex.instance = WindowIndex()
+        return WindowIndex.instance
+
+    @Signal
+    def clients_changed(self) -> None: ...
+
+    @Signal
+    def workspace_changed(self) -> None: ...
+
+    @Signal
+    def active_changed(self) -> None: ...
+
+    @Signal
+    def title_changed(self, address: str) -> None: ...
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.conn = get_hyprland_connection()
+        self.clients: List[Dict[str, Any]] = []
+        self.monitors: List[Dict[str, Any]] = []
+        self.windows: Dict[str, WindowInfo] = {}
+        self.active_workspaces: Dict[int, int] = {}  # монитор -> рабочий стол
+        self.focused_monitor = 0
+        self.active_address: Optional[str] = None
+        self._monitor_ids: Dict[str, int] = {}
+        self._regions: Dict[Any, Region] = {}
+        self._refresh_id = 0
+        self._refresh_monitors = True
+
+        handlers = [(f"event::{name}", self._schedule_refresh) for name in self.LAYOUT_EVENTS]
+        handlers += [
+            ("event::workspacev2", self._on_workspace),
+            ("event::focusedmonv2", self._on_focused_monitor),
+            ("event::activewindowv2", self._on_active_window),
+            ("event::windowtitlev2", self._on_window_title),
+        ]
+        for event, handler in handlers:
+            self.conn.connect(event, handler)
+
+        if self.conn.ready:
+            self.refresh()
+        else:
+            self.conn.connect("event::ready", lambda *_: self.refresh())
+
+    def _query(self, command: str):
+        try:
+            return json.loads(self.conn.send_command(command).reply.decode())
+        except Exception:
+            return None
+
+    # ----------------------
+    # Обновление по IPC
+    # ----------------------
+    def _schedule_refresh(self, _conn=None, event=None):
+        if event is not None and event.name.startswith(("monitor", "moveworkspace")):
+            self._refresh_monitors = True
+        if not self._refresh_id:
+            self._refresh_id = GLib.timeout_add(self.REFRESH_DELAY_MS, self._on_refresh_timeout)
+
+    def _on_refresh_timeout(self):
+        self._refresh_id = 0
+        self.refresh()
+        return False
+
+    def refresh(self):
+        if self._refresh_monitors:
+            self._refresh_monitors = False
+            self._apply_monitors(self._query("j/monitors") or [])
+
+        clients = self._query("j/clients")
+        if clients is None:
+            return
+        self.clients = clients
+
+        old = self.windows
+        windows = {}
+        for client in clients:
+            win = WindowInfo(client)
+            if not win.address:
+                continue
+            windows[win.address] = win
+            prev = old.get(win.address)
+            # Счётчики областей трогаем только для изменившихся окон
+            if prev is None or prev.key() != win.key():
+                for region in self._regions.values():
+                    region.update(win)
+        for address in old.keys() - windows.keys():
+            for region in self._regions.values():
+                region.discard(address)
+
+        self.windows = windows
+        self.emit("clients-changed")
+
+    def _apply_monitors(self, monitors):
+        self.monitors = monitors
+        self._monitor_ids = {m.get("name"): m.get("id") for m in monitors}
+        for m in monitors:
+            ws = (m.get("activeWorkspace") or {}).get("id")
+            if ws is not None:
+                self.active_workspaces[m.get("id")] = ws
+            if m.get("focused"):
+                self.focused_monitor = m.get("id")
+
+    # ----------------------
+    # События без IPC
+    # ----------------------
+    def _on_workspace(self, _conn, event):
+        try:
+            ws = int(event.data[0])
+        except (IndexError, ValueError):
+            return
+        if self.active_workspaces.get(self.focused_monitor) != ws:
+            self.active_workspaces[self.focused_monitor] = ws
+            self.emit("workspace-changed")
+
+    def _on_focused_monitor(self, _conn, event):
+        try:
+            monitor = self._monitor_ids[event.data[0]]
+            ws = int(event.data[1])
+        except (IndexError, KeyError, ValueError):
+            self._refresh_monitors = True
+            self._schedule_refresh()
+            return
+        self.focused_monitor = monitor
+        if self.active_workspaces.get(monitor) != ws:
+            self.active_workspaces[monitor] = ws
+            self.emit("workspace-changed")
+
+    def _on_active_window(self, _conn, event):
+        address = event.data[0] if event.data else ""
+        if address and not address.startswith("0x"):
+            address = "0x" + address
+        self.active_address = address or None
+        self.emit("active-changed")
+
+    def _on_window_title(self, _conn, event):
+        # Заголовок меняется часто (вкладки браузера) и на геометрию не влияет:
+        # правим копию клиента на месте
+        if len(event.data) < 2:
+            return
+        address = event.data[0]
+        if not address.startswith("0x"):
+            address = "0x" + address
+        title = ",".join(event.data[1:])
+        for client in self.clients:
+            if client.get("address") == address:
+                client["title"] = title
+                self.emit("title-changed", address)
+                break
+
+    # ----------------------
+    # Запросы
+    # ----------------------
+    def active_window(self) -> Optional[WindowInfo]:
+        return self.windows.get(self.active_address) if self.active_address else None
+
+    def set_region(self, key, monitor: int, rect):
+        """Регистрирует (или перемещает) область; пересчёт — только по окнам этого монитора."""
+        region = self._regions.get(key)
+        if region is not None and region.monitor == monitor and region.rect == rect:
+            return
+        region = Region(monitor, rect)
+        for win in self.windows.values():
+            if win.monitor == monitor:
+                region.update(win)
+        self._regions[key] = region
+
+    def remove_region(self, key):
+        self._regions.pop(key, None)
+
+    def is_occluded(self, key) -> bool:
+        region = self._regions.get(key)
+        if region is None:
+            return False
+        return region.counts.get(self.active_workspaces.get(region.monitor), 0) > 0
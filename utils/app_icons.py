@@ -0,0 +1,121 @@
+import gi
+gi.require_version("Gtk", "3.0")
+from gi.repository import GLib, Gtk
+
+import threading
+import time
+from collections import OrderedDict
+
+
+class AppIconCache:
+    """Общий кэш иконок приложений для всех лаунчеров.
+
+    Тема иконок GTK не потокобезопасна, поэтому загрузка идёт в главном
+    цикле, но не в момент привязки строки: запросы копятся в очереди и
+    разбираются в idle небольшими порциями. Строка получает иконку, только
+    если всё ещё показывает то же приложение.
+    """
+
+    _instance = None
+    _lock = threading.Lock()
+
+    MAX_ITEMS = 256
+    SLICE_SECONDS = 0.004  # Бюджет одной idle-итерации
+
+    def __new__(cls):
+        with cls._lock:
+            if not cls._instance:
+                cls._instance = super().__new__(cls)
+            return cls._instance
+
+    def __init__(self):
+        if hasattr(self, '_init'): return
+        self._init = True
+        self._memory = OrderedDict()   # (icon key, size) -> pixbuf
+        self._pending = OrderedDict()  # (icon key, size) -> (app, [widget])
+        self._placeholders = {}        # size -> pixbuf
+        self._idle_id = 0
+
+        self._theme = Gtk.IconTheme.get_default()
+        self._theme.connect("changed", lambda *_: self.clear())
+
+    @staticmethod
+    def icon_key(app) -> str:
+        return getattr(app, "icon_name", None) or app.name or ""
+
+    def placeholder(self, size: int):
+        pixbuf = self._placeholders.get(size)
+        if pixbuf is None:
+            try:
+                pixbuf = self._theme.load_icon("application-x-executable", size, Gtk.IconLookupFlags.FORCE_SIZE)
+            except GLib.Error:
+                pixbuf = None
+            self._placeholders[size] = pixbuf
+        return pixbuf
+
+    def request(self, app, size: int, widget):
+        """Назначает иконку виджету: сразу из кэша или позже из очереди."""
+        key = (self.icon_key(app), size)
+        if getattr(widget, "_app_icon_key", None) == key and widget._app_icon_ready:
+            return
+        widget._app_icon_key = key
+
+        pixbuf = self._memory.get(key)
+        if pixbuf is not None:
+            self._memory.move_to_end(key)
+            widget.set_from_pixbuf(pixbuf)
+            widget._app_icon_ready = True
+            return
+
+        widget.set_from_pixbuf(self.placeholder(size))
+        widget._app_icon_ready = False
+        pending = self._pending.get(key)
+        if pending is not None:
+            pending[1].append(widget)
+            return
+        self._pending[key] = (app, [widget])
+        if not self._idle_id:
+            self._idle_id = GLib.idle_add(self._process_pending)
+
+    def cancel_pending(self):
+        """Забывает запросы строк, которые уже перепривязаны или скрыты."""
+        self._pending.clear()
+
+    def _process_pending(self):
+        deadline = time.monotonic() + self.SLICE_SECONDS
+        while self._pending:
+            key, (app, waiters) = self._pending.popitem(last=False)
+            try:
+                pixbuf = app.get_icon_pixbuf(size=key[1])
+            except Exception:
+                pixbuf = None
+            if pixbuf is None:
+                pixbuf = self.placeholder(key[1])
+            else:
+                self._store(key, pixbuf)
+
+            for widget in waiters:
+                if getattr(widget, "_app_icon_key", None) == key:
+                    widget.set_from_pixbuf(pixbuf)
+                    widget._app_icon_ready = True
+
+            if time.monotonic() >= deadline:
+                return True
+
+        self._idle_id = 0
+        return False
+
+    def _store(self, key, pixbuf):
+        self._memory[key] = pixbuf
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.MAX_ITEMS:
+            self._memory.popitem(last=False)
+
+    def clear(self):
+        # Уже показанные иконки остаются; новые привязки загрузят их заново
+        self._memory.clear()
+        self._placeholders.clear()
+
+
+def get_app_icon_cache() -> AppIconCache:
+    return AppIconCache()
@@ -0,0 +1,240 @@
+import collections
+import hashlib
+import os
+import threading
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+import gi
+gi.require_version("GdkPixbuf", "2.0")
+from gi.repository import GdkPixbuf, GLib
+
+
+def decode_at_size(data: bytes, size: int) -> Optional[GdkPixbuf.Pixbuf]:
+    """Декодирует изображение так, чтобы меньшая сторона была не больше size.
+
+    Масштаб задаётся в size-prepared, то есть до распаковки: загрузчик
+    сразу выдаёт пиксбуф нужного размера без полноразмерной копии.
+    """
+    loader = GdkPixbuf.PixbufLoader()
+
+    def on_size_prepared(loader, width, height):
+        scale = size / min(width, height)
+        if scale < 1:
+            loader.set_size(max(1, round(width * scale)), max(1, round(height * scale)))
+
+    loader.connect("size-prepared", on_size_prepared)
+    try:
+        loader.write(data)
+        loader.close()
+    except GLib.Error:
+        try:
+            loader.close()
+        except GLib.Error:
+            pass
+        return None
+    return loader.get_pixbuf()
+
+
+def decode_file_at_size(path: str, size: int) -> Optional[GdkPixbuf.Pixbuf]:
+    """То же для локального файла: читает его сам загрузчик, без ограничения размера."""
+    try:
+        info = GdkPixbuf.Pixbuf.get_file_info(path)
+        if info is None or info[0] is None:
+            return None
+        _format, width, height = info
+        scale = size / min(width, height)
+        if scale >= 1:
+            return GdkPixbuf.Pixbuf.new_from_file(path)
+        return GdkPixbuf.Pixbuf.new_from_file_at_scale(
+            path, max(1, round(width * scale)), max(1, round(height * scale)), False
+        )
+    except (GLib.Error, ZeroDivisionError):
+        return None
+
+
+class ArtworkCache:
+    """Обложки MPRIS: загрузки на диске с вытеснением по давности, декодирование в фоне.
+
+    http(s)-обложки хранятся в directory под хэшем URL и вытесняются по
+    mtime (он обновляется при каждом попадании), когда их суммарный размер
+    превышает max_bytes. file://-обложки не копируются и не ограничены
+    MAX_DOWNLOAD (плееры кладут туда исходные сканы): их ключ — путь и
+    mtime файла, а декодируются они прямо из файла. Готовые пиксбуфы нужного размера держатся в небольшом LRU
+    в памяти. Одновременные запросы одной обложки ждут одну загрузку.
+    opener — функция (url, timeout) -> ответ с read(), по умолчанию urlopen;
+    её можно подменить, например, для проверки на локальном HTTP-сервере.
+    """
+
+    MAX_DOWNLOAD = 5 * 1024 * 1024
+    TIMEOUT_S = 5
+    MEMORY_ENTRIES = 16
+
+    def __init__(
+        self,
+        directory: str,
+        max_bytes: int = 64 * 1024 * 1024,
+        opener: Optional[Callable] = None,
+        workers: int = 2,
+    ):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.opener = opener or urllib.request.urlopen
+        self._lock = threading.Lock()
+        self._files: Dict[str, int] = {}  # имя файла в directory -> размер
+        self._total = 0
+        self._pixbufs = collections.OrderedDict()  # (ключ, размер) -> пиксбуф
+        self._inflight: Dict[tuple, List[Callable]] = {}
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="artwork")
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._load_index()
+
+    def _load_index(self):
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if entry.name.endswith(".tmp"):
+                    try:
+                        os.unlink(entry.path)
+                    except OSError:
+                        pass
+                    continue
+                try:
+                    self._files[entry.name] = entry.stat().st_size
+                except OSError:
+                    continue
+        self._total = sum(self._files.values())
+
+    # ----------------------
+    # Публичный интерфейс
+    # ----------------------
+    def fetch(self, url: str, size: int, callback: Callable[[Optional[GdkPixbuf.Pixbuf]], None]):
+        """Вызывает callback(пиксбуф | None) в главном потоке, когда обложка готова."""
+        key = self._key(url)
+        if key is None:
+            GLib.idle_add(callback, None)
+            return
+        with self._lock:
+            pixbuf = self._pixbufs.get((key, size))
+            if pixbuf is not None:
+                self._pixbufs.move_to_end((key, size))
+                GLib.idle_add(callback, pixbuf)
+                return
+            waiting = self._inflight.get((key, size))
+            if waiting is not None:
+                waiting.append(callback)
+                return
+            self._inflight[(key, size)] = [callback]
+        self._executor.submit(self._worker, url, key, size)
+
+    def load(self, url: str, size: int) -> Optional[GdkPixbuf.Pixbuf]:
+        """То же синхронно: для фоновых потоков и проверок."""
+        key = self._key(url)
+        if key is None:
+            return None
+        if key.startswith("file:"):
+            return decode_file_at_size(urllib.parse.unquote(urllib.parse.urlparse(url).path), size)
+        data = self._read(url, key)
+        return decode_at_size(data, size) if data else None
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    # ----------------------
+    # Внутреннее
+    # ----------------------
+    @staticmethod
+    def _key(url: str) -> Optional[str]:
+        parsed = urllib.parse.urlparse(url)
+        if parsed.scheme in ("http", "https"):
+            return hashlib.blake2b(url.encode(), digest_size=16).hexdigest()
+        if parsed.scheme == "file":
+            path = urllib.parse.unquote(parsed.path)
+            try:
+                st = os.stat(path)
+            except OSError:
+                return None
+            # Перезаписанный файл (плееры кладут обложку по постоянному пути) — новый ключ
+            return f"file:{path}:{st.st_mtime_ns}:{st.st_size}"
+        return None
+
+    def _worker(self, url: str, key: str, size: int):
+        try:
+            pixbuf = self.load(url, size)
+        except Exception:
+            pixbuf = None
+        with self._lock:
+            callbacks = self._inflight.pop((key, size), [])
+            if pixbuf is not None:
+                self._pixbufs[(key, size)] = pixbuf
+                while len(self._pixbufs) > self.MEMORY_ENTRIES:
+                    self._pixbufs.popitem(last=False)
+        for callback in callbacks:
+            GLib.idle_add(callback, pixbuf)
+
+    def _read(self, url: str, key: str) -> Optional[bytes]:
+        path = self.directory / key
+        try:
+            data = path.read_bytes()
+            os.utime(path)  # Для вытеснения по давности использования
+            return data
+        except OSError:
+            pass
+
+        with self.opener(url, timeout=self.TIMEOUT_S) as response:
+            data = response.read(self.MAX_DOWNLOAD + 1)
+        if not data or len(data) > self.MAX_DOWNLOAD:
+            return None
+        self._store(key, data)
+        return data
+
+    def _store(self, key: str, data: bytes):
+        path = self.directory / key
+        tmp = path.with_name(f"{key}.{threading.get_ident()}.tmp")
+        try:
+            tmp.write_bytes(data)
+            os.replace(tmp, path)
+        except OSError:
+            try:
+                tmp.unlink()
+            except OSError:
+                pass
+            return
+        with self._lock:
+            self._total += len(data) - self._files.get(key, 0)
+            self._files[key] = len(data)
+            if self._total > self.max_bytes:
+                self._prune()
+
+    def _prune(self):
+        # Вызывается под self._lock
+        entries = []
+        for name in self._files:
+            try:
+                entries.append((os.stat(self.directory / name).st_mtime, name))
+            except OSError:
+                entries.append((0, name))
+        entries.sort()
+        for _mtime, name in entries:
+            if self._total <= self.max_bytes:
+                break
+            try:
+                os.unlink(self.directory / name)
+            except OSError:
+                pass
+            self._total -= self._files.pop(name)
+
+
+_default = None
+_default_lock = threading.Lock()
+
+
+def get_artwork_cache() -> ArtworkCache:
+    """Общий кэш обложек в ~/.cache/vidgex-shell/artwork."""
+    global _default
+    with _default_lock:
+        if _default is None:
+            _default = ArtworkCache(os.path.join(GLib.get_user_cache_dir(), "vidgex-shell", "artwork"))
+        return _default
@@ -0,0 +1,102 @@
+from operator import itemgetter
+from typing import Dict, List, Optional
+
+from utils.fuzzy import FuzzyQuery
+
+
+IMAGE_MARKER = "[[ binary data"
+# Максимальная прибавка к оценке для самой свежей записи
+RECENCY_WEIGHT = 30
+
+
+class ClipEntry:
+    __slots__ = ("id", "preview", "folded", "is_image", "order")
+
+    def __init__(self, clip_id: str, preview: str):
+        self.id = clip_id
+        self.preview = preview
+        self.order = 0
+        # Нормализуем один раз при загрузке, а не на каждое нажатие клавиши
+        self.folded = preview.casefold()
+        self.is_image = IMAGE_MARKER in preview
+
+
+class ClipModel:
+    """Модель истории буфера обмена в памяти (новые записи первыми)."""
+
+    __slots__ = ("entries", "_by_id", "_last_query", "_last_result")
+
+    def __init__(self):
+        self.entries: List[ClipEntry] = []
+        self._by_id: Dict[str, ClipEntry] = {}
+        self._last_query: Optional[str] = None
+        self._last_result: List[ClipEntry] = []
+
+    def __len__(self):
+        return len(self.entries)
+
+    def apply_listing(self, raw: str) -> bool:
+        """Применяет вывод `cliphist list`, переиспользуя уже известные записи.
+
+        Возвращает True, если содержимое модели изменилось.
+        """
+        old = self._by_id
+        entries = []
+        by_id = {}
+        changed = False
+
+        for line in raw.splitlines():
+            if not line:
+                continue
+            clip_id, sep, preview = line.partition("\t")
+            if not sep:
+                preview = line
+            entry = old.get(clip_id)
+            if entry is None or entry.preview != preview:
+                entry = ClipEntry(clip_id, preview)
+                changed = True
+            entry.order = len(entries)
+            entries.append(entry)
+            by_id[clip_id] = entry
+
+        if not changed and len(entries) == len(self.entries):
+            changed = any(a is not b for a, b in zip(entries, self.entries))
+        else:
+            changed = True
+
+        if changed:
+            self.entries = entries
+            self._by_id = by_id
+            self._last_query = None
+        return changed
+
+    def clear(self):
+        self.entries = []
+        self._by_id = {}
+        self._last_query = None
+
+    def filter(self, query: str = "") -> List[ClipEntry]:
+        """Нечёткий поиск с ранжированием по качеству совпадения и свежести."""
+        query = query.casefold()
+        if not query:
+            return self.entries
+
+        # Расширение запроса сужает результат: сканируем только прошлую выборку
+        last = self._last_query
+        source = self._last_result if last and query.startswith(last) else self.entries
+        total = len(self.entries) or 1
+        score_of = FuzzyQuery(query).score
+
+        scored = []
+        append = scored.append
+        for entry in source:
+            score = score_of(entry.folded)
+            if score is not None:
+                append((score + RECENCY_WEIGHT * (total - entry.order) / total, entry))
+        # Сортировка устойчива: при равной оценке сохраняется порядок источника
+        scored.sort(key=itemgetter(0), reverse=True)
+        result = [item[1] for item in scored]
+
+        self._last_query = query
+        self._last_result = result
+        return result
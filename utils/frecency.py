@@ -0,0 +1,125 @@
+import hashlib
+import math
+import os
+import struct
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+
+# Заголовок: сигнатура, версия, ёмкость кольца, позиция следующей записи
+_HEADER = struct.Struct("<4sHHI")
+# Запись: время запуска (секунды) и 8-байтный хэш идентификатора приложения
+_RECORD = struct.Struct("<dQ")
+_MAGIC = b"VLNC"
+_VERSION = 1
+
+# Через HALF_LIFE секунд вклад запуска уменьшается вдвое
+HALF_LIFE = 3 * 24 * 3600
+
+
+def app_key(app_id: str) -> int:
+    return int.from_bytes(hashlib.blake2b(app_id.encode(), digest_size=8).digest(), "little")
+
+
+class LaunchLog:
+    """Журнал запусков фиксированного размера и частотно-временные оценки.
+
+    На диске — кольцо из CAPACITY записей по 16 байт, так что файл никогда
+    не растёт. Читается лениво, при первом обращении к оценкам. Оценка
+    приложения — сумма 2^((t - t0) / HALF_LIFE) по его запускам: затухание
+    экспоненциальное и одинаковое для всех, поэтому соотношение оценок со
+    временем не меняется и пересчитывать их не нужно, а новый запуск лишь
+    добавляет одно слагаемое. Копия кольца держится в памяти: когда новая
+    запись затирает старую, вклад старой вычитается из оценки.
+    """
+
+    CAPACITY = 512
+
+    def __init__(self, path: str):
+        self.path = path
+        self._scores: Optional[Dict[int, float]] = None
+        self._ring: List[Optional[Tuple[int, float]]] = [None] * self.CAPACITY  # слот -> (ключ, время)
+        self._origin = 0.0
+        self._next = 0
+        self._lock = threading.Lock()
+        self.version = 0  # Растёт при каждом изменении оценок
+
+    def _weight(self, timestamp: float) -> float:
+        # Показатель ограничен, чтобы сильно "будущие" записи не переполнили float
+        return math.pow(2.0, min((timestamp - self._origin) / HALF_LIFE, 512.0))
+
+    def _ensure_loaded(self):
+        if self._scores is not None:
+            return
+        self._origin = time.time()
+        scores: Dict[int, float] = {}
+        try:
+            with open(self.path, "rb") as f:
+                data = f.read()
+            magic, version, capacity, nxt = _HEADER.unpack_from(data)
+            if magic == _MAGIC and version == _VERSION and capacity == self.CAPACITY:
+                self._next = nxt % capacity
+                records = _RECORD.iter_unpack(data[_HEADER.size:_HEADER.size + capacity * _RECORD.size])
+                for slot, (timestamp, key) in enumerate(records):
+                    if timestamp > 0:
+                        scores[key] = scores.get(key, 0.0) + self._weight(timestamp)
+                        self._ring[slot] = (key, timestamp)
+        except (OSError, struct.error):
+            pass
+        self._scores = scores
+        self.version += 1
+
+    def score(self, app_id: Optional[str]) -> float:
+        self._ensure_loaded()
+        if not app_id:
+            return 0.0
+        return self._scores.get(app_key(app_id), 0.0)
+
+    def record(self, app_id: Optional[str]):
+        """Учитывает запуск в памяти сразу, а на диск пишет 16 байт в фоне."""
+        if not app_id:
+            return
+        self._ensure_loaded()
+        now = time.time()
+        key = app_key(app_id)
+        slot = self._next
+        self._next = (slot + 1) % self.CAPACITY
+
+        # Кольцо заполнено: запись в этом слоте затирается, её вклад уходит
+        evicted = self._ring[slot]
+        if evicted is not None:
+            old_key, old_timestamp = evicted
+            remaining = self._scores.get(old_key, 0.0) - self._weight(old_timestamp)
+            if remaining > self._weight(old_timestamp) * 1e-9:
+                self._scores[old_key] = remaining
+            else:
+                # Последний запуск приложения: ноль вместо ошибки округления
+                self._scores.pop(old_key, None)
+        self._ring[slot] = (key, now)
+        self._scores[key] = self._scores.get(key, 0.0) + self._weight(now)
+        self.version += 1
+
+        threading.Thread(target=self._write, args=(slot, now, key), daemon=True).start()
+
+    def _write(self, slot: int, timestamp: float, key: int):
+        with self._lock:
+            try:
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+            except OSError:
+                return
+            try:
+                size = _HEADER.size + self.CAPACITY * _RECORD.size
+                header = os.pread(fd, _HEADER.size, 0)
+                if os.fstat(fd).st_size != size or header[:4] != _MAGIC:
+                    # Новый или повреждённый файл: размечаем кольцо целиком
+                    os.ftruncate(fd, 0)
+                    os.ftruncate(fd, size)
+                os.pwrite(fd, _RECORD.pack(timestamp, key), _HEADER.size + slot * _RECORD.size)
+                # Позиция берётся текущая: потоки могут завершиться не по порядку
+                os.pwrite(fd, _HEADER.pack(_MAGIC, _VERSION, self.CAPACITY, self._next), 0)
+            except OSError:
+                pass
+            finally:
+                os.close(fd)
@@ -0,0 +1,229 @@
+import re
+from bisect import bisect_right
+from typing import Optional
+
+
+# Веса ранжирования: точная подстрока всегда выше разреженной подпоследовательности
+SUBSTRING_BASE = 100
+PREFIX_BONUS = 40
+BOUNDARY_BONUS = 25
+SPARSE_CHAR_SCORE = 4
+SPARSE_BOUNDARY_BONUS = 10
+
+
+def _is_boundary(text: str, pos: int) -> bool:
+    return pos == 0 or not text[pos - 1].isalnum()
+
+
+def _sparse_pattern(query: str, stop: str = "") -> str:
+    # "abc" -> "a[^b]*b[^c]*c": без возвратов, линейно по длине текста;
+    # символы из stop не могут попасть в разрыв (граница полей)
+    stop = re.escape(stop) if stop else ""
+    parts = [re.escape(query[0])]
+    for ch in query[1:]:
+        esc = re.escape(ch)
+        parts.append(f"[^{esc}{stop}]*{esc}")
+    return "".join(parts)
+
+
+class FuzzyQuery:
+    """Запрос, подготовленный один раз на нажатие клавиши.
+
+    Поиск подстроки и подпоследовательности выполняется в C (str.find и re),
+    так что на каждую строку приходится лишь пара вызовов без цикла по символам.
+    """
+
+    __slots__ = ("query", "_length", "_sparse")
+
+    def __init__(self, query: str):
+        # Запрос должен быть уже нормализован (casefold), как и тексты
+        self.query = query
+        self._length = len(query)
+        self._sparse = re.compile(_sparse_pattern(query)) if query else None
+
+    def score(self, text: str) -> Optional[int]:
+        """Оценка совпадения или None, если символы запроса не идут в тексте по порядку."""
+        if not self._length:
+            return 0
+
+        pos = text.find(self.query)
+        if pos >= 0:
+            score = SUBSTRING_BASE + self._length * 4
+            if pos == 0:
+                score += PREFIX_BONUS
+            elif _is_boundary(text, pos):
+                score += BOUNDARY_BONUS
+            return score - min(pos, 20)
+
+        match = self._sparse.search(text)
+        if match is None:
+            return None
+
+        # Разреженное совпадение: чем плотнее и ближе к началу слова, тем выше
+        start, end = match.span()
+        score = self._length * SPARSE_CHAR_SCORE
+        if _is_boundary(text, start):
+            score += SPARSE_BOUNDARY_BONUS
+        return score - min((end - start) - self._length, 60) // 2 - min(start, 20) // 4
+
+
+FIELD_SEP = "\x1f"
+WORD_MARK = "\x1e"
+_WORD_START_RE = re.compile(r"(?<!\w)(?=\w)")
+_WORD_RE = re.compile(r"\w+")
+
+# Уровни ранжирования FuzzyIndex: меньше — выше в выдаче
+TIER_NAME_PREFIX = 0
+TIER_INITIALS = 1
+TIER_WORD_PREFIX = 2
+TIER_NAME_SUBSTRING = 3
+TIER_EXTRA_SUBSTRING = 4
+TIER_NAME_SPARSE = 5
+TIER_COUNT = 6
+
+
+class IndexEntry:
+    __slots__ = ("item", "order", "rank", "names", "marked", "initials", "extra", "haystack")
+
+    def __init__(self, item, order, fields, primary):
+        self.item = item
+        self.order = order
+        self.rank = order
+        folded = [(f or "").casefold().replace(FIELD_SEP, " ").replace(WORD_MARK, " ") for f in fields]
+        names = folded[:primary]
+        self.names = FIELD_SEP.join(names)
+        # Таблица слов: начало каждого слова помечено, так что проверка
+        # "запрос — префикс какого-то слова" сводится к одному `in`
+        self.marked = _WORD_START_RE.sub(WORD_MARK, self.names)
+        self.initials = "".join(w[0] for w in _WORD_RE.findall(names[0])) if names else ""
+        self.extra = FIELD_SEP.join(folded[primary:])
+        self.haystack = FIELD_SEP.join(folded)
+
+
+class FuzzyIndex:
+    """Поисковый индекс, строящийся один раз на набор элементов.
+
+    Поля нормализуются заранее; для имён хранятся таблицы начал слов и
+    инициалов. Каждая проверка на запись — вызов str/re, выполняемый в C, а
+    оценка — уровень совпадения (префикс имени > инициалы > начало слова >
+    подстрока > подпоследовательность в имени) плюс заранее вычисленный
+    ранг элемента. Если новый запрос продолжает предыдущий, сканируется только
+    прошлый результат.
+    """
+
+    def __init__(self, items=(), fields=None, primary=2):
+        self._fields = fields or (lambda item: (str(item),))
+        self._primary = primary
+        self._entries = []
+        self._ranked = []
+        self._boost = None
+        self._last_query = None
+        self._last_matches = []
+        self.build(items)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def build(self, items):
+        self._entries = [IndexEntry(item, i, self._fields(item), self._primary) for i, item in enumerate(items)]
+        # Все имена одной строкой: подпоследовательность ищется одним проходом
+        # регулярного выражения по корпусу, а не вызовом на каждую запись
+        self._corpus = "\n".join(e.names for e in self._entries)
+        starts = []
+        offset = 0
+        for e in self._entries:
+            starts.append(offset)
+            offset += len(e.names) + 1
+        self._starts = starts
+        self._rerank()
+
+    def set_boost(self, boost):
+        """Задаёт прибавку `item -> float` (например, частоту запусков).
+
+        Ранги пересчитываются один раз здесь, а не на каждое нажатие клавиши.
+        """
+        self._boost = boost
+        self._rerank()
+
+    def _rerank(self):
+        boost = self._boost
+        if boost is None:
+            ranked = list(self._entries)
+        else:
+            ranked = sorted(self._entries, key=lambda e: (-boost(e.item), e.order))
+        for rank, entry in enumerate(ranked):
+            entry.rank = rank
+        self._ranked = ranked
+        self.invalidate()
+
+    def invalidate(self):
+        self._last_query = None
+        self._last_matches = []
+
+    def _sparse_hits(self, query: str, source) -> set:
+        """Номера записей source, в именах которых символы запроса идут по порядку."""
+        if len(query) == 1 or not source:
+            # Для одного символа подпоследовательность совпадает с подстрокой
+            return set()
+
+        search = re.compile(_sparse_pattern(query, FIELD_SEP + "\n")).search
+        if len(source) * 8 < len(self._entries):
+            return {e.order for e in source if search(e.names)}
+
+        # Все имена одной строкой: один проход регулярного выражения по корпусу
+        # вместо вызова на каждую запись
+        corpus = self._corpus
+        starts = self._starts
+        last = len(starts) - 1
+        hits = set()
+        match = search(corpus)
+        while match is not None:
+            # Совпадение не пересекает "\n", так что оно целиком в одной записи;
+            # остаток этой записи пропускаем
+            order = bisect_right(starts, match.start()) - 1
+            hits.add(order)
+            if order >= last:
+                break
+            match = search(corpus, starts[order + 1])
+        return hits
+
+    def search(self, query: str):
+        """Элементы по убыванию релевантности; пустой запрос — все по рангу."""
+        query = query.casefold().replace(FIELD_SEP, " ").replace(WORD_MARK, " ")
+        if not query:
+            return [e.item for e in self._ranked]
+
+        # Источник всегда упорядочен по рангу, поэтому внутри каждого уровня
+        # порядок уже правильный и сортировка не нужна
+        last = self._last_query
+        source = self._last_matches if last and query.startswith(last) else self._ranked
+
+        word_prefix = WORD_MARK + query
+        use_initials = len(query) > 1
+        sparse_hits = self._sparse_hits(query, source)
+
+        # Грубый отбор одним включением: любое совпадение — это подстрока
+        # где-то в записи либо подпоследовательность в имени
+        matches = [e for e in source if query in e.haystack or e.order in sparse_hits]
+
+        tiers = [[] for _ in range(TIER_COUNT)]
+        for e in matches:
+            names = e.names
+            if names.startswith(query):
+                tier = TIER_NAME_PREFIX
+            elif use_initials and e.initials.startswith(query):
+                tier = TIER_INITIALS
+            elif word_prefix in e.marked:
+                tier = TIER_WORD_PREFIX
+            elif query in names:
+                tier = TIER_NAME_SUBSTRING
+            elif query in e.extra:
+                tier = TIER_EXTRA_SUBSTRING
+            else:
+                tier = TIER_NAME_SPARSE
+            tiers[tier].append(e.item)
+
+        self._last_query = query
+        self._last_matches = matches
+        return [item for tier in tiers for item in tier]
+
@@ -1,18 +1,102 @@
 import gi
 gi.require_version("Gtk", "3.0")
-from gi.repository import GLib, Gtk, GObject
-import json, threading, pickle, lzma
+from gi.repository import GdkPixbuf, GLib, Gtk, GObject
+import json, os, threading
 from pathlib import Path
 from collections import OrderedDict
+from services.desktop_apps import DesktopAppIndex
+
+class PixbufCache:
+    """LRU пиксбуфов с учётом занятых байт.
+
+    При превышении бюджета вытесняются самые давние записи по одной, а не
+    весь кэш. Для каждого имени помнятся закэшированные размеры, чтобы
+    меньший размер можно было получить масштабированием большего.
+    """
+
+    def __init__(self, budget: int):
+        self.budget = budget
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.derived = 0
+        self._items = OrderedDict()  # (name, size) -> pixbuf
+        self._sizes = {}             # name -> {size}
+
+    def __len__(self):
+        return len(self._items)
+
+    def get(self, key):
+        pix = self._items.get(key)
+        if pix is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._items.move_to_end(key)
+        return pix
+
+    def put(self, key, pix):
+        old = self._items.pop(key, None)
+        if old is not None:
+            self.bytes -= old.get_byte_length()
+        self._items[key] = pix
+        self.bytes += pix.get_byte_length()
+        self._sizes.setdefault(key[0], set()).add(key[1])
+
+        while self.bytes > self.budget and len(self._items) > 1:
+            (name, size), evicted = self._items.popitem(last=False)
+            self.bytes -= evicted.get_byte_length()
+            self.evictions += 1
+            sizes = self._sizes.get(name)
+            if sizes:
+                sizes.discard(size)
+                if not sizes: del self._sizes[name]
+
+    def larger(self, name: str, size: int):
+        """Наименьшая закэшированная отрисовка name крупнее size."""
+        sizes = [s for s in self._sizes.get(name, ()) if s > size]
+        if not sizes:
+            return None
+        key = (name, min(sizes))
+        self._items.move_to_end(key)
+        return self._items[key]
+
+    def clear(self):
+        self._items.clear()
+        self._sizes.clear()
+        self.bytes = 0
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._items), "bytes": self.bytes, "budget": self.budget,
+            "hits": self.hits, "misses": self.misses,
+            "evictions": self.evictions, "derived": self.derived,
+        }
+
 
 class IconResolver(GObject.GObject):
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    SAVE_DELAY_S = 5  # Промахи за это время записываются одним пакетом
+    PIXBUF_BUDGET = 24 * 1024 * 1024
+
+    def __new__(cls, *args, **kwargs):
+        with cls._instance_lock:
+            if not cls._instance:
+                cls._instance = super().__new__(cls)
+            return cls._instance
+
     def __init__(self, default_icon="application-x-executable-symbolic"):
+        if hasattr(self, '_init'): return
         super().__init__()
+        self._init = True
         self._default_icon = default_icon
         self._icon_cache = OrderedDict() # app_id -> icon_name
-        self._desktop_cache = {}        # app_id -> path
-        self._pixbuf_cache = {}         # (name, size) -> pixbuf
-        self._pixbuf_usage = 0
+        self._desktop_icons = {}        # app_id -> Icon= из индекса приложений
+        self._pixbuf_cache = PixbufCache(self.PIXBUF_BUDGET)  # (name, size) -> pixbuf
+        self._theme_sizes = {}          # name -> размеры, которые тема рисует без масштабирования
         self._lock = threading.Lock()
         
         self._theme = Gtk.IconTheme.get_default()
@@ -20,38 +104,51 @@ class IconResolver(GObject.GObject):
         
         cache_dir = Path(GLib.get_user_cache_dir()) / "vidgex-shell"
         cache_dir.mkdir(parents=True, exist_ok=True)
-        self._icon_cache_file = cache_dir / "icons.json"
-        self._desktop_cache_file = cache_dir / "desktop_cache.lzma"
-        
+        # Один несжатый JSON вместо icons.json + LZMA-pickle
+        self._cache_file = cache_dir / "icon_resolver.json"
+        self._save_id = 0
+        self._write_lock = threading.Lock()
+
+        # Desktop-файлы отслеживает общий индекс приложений (Gio.FileMonitor),
+        # поэтому периодических пересканирований здесь нет
+        self._apps = DesktopAppIndex.get_initial()
+        self._apps.connect("changed", self._on_apps_changed)
+        self._build_index()
+
         threading.Thread(target=self._load_all, daemon=True).start()
-        GLib.timeout_add_seconds(300, self._build_index)
 
     def _load_all(self):
-        """Загрузка всех кэшей в одном потоке"""
+        """Загрузка кэша имён иконок в фоне"""
         try:
-            if self._icon_cache_file.exists():
-                self._icon_cache.update(json.loads(self._icon_cache_file.read_text()))
-            if self._desktop_cache_file.exists():
-                with lzma.open(self._desktop_cache_file, 'rb') as f:
-                    self._desktop_cache.update(pickle.load(f))
+            data = json.loads(self._cache_file.read_text())
+            with self._lock:
+                for app_id, icon in data.get("icons", {}).items():
+                    self._icon_cache.setdefault(app_id, icon)
         except: pass
-        self._build_index()
 
     def _build_index(self):
-        """Быстрое построение индекса desktop-файлов через GLib"""
+        """Таблица app_id -> Icon= из уже разобранных записей индекса приложений"""
         new_index = {}
-        paths = [Path(d) / "applications" for d in GLib.get_system_data_dirs()]
-        paths.append(Path(GLib.get_user_data_dir()) / "applications")
-        
-        for p in filter(lambda x: x.exists(), paths):
-            for entry in p.glob("*.desktop"):
-                stem = entry.stem.lower()
-                new_index[stem] = str(entry)
-                # Добавляем варианты без дефисов для поиска
-                if '-' in stem: new_index[stem.replace('-', '')] = str(entry)
-        
-        with self._lock: self._desktop_cache.update(new_index)
-        return True
+        for entry in self._apps.entries():
+            if not entry.icon_name: continue
+            stem = entry.desktop_id[:-len(".desktop")].lower() if entry.desktop_id.endswith(".desktop") else entry.desktop_id.lower()
+            keys = [stem, stem.replace('-', '')]
+            # org.gnome.Nautilus -> nautilus
+            if '.' in stem: keys.append(stem.rsplit('.', 1)[-1])
+            if entry.window_class: keys.append(entry.window_class.lower())
+            for key in keys:
+                new_index.setdefault(key, entry.icon_name)
+        # Ключи, по которым док находит приложения (имя, исполняемый файл) — с приоритетом
+        for key, entry in self._apps.identifiers.items():
+            if entry.icon_name: new_index[key] = entry.icon_name
+
+        with self._lock: self._desktop_icons = new_index
+
+    def _on_apps_changed(self, *args):
+        self._build_index()
+        # Ранее не найденные иконки могли появиться вместе с приложением
+        with self._lock: self._icon_cache.clear()
+        self._schedule_save()
 
     def get_icon_name(self, app_id: str) -> str:
         app_id = app_id.lower()
@@ -64,57 +161,117 @@ class IconResolver(GObject.GObject):
             self._icon_cache[app_id] = icon_name
             if len(self._icon_cache) > 200: self._icon_cache.popitem(last=False)
         
-        GLib.idle_add(self._save_caches)
+        self._schedule_save()
         return icon_name
 
     def _resolve(self, app_id: str) -> str:
-        # 1. Тема / 2. Desktop файл
+        # 1. Тема / 2. Icon= из индекса приложений — только поиск в словарях
         if self._theme.has_icon(app_id): return app_id
-        
-        path = self._desktop_cache.get(app_id) or self._desktop_cache.get(app_id.replace('-', ''))
-        if path:
-            kf = GLib.KeyFile.new()
-            try:
-                kf.load_from_file(path, GLib.KeyFileFlags.NONE)
-                icon = kf.get_string(GLib.KEY_FILE_DESKTOP_GROUP, "Icon")
-                if icon and (self._theme.has_icon(icon) or Path(icon).exists()):
-                    return icon
-            except: pass
-            
+
+        icon = self._desktop_icons.get(app_id) or self._desktop_icons.get(app_id.replace('-', ''))
+        if icon and (self._theme.has_icon(icon) or Path(icon).exists()):
+            return icon
+
         return self._default_icon
 
     def get_icon_pixbuf(self, app_id: str, size: int = 32):
-        name = self.get_icon_name(app_id)
+        return self.load_icon(self.get_icon_name(app_id), size)
+
+    def _native_sizes(self, name: str):
+        sizes = self._theme_sizes.get(name)
+        if sizes is None:
+            try:
+                sizes = tuple(sorted(self._theme.get_icon_sizes(name)))
+            except Exception:
+                sizes = ()
+            self._theme_sizes[name] = sizes
+        return sizes
+
+    def load_icon(self, name: str, size: int):
+        """Пиксбуф иконки темы (или файла) через общий LRU-кэш."""
         key = (name, size)
-        
-        if key in self._pixbuf_cache: return self._pixbuf_cache[key]
+        with self._lock:
+            pix = self._pixbuf_cache.get(key)
+            if pix is not None: return pix
 
-        try:
-            pix = self._theme.load_icon(name, size, Gtk.IconLookupFlags.FORCE_SIZE)
-        except:
-            pix = self._theme.load_icon(self._default_icon, size, Gtk.IconLookupFlags.FORCE_SIZE)
+            # Тема не рисует этот размер сама (-1 — векторная иконка): уменьшаем
+            # ближайшую большую отрисовку, а если её нет — кэшируем её заранее,
+            # чтобы соседние нестандартные размеры (Overview) брались из неё
+            sizes = self._native_sizes(name)
+            if sizes and size not in sizes and -1 not in sizes:
+                src = self._pixbuf_cache.larger(name, size)
+                if src is None:
+                    base = next((s for s in sizes if s > size), None)
+                    src = self._load_uncached(name, base) if base else None
+                    if src is not None:
+                        self._pixbuf_cache.put((name, base), src)
+                if src is not None:
+                    pix = src.scale_simple(size, size, GdkPixbuf.InterpType.BILINEAR)
+                    self._pixbuf_cache.derived += 1
 
-        if pix:
-            with self._lock:
-                self._pixbuf_cache[key] = pix
-                self._pixbuf_usage += pix.get_width() * pix.get_height() * 4
-                if self._pixbuf_usage > 40 * 1024 * 1024: self.clear_caches(False)
+            if pix is None:
+                pix = self._load_uncached(name, size)
+            if pix is not None:
+                self._pixbuf_cache.put(key, pix)
         return pix
 
-    def _save_caches(self):
-        """Сохранение данных (вызывать через idle_add или отдельный поток)"""
+    def _load_uncached(self, name: str, size: int):
         try:
-            self._icon_cache_file.write_text(json.dumps(dict(self._icon_cache)))
-            with lzma.open(self._desktop_cache_file, 'wb') as f:
-                pickle.dump(self._desktop_cache, f)
-        except: pass
+            if os.path.isabs(name):
+                return GdkPixbuf.Pixbuf.new_from_file_at_size(name, size, size)
+            return self._theme.load_icon(name, size, Gtk.IconLookupFlags.FORCE_SIZE)
+        except Exception:
+            try:
+                return self._theme.load_icon(self._default_icon, size, Gtk.IconLookupFlags.FORCE_SIZE)
+            except Exception:
+                return None
+
+    def cache_stats(self) -> dict:
+        """Счётчики кэша пиксбуфов: попадания, промахи, вытеснения, производные размеры."""
+        with self._lock:
+            return self._pixbuf_cache.stats()
+
+    def _schedule_save(self):
+        # Отложенная запись: все промахи за SAVE_DELAY_S сохраняются разом
+        if not self._save_id:
+            self._save_id = GLib.timeout_add_seconds(self.SAVE_DELAY_S, self._on_save_timeout)
+
+    def _on_save_timeout(self):
+        self._save_id = 0
+        self._save_caches()
+        return False
+
+    def _save_caches(self, wait=False):
+        """Снимок берётся в главном потоке, запись — в фоне с атомарной заменой файла."""
+        with self._lock:
+            # Промахи не сохраняем: к следующему запуску приложение могло появиться
+            data = {"icons": {k: v for k, v in self._icon_cache.items() if v != self._default_icon}}
+
+        def worker():
+            with self._write_lock:
+                try:
+                    tmp = self._cache_file.with_suffix(".tmp")
+                    tmp.write_text(json.dumps(data, separators=(",", ":")))
+                    os.replace(tmp, self._cache_file)
+                except OSError: pass
+
+        thread = threading.Thread(target=worker, daemon=True)
+        thread.start()
+        if wait: thread.join()
 
     def clear_caches(self, full=True, *args):
         with self._lock:
             self._pixbuf_cache.clear()
-            self._pixbuf_usage = 0
+            self._theme_sizes.clear()
             if full: self._icon_cache.clear()
 
     def cleanup(self):
-        self._save_caches()
-        self.clear_caches()
\ No newline at end of file
+        if self._save_id:
+            GLib.source_remove(self._save_id)
+            self._save_id = 0
+        self._save_caches(wait=True)
+        self.clear_caches()
+
+
+def get_icon_resolver() -> IconResolver:
+    return IconResolver()
\ No newline at end of file
@@ -0,0 +1,102 @@
+import functools
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional
+
+
+class ImagePool:
+    """Общий пул процессов для декодирования изображений.
+
+    Им пользуются и миниатюры (Thumbnailer), и варианты обоев
+    (WallpaperVariants), так что процессов никогда не больше, чем ядер.
+    Процессы запускаются через forkserver: fork многопоточной оболочки с
+    GTK небезопасен, а сервер forkserver импортирует только
+    utils.image_workers (PIL). Каждый процесс пула ещё импортирует main.py
+    как __mp_main__, поэтому тот подключает UI только при запуске. Пул
+    создаётся при первом задании, упавший пул пересоздаётся, а
+    простаивающий через IDLE_SHUTDOWN_S останавливается, чтобы процессы
+    не держали память.
+    """
+
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    IDLE_SHUTDOWN_S = 30
+    PRELOAD = ["utils.image_workers"]
+
+    def __new__(cls, *args, **kwargs):
+        with cls._instance_lock:
+            if not cls._instance:
+                cls._instance = super().__new__(cls)
+            return cls._instance
+
+    def __init__(self):
+        if hasattr(self, '_init'): return
+        self._init = True
+        self.workers = os.cpu_count() or 1
+        # RLock: готовый future вызывает _on_done прямо из submit() под замком
+        self._lock = threading.RLock()
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._running = 0
+        self._idle_timer: Optional[threading.Timer] = None
+
+    def submit(self, fn, *args) -> Future:
+        """Отдаёт fn(*args) в пул; fn должна жить в utils.image_workers."""
+        with self._lock:
+            if self._idle_timer is not None:
+                self._idle_timer.cancel()
+                self._idle_timer = None
+            try:
+                executor = self._pool()
+                future = executor.submit(fn, *args)
+            except (BrokenProcessPool, RuntimeError):
+                # Процесс пула упал (например, на битом файле): пересоздаём пул
+                self._executor = None
+                executor = self._pool()
+                future = executor.submit(fn, *args)
+            self._running += 1
+            future.add_done_callback(functools.partial(self._on_done, executor))
+        return future
+
+    def shutdown(self, wait: bool = False):
+        with self._lock:
+            if self._idle_timer is not None:
+                self._idle_timer.cancel()
+                self._idle_timer = None
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait, cancel_futures=True)
+
+    def _pool(self) -> ProcessPoolExecutor:
+        # Вызывается под self._lock
+        if self._executor is None:
+            context = multiprocessing.get_context("forkserver")
+            context.set_forkserver_preload(self.PRELOAD)
+            self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=context)
+        return self._executor
+
+    def _on_done(self, executor: ProcessPoolExecutor, future: Future):
+        broken = not future.cancelled() and isinstance(future.exception(), BrokenProcessPool)
+        with self._lock:
+            self._running -= 1
+            if broken and self._executor is executor:
+                self._executor = None
+            if not self._running and self._executor is not None and self._idle_timer is None:
+                self._idle_timer = threading.Timer(self.IDLE_SHUTDOWN_S, self._shutdown_if_idle)
+                self._idle_timer.daemon = True
+                self._idle_timer.start()
+
+    def _shutdown_if_idle(self):
+        with self._lock:
+            self._idle_timer = None
+            if self._running or self._executor is None:
+                return
+            executor, self._executor = self._executor, None
+        executor.shutdown(wait=False)
+
+
+def get_image_pool() -> ImagePool:
+    return ImagePool()
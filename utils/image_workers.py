@@ -0,0 +1,92 @@
+"""Функции, которые исполняются в процессах общего пула (utils.image_pool).
+
+Модуль намеренно зависит только от PIL: сервер forkserver заранее
+импортирует его, и каждый процесс пула получает готовый PIL без GTK,
+Fabric и остального UI.
+"""
+import io
+import math
+import os
+from typing import Optional
+
+from PIL import Image
+
+
+# Как в Image.thumbnail(): декодер/reduce() уменьшают изображение не ниже,
+# чем до size * REDUCING_GAP, остаток делает LANCZOS
+REDUCING_GAP = 2.0
+# Режимы, которые resize() масштабирует с фильтрацией (для "P" и "1" — только NEAREST)
+_RESIZABLE_MODES = frozenset({"RGB", "RGBA", "L", "LA", "CMYK", "I", "F"})
+_PNG_MODES = frozenset({"RGB", "RGBA", "L", "LA"})
+
+
+def render_thumbnail(source: str, size: int) -> Optional[bytes]:
+    """Квадратная миниатюра из центра изображения в виде PNG (None при ошибке).
+
+    JPEG декодируется сразу уменьшенным в 2/4/8 раз (draft, масштабирование
+    DCT), так что 40-мегапиксельное фото не распаковывается целиком. Для
+    остальных форматов (WebP, PNG) декодер так не умеет: обрезка и грубое
+    уменьшение через reduce() делаются одним проходом resize(box=...),
+    без промежуточной полноразмерной копии.
+    """
+    try:
+        with Image.open(source) as img:
+            if img.format == "JPEG":
+                target = int(size * REDUCING_GAP)
+                img.draft("RGB", (target, target))
+            if img.mode not in _RESIZABLE_MODES:
+                img = img.convert("RGBA" if "transparency" in img.info else "RGB")
+
+            w, h = img.size
+            side = min(w, h)
+            left, top = (w - side) // 2, (h - side) // 2
+            thumb = img.resize(
+                (size, size), Image.Resampling.LANCZOS,
+                box=(left, top, left + side, top + side),
+                reducing_gap=REDUCING_GAP,
+            )
+            if thumb.mode not in _PNG_MODES:
+                thumb = thumb.convert("RGB")
+
+        # Сохраняет вызывающий процесс (ThumbStore), сюда не нужен доступ к кэшу
+        buf = io.BytesIO()
+        thumb.save(buf, "PNG", compress_level=1)
+        return buf.getvalue()
+    except Exception:
+        return None
+
+
+def render_variant(source: str, width: int, height: int, dest: str) -> bool:
+    """Обои, обрезанные по центру и масштабированные до width x height (как awww --resize crop).
+
+    Полноразмерное 8K-изображение декодируется в процессе пула, и его
+    память не остаётся в оболочке. Анимированные обои не трогаются — их
+    анимирует сам awww. Результат — PNG с минимальным сжатием: без потерь
+    и декодируется в разы быстрее исходного JPEG/WebP.
+    """
+    try:
+        with Image.open(source) as img:
+            if getattr(img, "is_animated", False):
+                return False
+            w, h = img.size
+            scale = max(width / w, height / h)
+            if img.format == "JPEG":
+                # draft уменьшает не сильнее запрошенного, обрезка считается уже по его размеру
+                img.draft("RGB", (math.ceil(w * scale), math.ceil(h * scale)))
+                scale = max(width / img.width, height / img.height)
+            if img.mode not in ("RGB", "RGBA"):
+                img = img.convert("RGBA" if "transparency" in img.info or "A" in img.mode else "RGB")
+
+            crop_w, crop_h = width / scale, height / scale
+            left, top = (img.width - crop_w) / 2, (img.height - crop_h) / 2
+            variant = img.resize(
+                (width, height), Image.Resampling.LANCZOS,
+                box=(left, top, left + crop_w, top + crop_h),
+                reducing_gap=REDUCING_GAP,
+            )
+        tmp = f"{dest}.tmp"
+        variant.save(tmp, "PNG", compress_level=1)
+        os.replace(tmp, dest)
+        return True
+    except Exception:
+        return False
@@ -0,0 +1,457 @@
+"""Палитры Material You из обоев без внешнего matugen.
+
+Цвета строятся в HCT, как в material-color-utilities (MCU): оттенок и
+насыщенность из CAM16 при стандартных условиях просмотра, тон — L* из
+CIELAB. Поэтому константы схем (насыщенности палитр, повороты оттенков,
+тона ролей) взяты из MCU как есть. HCT -> sRGB решается векторно для всех
+ролей сразу: J подбирается методом Ньютона под нужную яркость Y, а цвета
+вне охвата sRGB уменьшают насыщенность бинарным поиском до границы —
+тот же результат, что у HctSolver, с точностью до округления. Изображение
+уменьшается при загрузке, цвета квантуются взвешенным k-means в CIELAB по
+гистограмме 5 бит на канал, исходный цвет выбирается по правилам Score.
+"""
+import colorsys
+import math
+import re
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+
+SAMPLE_SIZE = 128
+CLUSTERS = 32
+KMEANS_ITERATIONS = 8
+FALLBACK_SOURCE = (0x42, 0x85, 0xF4)  # Google Blue, как в material-color-utilities
+ERROR_HUE, ERROR_CHROMA = 25.0, 84.0  # Палитра ошибок MCU
+
+# Тон (L*), насыщенность и оттенок HCT исходного цвета
+Source = Tuple[float, float, float]
+Rgb = Tuple[int, int, int]
+
+# Матрицы sRGB <-> XYZ из MCU (ColorUtils), XYZ в масштабе 0..100
+_SRGB_TO_XYZ = np.array([
+    [0.41233895, 0.35762064, 0.18051042],
+    [0.2126, 0.7152, 0.0722],
+    [0.01932141, 0.11916382, 0.95034478],
+])
+_XYZ_TO_SRGB = np.array([
+    [3.2413774792388685, -1.5376652402851851, -0.49885366846268053],
+    [-0.9691452513005321, 1.8758853451067872, 0.04156585616912061],
+    [0.05562093689691305, -0.20395524564742123, 1.0571799111220335],
+])
+_WHITE = np.array([95.047, 100.0, 108.883])
+_EPS = 216 / 24389
+_KAPPA = 24389 / 27
+
+
+# ----------------------
+# Цветовые пространства
+# ----------------------
+def _linearize(c):
+    return np.where(c <= 0.04045, c / 12.92, ((c + 0.055) / 1.055) ** 2.4)
+
+
+def _delinearize(c):
+    c = np.clip(c, 0.0, 1.0)
+    return np.where(c <= 0.0031308, c * 12.92, 1.055 * c ** (1 / 2.4) - 0.055)
+
+
+def _rgb_to_xyz(rgb) -> np.ndarray:
+    return (_linearize(np.asarray(rgb, dtype=np.float64) / 255.0) * 100) @ _SRGB_TO_XYZ.T
+
+
+def _xyz_to_rgb(xyz) -> np.ndarray:
+    """sRGB (uint8) из XYZ; компоненты вне охвата обрезаются, как в MCU."""
+    linear = np.asarray(xyz, dtype=np.float64) @ _XYZ_TO_SRGB.T
+    return np.rint(_delinearize(linear / 100) * 255).astype(np.uint8)
+
+
+def _lab_f(t):
+    return np.where(t > _EPS, np.cbrt(t), (_KAPPA * t + 16) / 116)
+
+
+def _y_from_lstar(lstar):
+    ft = (np.asarray(lstar, dtype=np.float64) + 16) / 116
+    return 100 * np.where(ft ** 3 > _EPS, ft ** 3, (116 * ft - 16) / _KAPPA)
+
+
+def rgb_to_lab(rgb) -> np.ndarray:
+    f = _lab_f(_rgb_to_xyz(rgb) / _WHITE)
+    return np.stack([116 * f[..., 1] - 16, 500 * (f[..., 0] - f[..., 1]), 200 * (f[..., 1] - f[..., 2])], axis=-1)
+
+
+def _lab_to_xyz(lab) -> np.ndarray:
+    lab = np.asarray(lab, dtype=np.float64)
+    fy = (lab[..., 0] + 16) / 116
+    f = np.stack([fy + lab[..., 1] / 500, fy, fy - lab[..., 2] / 200], axis=-1)
+    return np.where(f ** 3 > _EPS, f ** 3, (116 * f - 16) / _KAPPA) * _WHITE
+
+
+class _ViewingConditions:
+    """ViewingConditions.DEFAULT из MCU: D65, фон L* 50, средний антураж."""
+
+    CAT16 = np.array([
+        [0.401288, 0.650173, -0.051461],
+        [-0.250268, 1.204414, 0.045854],
+        [-0.002079, 0.048952, 0.953127],
+    ])
+    CAT16_INV = np.linalg.inv(CAT16)
+
+    def __init__(self):
+        adapting_luminance = 200 / math.pi * float(_y_from_lstar(50.0)) / 100
+        surround = 2.0
+        f = 0.8 + surround / 10
+        self.c = 0.59 + (0.69 - 0.59) * (f - 0.9) * 10 if f >= 0.9 else 0.525 + (0.59 - 0.525) * (f - 0.8) * 10
+        d = f * (1 - 1 / 3.6 * math.exp((-adapting_luminance - 42) / 92))
+        d = min(1.0, max(0.0, d))
+        self.nc = f
+        white = self.CAT16 @ _WHITE
+        self.rgb_d = d * (100 / white) + 1 - d
+        k = 1 / (5 * adapting_luminance + 1)
+        k4 = k ** 4
+        self.fl = k4 * adapting_luminance + 0.1 * (1 - k4) ** 2 * math.cbrt(5 * adapting_luminance)
+        self.n = float(_y_from_lstar(50.0)) / _WHITE[1]
+        self.z = 1.48 + math.sqrt(self.n)
+        self.nbb = 0.725 / self.n ** 0.2
+        factors = (self.fl * self.rgb_d * white / 100) ** 0.42
+        rgb_a = 400 * factors / (factors + 27.13)
+        self.aw = (2 * rgb_a[0] + rgb_a[1] + 0.05 * rgb_a[2]) * self.nbb
+        self.alpha_k = (1.64 - 0.29 ** self.n) ** 0.73
+
+
+_VC = _ViewingConditions()
+
+
+def _xyz_to_cam(xyz) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """J, насыщенность (C) и оттенок CAM16 для массива XYZ."""
+    rgb_d = (np.asarray(xyz, dtype=np.float64) @ _VC.CAT16.T) * _VC.rgb_d
+    af = (_VC.fl * np.abs(rgb_d) / 100) ** 0.42
+    r, g, b = np.moveaxis(np.sign(rgb_d) * 400 * af / (af + 27.13), -1, 0)
+    a = (11 * r - 12 * g + b) / 11
+    bb = (r + g - 2 * b) / 9
+    u = (20 * r + 20 * g + 21 * b) / 20
+    p2 = (40 * r + 20 * g + b) / 20
+    hue = np.degrees(np.arctan2(bb, a)) % 360
+    j = 100 * np.maximum(p2 * _VC.nbb / _VC.aw, 0.0) ** (_VC.c * _VC.z)
+    hue_prime = np.where(hue < 20.14, hue + 360, hue)
+    e_hue = 0.25 * (np.cos(np.radians(hue_prime) + 2) + 3.8)
+    t = 50000 / 13 * e_hue * _VC.nc * _VC.nbb * np.hypot(a, bb) / (u + 0.305)
+    chroma = t ** 0.9 * _VC.alpha_k * np.sqrt(j / 100)
+    return j, chroma, hue
+
+
+def rgb_to_hct(rgb) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Тон, насыщенность и оттенок HCT для массива sRGB."""
+    xyz = _rgb_to_xyz(rgb)
+    _, chroma, hue = _xyz_to_cam(xyz)
+    return 116 * _lab_f(xyz[..., 1] / 100) - 16, chroma, hue
+
+
+def _jch_to_xyz(j, chroma, hue) -> np.ndarray:
+    """Обратное преобразование CAM16 (Cam16.viewed без обрезки по охвату)."""
+    alpha = np.where((chroma == 0) | (j == 0), 0.0, chroma / np.sqrt(np.maximum(j, 1e-12) / 100))
+    t = (alpha / _VC.alpha_k) ** (1 / 0.9)
+    h = np.radians(hue)
+    e_hue = 0.25 * (np.cos(h + 2) + 3.8)
+    ac = _VC.aw * (np.maximum(j, 0.0) / 100) ** (1 / _VC.c / _VC.z)
+    p1 = e_hue * (50000 / 13) * _VC.nc * _VC.nbb
+    p2 = ac / _VC.nbb
+    h_sin, h_cos = np.sin(h), np.cos(h)
+    gamma = 23 * (p2 + 0.305) * t / (23 * p1 + 11 * t * h_cos + 108 * t * h_sin)
+    a, b = gamma * h_cos, gamma * h_sin
+    rgb_a = np.stack([
+        (460 * p2 + 451 * a + 288 * b) / 1403,
+        (460 * p2 - 891 * a - 261 * b) / 1403,
+        (460 * p2 - 220 * a - 6300 * b) / 1403,
+    ], axis=-1)
+    base = np.maximum(0.0, 27.13 * np.abs(rgb_a) / (400 - np.abs(rgb_a)))
+    rgb_c = np.sign(rgb_a) * (100 / _VC.fl) * base ** (1 / 0.42)
+    return (rgb_c / _VC.rgb_d) @ _VC.CAT16_INV.T
+
+
+def _solve_j(chroma, hue, y) -> Tuple[np.ndarray, np.ndarray]:
+    """XYZ с заданными C, h и яркостью Y (J методом Ньютона) и признак попадания в охват."""
+    j = np.sqrt(y) * 11
+    for _ in range(8):
+        xyz = _jch_to_xyz(j, chroma, hue)
+        fnj = np.maximum(xyz[..., 1], 1e-9)
+        j = np.maximum(j - (fnj - y) * j / (2 * fnj), 1e-6)
+    xyz = _jch_to_xyz(j, chroma, hue)
+    linear = xyz @ _XYZ_TO_SRGB.T
+    ok = (np.abs(xyz[..., 1] - y) < 0.002) & np.all((linear >= -0.01) & (linear <= 100.01), axis=-1)
+    return xyz, ok
+
+
+def hct_to_rgb(hue, chroma, tone) -> np.ndarray:
+    """sRGB (uint8) для массивов HCT; насыщенность вне охвата уменьшается до границы."""
+    hue, chroma, tone = (a.astype(np.float64) for a in np.broadcast_arrays(
+        np.asarray(hue, dtype=np.float64) % 360, np.asarray(chroma, dtype=np.float64),
+        np.asarray(tone, dtype=np.float64)))
+    y = _y_from_lstar(np.clip(tone, 0.0, 100.0))
+    xyz, ok = _solve_j(chroma, hue, y)
+    # Бинарный поиск наибольшей насыщенности в охвате — для всех цветов вне охвата сразу
+    lo, hi = np.zeros_like(chroma), chroma.copy()
+    best = np.where(ok[..., None], xyz, 0.0)
+    if not ok.all():
+        for _ in range(20):
+            mid = (lo + hi) / 2
+            mid_xyz, good = _solve_j(mid, hue, y)
+            good &= ~ok
+            best = np.where(good[..., None], mid_xyz, best)
+            lo = np.where(good, mid, lo)
+            hi = np.where(good | ok, hi, mid)
+    # Серые и крайние тона, а также цвета, для которых ничего не нашлось, — по одной L*
+    gray = (chroma < 1e-4) | (tone < 1e-4) | (tone > 99.9999) | ~(ok | (lo > 0))
+    xyz = np.where(gray[..., None], y[..., None] * _WHITE / 100, best)
+    return _xyz_to_rgb(xyz)
+
+
+# ----------------------
+# Исходный цвет
+# ----------------------
+def load_pixels(path: str) -> np.ndarray:
+    with Image.open(path) as img:
+        if img.format == "JPEG":
+            img.draft("RGB", (SAMPLE_SIZE * 2, SAMPLE_SIZE * 2))
+        img = img.convert("RGB")
+        img.thumbnail((SAMPLE_SIZE, SAMPLE_SIZE), Image.Resampling.BILINEAR, reducing_gap=2.0)
+        return np.asarray(img, dtype=np.uint8).reshape(-1, 3)
+
+
+def quantize(pixels: np.ndarray, clusters: int = CLUSTERS) -> Tuple[np.ndarray, np.ndarray]:
+    """Взвешенный k-means в CIELAB по гистограмме 32x32x32; центры и доли пикселей."""
+    q = pixels.astype(np.int32) >> 3
+    counts = np.bincount((q[:, 0] << 10) | (q[:, 1] << 5) | q[:, 2], minlength=1 << 15)
+    bins = np.flatnonzero(counts)
+    weights = counts[bins].astype(np.float64)
+    centres_rgb = np.stack([(bins >> 10) & 31, (bins >> 5) & 31, bins & 31], axis=1) * 8 + 4
+    points = rgb_to_lab(centres_rgb)
+
+    # Детерминированный посев: следующий центр — самая "тяжёлая" из далёких точек
+    chosen = [int(np.argmax(weights))]
+    d2 = ((points - points[chosen[0]]) ** 2).sum(1)
+    while len(chosen) < min(clusters, len(points)):
+        i = int(np.argmax(weights * d2))
+        if d2[i] <= 0:
+            break
+        chosen.append(i)
+        d2 = np.minimum(d2, ((points - points[i]) ** 2).sum(1))
+    centres = points[chosen].copy()
+
+    for _ in range(KMEANS_ITERATIONS):
+        dist = ((points[:, None, :] - centres[None, :, :]) ** 2).sum(2)
+        assign = dist.argmin(1)
+        mass = np.bincount(assign, weights=weights, minlength=len(centres))
+        sums = np.stack([np.bincount(assign, weights=weights * points[:, j], minlength=len(centres)) for j in range(3)], 1)
+        filled = mass > 0
+        centres[filled] = sums[filled] / mass[filled, None]
+    return centres[filled], mass[filled] / mass.sum()
+
+
+def score(centres: np.ndarray, proportions: np.ndarray) -> Optional[Source]:
+    """Самый подходящий исходный цвет по правилам Score (material-color-utilities)."""
+    xyz = _lab_to_xyz(centres)
+    _, C, H = _xyz_to_cam(xyz)
+    L = centres[:, 0]
+    hue = np.rint(H).astype(np.int64) % 360
+    per_hue = np.bincount(hue, weights=proportions, minlength=360)
+    # Доля "возбуждённых" пикселей в окне оттенков [h - 14, h + 15]
+    wrapped = np.concatenate([per_hue[-15:], per_hue, per_hue[:15]])
+    csum = np.concatenate([[0.0], np.cumsum(wrapped)])
+    excited = csum[hue + 31] - csum[hue + 1]
+
+    scores = excited * 100 * 0.7 + (C - 48) * np.where(C < 48, 0.1, 0.3)
+    usable = (C >= 5) & (excited > 0.01)
+    if not usable.any():
+        return None
+    best = int(np.argmax(np.where(usable, scores, -np.inf)))
+    return float(L[best]), float(C[best]), float(H[best])
+
+
+def extract_source(path: str) -> Source:
+    try:
+        found = score(*quantize(load_pixels(path)))
+    except Exception:
+        found = None
+    if found is None:
+        found = tuple(float(v) for v in rgb_to_hct(FALLBACK_SOURCE))
+    return found
+
+
+# ----------------------
+# Схемы
+# ----------------------
+_EXPRESSIVE_HUES = (0, 21, 51, 121, 151, 191, 271, 321, 360)
+_EXPRESSIVE_SECONDARY = (45, 95, 45, 20, 45, 90, 45, 45, 45)
+_EXPRESSIVE_TERTIARY = (120, 120, 20, 45, 20, 15, 20, 120, 120)
+
+
+def _rotate(hue: float, rotations) -> float:
+    for i in range(len(_EXPRESSIVE_HUES) - 1):
+        if _EXPRESSIVE_HUES[i] <= hue < _EXPRESSIVE_HUES[i + 1]:
+            return (hue + rotations[i]) % 360
+    return hue
+
+
+def scheme_palettes(source: Source, scheme: str) -> Optional[Dict[str, Tuple[float, float]]]:
+    """Ключевые (оттенок, насыщенность) палитр p/s/t/n/nv для схемы matugen."""
+    _, c, h = source
+    variants = {
+        "scheme-tonal-spot": lambda: ((h, 36), (h, 16), (h + 60, 24), (h, 6), (h, 8)),
+        "scheme-content": lambda: ((h, c), (h, max(c - 32, c * 0.5)), (h + 60, max(c - 32, c * 0.5) + 8), (h, c / 8), (h, c / 8 + 4)),
+        "scheme-fidelity": lambda: ((h, c), (h, max(c - 32, c * 0.5)), (h + 60, max(c - 32, c * 0.5) + 8), (h, c / 8), (h, c / 8 + 4)),
+        "scheme-expressive": lambda: ((h + 240, 40), (_rotate(h, _EXPRESSIVE_SECONDARY), 24), (_rotate(h, _EXPRESSIVE_TERTIARY), 32), (h + 15, 8), (h + 15, 12)),
+        "scheme-fruit-salad": lambda: ((h - 50, 48), (h - 50, 36), (h, 36), (h, 10), (h, 16)),
+        "scheme-monochrome": lambda: ((h, 0), (h, 0), (h, 0), (h, 0), (h, 0)),
+        "scheme-neutral": lambda: ((h, 12), (h, 8), (h, 16), (h, 2), (h, 2)),
+        "scheme-rainbow": lambda: ((h, 48), (h, 16), (h + 60, 24), (h, 0), (h, 0)),
+    }
+    build = variants.get(scheme)
+    if build is None:
+        return None
+    keys = dict(zip(("p", "s", "t", "n", "nv"), build()))
+    keys["e"] = (ERROR_HUE, ERROR_CHROMA)
+    return {name: (hue % 360, chroma) for name, (hue, chroma) in keys.items()}
+
+
+# Роль -> (палитра, тон в тёмной теме, тон в светлой)
+ROLES = {
+    "background": ("n", 6, 98), "on_background": ("n", 90, 10),
+    "surface": ("n", 6, 98), "on_surface": ("n", 90, 10),
+    "surface_dim": ("n", 6, 87), "surface_bright": ("n", 24, 98),
+    "surface_container_lowest": ("n", 4, 100), "surface_container_low": ("n", 10, 96),
+    "surface_container": ("n", 12, 94), "surface_container_high": ("n", 17, 92),
+    "surface_container_highest": ("n", 22, 90),
+    "surface_variant": ("nv", 30, 90), "on_surface_variant": ("nv", 80, 30),
+    "inverse_surface": ("n", 90, 20), "inverse_on_surface": ("n", 20, 95),
+    "outline": ("nv", 60, 50), "outline_variant": ("nv", 30, 80),
+    "shadow": ("n", 0, 0), "scrim": ("n", 0, 0),
+    "surface_tint": ("p", 80, 40), "inverse_primary": ("p", 40, 80),
+}
+for _name, _palette in (("primary", "p"), ("secondary", "s"), ("tertiary", "t"), ("error", "e")):
+    ROLES[_name] = (_palette, 80, 40)
+    ROLES[f"on_{_name}"] = (_palette, 20, 100)
+    ROLES[f"{_name}_container"] = (_palette, 30, 90)
+    ROLES[f"on_{_name}_container"] = (_palette, 90, 10)
+    if _palette != "e":
+        ROLES[f"{_name}_fixed"] = (_palette, 90, 90)
+        ROLES[f"{_name}_fixed_dim"] = (_palette, 80, 80)
+        ROLES[f"on_{_name}_fixed"] = (_palette, 10, 10)
+        ROLES[f"on_{_name}_fixed_variant"] = (_palette, 30, 30)
+
+# MaterialDynamicColors.isMonochrome: в монохромной схеме MCU (и matugen)
+# берут для акцентных ролей другие тона — primary, например, белый/чёрный
+MONOCHROME_ROLES = {
+    "primary": ("p", 100, 0), "on_primary": ("p", 10, 90),
+    "primary_container": ("p", 85, 25), "on_primary_container": ("p", 0, 100),
+    "secondary_container": ("s", 30, 85),
+    "tertiary": ("t", 90, 25), "on_tertiary": ("t", 10, 90),
+    "tertiary_container": ("t", 60, 49), "on_tertiary_container": ("t", 0, 100),
+    "primary_fixed": ("p", 40, 40), "primary_fixed_dim": ("p", 30, 30),
+    "on_primary_fixed": ("p", 100, 100), "on_primary_fixed_variant": ("p", 90, 90),
+    "secondary_fixed": ("s", 80, 80), "secondary_fixed_dim": ("s", 70, 70),
+    "on_secondary_fixed_variant": ("s", 25, 25),
+    "tertiary_fixed": ("t", 40, 40), "tertiary_fixed_dim": ("t", 30, 30),
+    "on_tertiary_fixed": ("t", 100, 100), "on_tertiary_fixed_variant": ("t", 90, 90),
+}
+
+
+def _harmonize(design_hue: float, source_hue: float) -> float:
+    # Blend.harmonize: поворот к исходному оттенку не больше чем на 15°
+    diff = (source_hue - design_hue + 180) % 360 - 180
+    return (design_hue + max(-15.0, min(15.0, diff * 0.5))) % 360
+
+
+def scheme_colors(source: Source, scheme: str, custom_colors: Optional[dict] = None) -> Optional[Dict[str, Dict[str, Rgb]]]:
+    """Цвета всех ролей: {роль: {"dark": rgb, "light": rgb, "default": rgb}}."""
+    palettes = scheme_palettes(source, scheme)
+    if palettes is None:
+        return None
+    roles = dict(ROLES)
+    if scheme == "scheme-monochrome":
+        roles.update(MONOCHROME_ROLES)
+
+    # custom_colors из конфига matugen: своя палитра на цвет, blend — гармонизация.
+    # Насыщенность — как у CorePalette.a1 в MCU: не ниже 48
+    for name, spec in (custom_colors or {}).items():
+        color, blend = (spec, True) if isinstance(spec, str) else (spec.get("color"), spec.get("blend", True))
+        try:
+            rgb = tuple(int(color.lstrip("#")[i:i + 2], 16) for i in (0, 2, 4))
+        except (AttributeError, ValueError):
+            continue
+        _, c, h = rgb_to_hct(rgb)
+        h = _harmonize(float(h), source[2]) if blend else float(h)
+        palettes[name] = (h, max(48.0, float(c)))
+        roles[name] = (name, 80, 40)
+        roles[f"on_{name}"] = (name, 20, 100)
+        roles[f"{name}_container"] = (name, 30, 90)
+        roles[f"on_{name}_container"] = (name, 90, 10)
+
+    # Один векторизованный проход на все роли обеих тем
+    names = list(roles)
+    hue = np.array([palettes[roles[n][0]][0] for n in names] * 2)
+    chroma = np.array([palettes[roles[n][0]][1] for n in names] * 2)
+    tone = np.array([roles[n][1] for n in names] + [roles[n][2] for n in names], dtype=np.float64)
+    rgb = hct_to_rgb(hue, chroma, tone)
+
+    count = len(names)
+    colors = {}
+    for i, name in enumerate(names):
+        dark, light = tuple(int(v) for v in rgb[i]), tuple(int(v) for v in rgb[count + i])
+        # matugen по умолчанию строит тёмную тему
+        colors[name] = {"dark": dark, "light": light, "default": dark}
+    src = tuple(int(v) for v in hct_to_rgb(source[2], source[1], source[0]))
+    colors["source_color"] = {"dark": src, "light": src, "default": src}
+    return colors
+
+
+# ----------------------
+# Шаблоны
+# ----------------------
+_EXPR = re.compile(r"\{\{\s*(.*?)\s*\}\}")
+_COLOR_REF = re.compile(r"colors\.(\w+)\.(default|dark|light)\.(hex|hex_stripped|rgb|rgba)")
+_FILTER = re.compile(r"set_lightness:\s*(-?\d+(?:\.\d+)?)")
+
+
+def _set_lightness(rgb: Rgb, amount: float) -> Rgb:
+    h, l, s = colorsys.rgb_to_hls(*(v / 255 for v in rgb))
+    l = min(1.0, max(0.0, l + amount / 100))
+    return tuple(int(round(v * 255)) for v in colorsys.hls_to_rgb(h, l, s))
+
+
+def _format(rgb: Rgb, fmt: str) -> str:
+    r, g, b = rgb
+    if fmt == "hex":
+        return f"#{r:02x}{g:02x}{b:02x}"
+    if fmt == "hex_stripped":
+        return f"{r:02x}{g:02x}{b:02x}"
+    if fmt == "rgb":
+        return f"rgb({r}, {g}, {b})"
+    return f"rgba({r}, {g}, {b}, 255)"
+
+
+def render_template(text: str, colors: Dict[str, Dict[str, Rgb]], image: str = "") -> Optional[str]:
+    """Подставляет {{colors.<роль>.<тема>.<формат> | set_lightness: N}} и {{image}}.
+
+    Для любого другого выражения возвращает None: такой шаблон рендерит matugen.
+    """
+    def substitute(match):
+        expr, *filters = (part.strip() for part in match.group(1).split("|"))
+        if expr == "image" and not filters:
+            return image
+        ref = _COLOR_REF.fullmatch(expr)
+        if ref is None or ref.group(1) not in colors:
+            raise KeyError(expr)
+        rgb = colors[ref.group(1)][ref.group(2)]
+        for flt in filters:
+            lightness = _FILTER.fullmatch(flt)
+            if lightness is None:
+                raise KeyError(flt)
+            rgb = _set_lightness(rgb, float(lightness.group(1)))
+        return _format(rgb, ref.group(3))
+
+    try:
+        return _EXPR.sub(substitute, text)
+    except KeyError:
+        return None
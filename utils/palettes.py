@@ -0,0 +1,365 @@
+import collections
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+import tomllib
+from pathlib import Path
+from typing import Dict, Iterable, Optional, Tuple
+
+from gi.repository import GLib
+
+from utils import material_colors
+
+
+class PaletteCache:
+    """Кэш сгенерированных цветов по (хэш содержимого обоев, схема).
+
+    Шаблоны рендерит встроенный движок (utils.material_colors), а matugen
+    остаётся запасным путём для выражений и схем, которых движок не знает.
+    Вся работа идёт через одну очередь в фоновом потоке. Применение
+    (apply) срочное и занимает единственный слот: новый запрос вытесняет
+    ещё не выполненный, а результат устаревшего не устанавливается. Заготовки
+    (prefetch) считаются с nice 19 только после IDLE_DELAY_S тишины, и
+    срочный запрос прерывает идущий matugen. Каждый вариант шаблонов
+    рендерится в свой каталог кэша, поэтому повторное применение —
+    это копирование пары готовых файлов и перезагрузка CSS.
+    """
+
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    CACHE_DIR = Path(GLib.get_user_cache_dir()) / "vidgex-shell" / "palettes"
+    MATUGEN_CONFIG = Path(GLib.get_user_config_dir()) / "matugen" / "config.toml"
+    BUNDLED_CONFIG = Path(__file__).resolve().parent.parent / "helper-folder" / "matugen" / "config.toml"
+    IDLE_DELAY_S = 3
+    USE_BUILTIN = True  # False — всё через matugen, как раньше
+    RENDERER_VERSION = 4  # Увеличивать при изменении вывода material_colors: старый кэш станет мусором
+    MAX_ENTRIES = 256
+
+    def __new__(cls, *args, **kwargs):
+        with cls._instance_lock:
+            if not cls._instance:
+                cls._instance = super().__new__(cls)
+            return cls._instance
+
+    def __init__(self):
+        if hasattr(self, '_init'): return
+        self._init = True
+        self._cond = threading.Condition()
+        self._urgent: Optional[Tuple[str, str, int]] = None
+        self._idle = collections.deque()
+        self._queued = set()
+        self._latest = 0
+        self._last_apply = 0.0
+        self._proc: Optional[subprocess.Popen] = None
+        self._proc_idle = False
+        self._hashes: Dict[tuple, str] = {}
+        self._sources: Dict[str, material_colors.Source] = {}  # хэш -> исходный цвет
+        self._templates: Dict[str, Tuple[str, str]] = {}
+        self._custom_colors = {}
+        self._hooks: Dict[str, str] = {}  # шаблон -> post_hook
+        self._config_stamp = None
+        self._config_digest = ""
+        self._refresh_config()
+        self.CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        # Остатки заданий, прерванных выходом из оболочки
+        for stale in self.CACHE_DIR.glob(".job-*"):
+            shutil.rmtree(stale, ignore_errors=True)
+        threading.Thread(target=self._run, daemon=True).start()
+
+    # ----------------------
+    # Публичный интерфейс
+    # ----------------------
+    def apply(self, wallpaper: str, scheme: str):
+        """Ставит палитру wallpaper/scheme: из кэша сразу, иначе после matugen."""
+        with self._cond:
+            self._latest += 1
+            self._urgent = (wallpaper, scheme, self._latest)
+            self._last_apply = time.monotonic()
+            # Заготовки под прежние обои больше не нужны
+            self._idle.clear()
+            self._queued.clear()
+            if self._proc is not None and self._proc_idle:
+                self._proc.terminate()
+            self._cond.notify()
+
+    def prefetch(self, jobs: Iterable[Tuple[str, str]]):
+        """Добавляет в очередь простоя варианты (обои, схема), которых ещё нет в кэше."""
+        with self._cond:
+            for job in jobs:
+                if job not in self._queued:
+                    self._queued.add(job)
+                    self._idle.append(job)
+            self._cond.notify()
+
+    # ----------------------
+    # Очередь
+    # ----------------------
+    def _run(self):
+        while True:
+            with self._cond:
+                while True:
+                    if self._urgent is not None:
+                        job, self._urgent = self._urgent, None
+                        break
+                    if self._idle:
+                        wait = self._last_apply + self.IDLE_DELAY_S - time.monotonic()
+                        if wait <= 0:
+                            wallpaper, scheme = self._idle.popleft()
+                            self._queued.discard((wallpaper, scheme))
+                            job = (wallpaper, scheme, None)
+                            break
+                        self._cond.wait(wait)
+                    else:
+                        self._cond.wait()
+
+            wallpaper, scheme, seq = job
+            self._refresh_config()
+            if not self._templates:
+                # Конфиг matugen не прочитан: кэшировать нечего, работает как раньше
+                if seq is not None:
+                    subprocess.run(["matugen", "image", wallpaper, "-t", scheme],
+                                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+                continue
+            try:
+                entry = self._ensure(wallpaper, scheme, idle=seq is None)
+            except Exception:
+                entry = None
+            if entry is None or seq is None:
+                continue
+            with self._cond:
+                if seq != self._latest:
+                    continue  # Пока считали, пришёл более новый запрос
+            self._install(entry)
+            self._run_hooks(wallpaper, scheme)
+
+    def _content_hash(self, path: str) -> Optional[str]:
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        key = (path, st.st_ino, st.st_size, st.st_mtime_ns)
+        digest = self._hashes.get(key)
+        if digest is None:
+            h = hashlib.blake2b(digest_size=16)
+            try:
+                with open(path, "rb") as f:
+                    while chunk := f.read(1 << 20):
+                        h.update(chunk)
+            except OSError:
+                return None
+            if len(self._hashes) > 1024:
+                self._hashes.clear()
+            digest = self._hashes[key] = h.hexdigest()
+        return digest
+
+    def _ensure(self, wallpaper: str, scheme: str, idle: bool) -> Optional[Path]:
+        digest = self._content_hash(wallpaper)
+        if digest is None:
+            return None
+        # Отредактированные шаблоны или custom_colors дают другое имя записи
+        entry = self.CACHE_DIR / f"{digest}-{scheme}-{self._config_digest}"
+        if entry.is_dir():
+            os.utime(entry)  # Для вытеснения по давности использования
+            return entry
+
+        tmp = Path(tempfile.mkdtemp(prefix=".job-", dir=self.CACHE_DIR))
+        try:
+            rendered = self.USE_BUILTIN and self._render_builtin(wallpaper, digest, scheme, tmp)
+            if not rendered and not self._render_matugen(wallpaper, scheme, tmp, idle):
+                return None
+            try:
+                os.rename(tmp, entry)
+            except OSError:
+                return entry if entry.is_dir() else None
+            tmp = None
+            self._prune()
+            return entry
+        except OSError:
+            return None
+        finally:
+            if tmp is not None:
+                shutil.rmtree(tmp, ignore_errors=True)
+
+    def _render_builtin(self, wallpaper: str, digest: str, scheme: str, out_dir: Path) -> bool:
+        """Шаблоны встроенным движком; False — если он что-то не умеет (тогда matugen)."""
+        colors = self._colors(wallpaper, scheme, digest)
+        if colors is None:
+            return False
+        for name, (src, _dest) in self._templates.items():
+            try:
+                text = material_colors.render_template(Path(src).read_text(), colors, image=wallpaper)
+                if text is None:
+                    return False
+                (out_dir / name).write_text(text)
+            except OSError:
+                return False
+        return True
+
+    def _colors(self, wallpaper: str, scheme: str, digest: Optional[str] = None):
+        digest = digest or self._content_hash(wallpaper)
+        if digest is None:
+            return None
+        source = self._sources.get(digest)
+        if source is None:
+            # Исходный цвет не зависит от схемы: смена схемы обходится без декодирования
+            try:
+                source = material_colors.extract_source(wallpaper)
+            except Exception:
+                return None  # Формат, который PIL не читает, — пусть пробует matugen
+            if len(self._sources) > 1024:
+                self._sources.clear()
+            self._sources[digest] = source
+        return material_colors.scheme_colors(source, scheme, self._custom_colors)
+
+    def _render_matugen(self, wallpaper: str, scheme: str, out_dir: Path, idle: bool) -> bool:
+        config = out_dir / "config.toml"
+        config.write_text(self._job_config(out_dir))
+        cmd = ["matugen", "image", wallpaper, "-t", scheme, "-c", str(config)]
+        if idle:
+            cmd = ["nice", "-n", "19", *cmd]
+        try:
+            with self._cond:
+                proc = self._proc = subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+                self._proc_idle = idle
+        except OSError:
+            return False
+        code = proc.wait()
+        with self._cond:
+            self._proc = None
+        config.unlink()
+        # code < 0 — заготовка прервана срочным запросом
+        return code == 0 and all((out_dir / name).exists() for name in self._templates)
+
+    def _prune(self):
+        entries = [e for e in os.scandir(self.CACHE_DIR) if e.is_dir() and not e.name.startswith(".")]
+        if len(entries) <= self.MAX_ENTRIES:
+            return
+        entries.sort(key=lambda e: e.stat().st_mtime)
+        for e in entries[:len(entries) - self.MAX_ENTRIES]:
+            shutil.rmtree(e.path, ignore_errors=True)
+
+    def _install(self, entry: Path):
+        """Копирует готовые шаблоны на их места и перезагружает CSS оболочки."""
+        for name, (_src, dest) in self._templates.items():
+            try:
+                os.makedirs(os.path.dirname(dest), exist_ok=True)
+                tmp = f"{dest}.tmp"
+                shutil.copyfile(entry / name, tmp)
+                os.replace(tmp, dest)
+            except OSError:
+                pass
+        GLib.idle_add(self._reload_css)
+
+    def _run_hooks(self, wallpaper: str, scheme: str):
+        """post_hook шаблонов, как их запускал бы matugen (kitty, gtk и т. п.)."""
+        colors = None
+        for hook in self._hooks.values():
+            # Перезагрузку CSS оболочки делает _reload_css
+            if "set_css" in hook:
+                continue
+            command = material_colors.render_template(hook, {}, image=wallpaper)
+            if command is None:
+                # Хук ссылается на цвета: считаем их (исходный цвет уже в памяти)
+                if colors is None:
+                    colors = self._colors(wallpaper, scheme) or {}
+                command = material_colors.render_template(hook, colors, image=wallpaper)
+                if command is None:
+                    continue
+            try:
+                subprocess.Popen(["sh", "-c", command], stdout=subprocess.DEVNULL,
+                                 stderr=subprocess.DEVNULL, start_new_session=True)
+            except OSError:
+                pass
+
+    @staticmethod
+    def _reload_css():
+        # Вместо post_hook matugen (fabric-cli exec ... app.set_css()): мы и есть оболочка
+        import __main__
+        app = getattr(__main__, "app", None)
+        if app is not None and hasattr(app, "set_css"):
+            app.set_css()
+        return False
+
+    # ----------------------
+    # Конфигурация matugen
+    # ----------------------
+    def _config_files(self):
+        return [self.MATUGEN_CONFIG, self.BUNDLED_CONFIG, *(src for src, _dest in self._templates.values())]
+
+    def _stamp(self):
+        stamp = []
+        for path in self._config_files():
+            try:
+                st = os.stat(path)
+                stamp.append((str(path), st.st_mtime_ns, st.st_size))
+            except OSError:
+                stamp.append((str(path), None, None))
+        return stamp
+
+    def _refresh_config(self):
+        """Перечитывает конфиг matugen, если он или входные шаблоны изменились.
+
+        Вызывается перед каждым заданием: это несколько stat(), а правки
+        пользователя подхватываются без перезапуска оболочки.
+        """
+        if self._stamp() == self._config_stamp:
+            return
+        self._templates, self._custom_colors, self._hooks = self._read_config()
+        self._config_stamp = self._stamp()
+        h = hashlib.blake2b(digest_size=8)
+        h.update(f"{self.RENDERER_VERSION}:{self.USE_BUILTIN}".encode())
+        for name, (src, dest) in sorted(self._templates.items()):
+            h.update(json.dumps([name, dest]).encode())
+            try:
+                h.update(Path(src).read_bytes())
+            except OSError:
+                h.update(b"\0")
+        h.update(json.dumps(self._custom_colors, sort_keys=True).encode())
+        self._config_digest = h.hexdigest()
+
+    def _read_config(self):
+        """Шаблоны (имя -> вход, выход), custom_colors и post_hook шаблонов из конфига matugen."""
+        for path in (self.MATUGEN_CONFIG, self.BUNDLED_CONFIG):
+            try:
+                with open(path, "rb") as f:
+                    data = tomllib.load(f)
+                break
+            except (OSError, tomllib.TOMLDecodeError):
+                continue
+        else:
+            return {}, {}, {}
+        templates = {
+            name: (os.path.expanduser(t["input_path"]), os.path.expanduser(t["output_path"]))
+            for name, t in data.get("templates", {}).items()
+            if "input_path" in t and "output_path" in t
+        }
+        hooks = {
+            name: t["post_hook"]
+            for name, t in data.get("templates", {}).items()
+            if name in templates and t.get("post_hook")
+        }
+        return templates, data.get("config", {}).get("custom_colors", {}), hooks
+
+    def _job_config(self, out_dir: Path) -> str:
+        # Без [config.wallpaper] и post_hook: обои ставит WallpaperSelector,
+        # результат шаблонов уходит в каталог кэша, а хуки запускает
+        # _run_hooks() после установки готовых файлов
+        q = json.dumps
+        lines = ["[config]", "reload_apps = false", ""]
+        for name, (src, _dest) in self._templates.items():
+            lines += [f"[templates.{q(name)}]", f"input_path = {q(src)}", f"output_path = {q(str(out_dir / name))}", ""]
+        for name, spec in self._custom_colors.items():
+            color, blend = (spec, True) if isinstance(spec, str) else (spec.get("color"), spec.get("blend", True))
+            if color:
+                lines += [f"[config.custom_colors.{q(name)}]", f"color = {q(color)}", f"blend = {str(bool(blend)).lower()}", ""]
+        return "\n".join(lines)
+
+
+def get_palette_cache() -> PaletteCache:
+    return PaletteCache()
@@ -0,0 +1,202 @@
+import mmap
+import os
+import random
+import struct
+import threading
+from typing import Dict, Iterable, Optional, Tuple
+
+
+# Ключ миниатюры — (inode, размер, mtime_ns) исходного файла: переименование
+# его не меняет, а замена файла под тем же именем — меняет
+FileKey = Tuple[int, int, int]
+
+# Заголовок манифеста и пакета: сигнатура, версия, размер миниатюр, поколение
+_HEADER = struct.Struct("<4sHHI")
+# Запись манифеста: inode, размер, mtime_ns, смещение и длина PNG в пакете
+_RECORD = struct.Struct("<QQqQI")
+_MAGIC = b"VTHM"
+_VERSION = 1
+
+
+def file_key(st: os.stat_result) -> FileKey:
+    return (st.st_ino, st.st_size, st.st_mtime_ns)
+
+
+class ThumbStore:
+    """Миниатюры в одном файле-пакете и компактный манифест к нему.
+
+    Пакет (thumbs.pack) — подряд записанные PNG, читается через mmap.
+    Манифест (index.bin) — записи по 36 байт, при открытии читается одним
+    read() в словарь; новые миниатюры дописываются в конец обоих файлов.
+    Поколение в заголовках связывает манифест с пакетом: после сбоя посреди
+    compact() несовпадающая пара просто сбрасывается. Записи удалённых
+    файлов остаются мусором до compact().
+    """
+
+    COMPACT_MIN_GARBAGE = 4 * 1024 * 1024
+
+    def __init__(self, directory: str, thumb_size: int):
+        self.directory = directory
+        self.thumb_size = thumb_size
+        self.index_path = os.path.join(directory, "index.bin")
+        self.pack_path = os.path.join(directory, "thumbs.pack")
+        self._lock = threading.Lock()
+        self._entries: Dict[FileKey, Tuple[int, int]] = {}  # ключ -> (смещение, длина)
+        self._generation = 0
+        self._pack_size = 0
+        self._map: Optional[mmap.mmap] = None
+        self._loaded = False
+
+    def _header(self) -> bytes:
+        return _HEADER.pack(_MAGIC, _VERSION, self.thumb_size, self._generation)
+
+    def load(self):
+        """Читает манифест и отображает пакет; безопасно вызывать из фонового потока."""
+        with self._lock:
+            if self._loaded:
+                return
+            self._loaded = True
+            try:
+                with open(self.index_path, "rb") as f:
+                    index = f.read()
+                with open(self.pack_path, "rb") as f:
+                    pack_header = f.read(_HEADER.size)
+                    pack_size = os.fstat(f.fileno()).st_size
+            except OSError:
+                self._reset()
+                return
+
+            if len(index) < _HEADER.size or index[:_HEADER.size] != pack_header:
+                self._reset()
+                return
+            magic, version, size, generation = _HEADER.unpack_from(index)
+            if magic != _MAGIC or version != _VERSION or size != self.thumb_size:
+                self._reset()
+                return
+
+            self._generation = generation
+            self._pack_size = pack_size
+            # Недописанная последняя запись (сбой при добавлении) отбрасывается
+            body = index[_HEADER.size:]
+            body = body[:len(body) - len(body) % _RECORD.size]
+            entries = {}
+            for ino, fsize, mtime_ns, offset, length in _RECORD.iter_unpack(body):
+                if offset + length <= pack_size:
+                    entries[(ino, fsize, mtime_ns)] = (offset, length)
+            self._entries = entries
+            self._remap()
+
+    def _reset(self):
+        # Вызывается под self._lock: пустые файлы нового поколения
+        self._generation = random.getrandbits(32)
+        self._entries = {}
+        self._close_map()
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            header = self._header()
+            for path in (self.pack_path, self.index_path):
+                tmp = f"{path}.tmp"
+                with open(tmp, "wb") as f:
+                    f.write(header)
+                os.replace(tmp, path)
+            self._pack_size = len(header)
+        except OSError:
+            self._pack_size = 0
+
+    def _close_map(self):
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+
+    def _remap(self):
+        self._close_map()
+        if self._pack_size <= _HEADER.size:
+            return
+        try:
+            with open(self.pack_path, "rb") as f:
+                self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            self._map = None
+
+    def __contains__(self, key: FileKey) -> bool:
+        return key in self._entries
+
+    def get(self, key: Optional[FileKey]) -> Optional[bytes]:
+        """PNG миниатюры или None, если её нет."""
+        if key is None:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            offset, length = entry
+            # Пакет дописан после отображения — отображаем заново
+            if self._map is None or offset + length > len(self._map):
+                self._remap()
+                if self._map is None or offset + length > len(self._map):
+                    return None
+            return self._map[offset:offset + length]
+
+    def put(self, key: Optional[FileKey], data: bytes):
+        """Дописывает миниатюру в пакет, затем запись в манифест."""
+        if key is None or not data:
+            return
+        with self._lock:
+            if not self._loaded:
+                return
+            if key in self._entries:
+                return
+            try:
+                with open(self.pack_path, "ab") as f:
+                    offset = f.tell()
+                    f.write(data)
+                with open(self.index_path, "ab") as f:
+                    f.write(_RECORD.pack(*key, offset, len(data)))
+            except OSError:
+                return
+            self._pack_size = offset + len(data)
+            self._entries[key] = (offset, len(data))
+
+    def compact(self, live: Iterable[FileKey]):
+        """Переписывает пакет без миниатюр удалённых файлов, если мусора много."""
+        live = set(live)
+        with self._lock:
+            if not self._loaded:
+                return
+            keep = {k: v for k, v in self._entries.items() if k in live}
+            used = sum(length for _, length in keep.values())
+            garbage = self._pack_size - _HEADER.size - used
+            if garbage < max(self.COMPACT_MIN_GARBAGE, used):
+                return
+            if self._map is None:
+                self._remap()
+            if self._map is None:
+                return
+
+            self._generation = random.getrandbits(32)
+            header = self._header()
+            entries, records, blobs = {}, [], [header]
+            offset = len(header)
+            for key, (old_offset, length) in keep.items():
+                blobs.append(self._map[old_offset:old_offset + length])
+                records.append(_RECORD.pack(*key, offset, length))
+                entries[key] = (offset, length)
+                offset += length
+            try:
+                # Сначала пакет, потом манифест: при сбое между ними поколения
+                # не совпадут, и load() начнёт с чистого листа
+                for path, chunks in ((self.pack_path, blobs), (self.index_path, [header, *records])):
+                    tmp = f"{path}.tmp"
+                    with open(tmp, "wb") as f:
+                        f.writelines(chunks)
+                    os.replace(tmp, path)
+            except OSError:
+                self._reset()
+                return
+            self._entries = entries
+            self._pack_size = offset
+            self._remap()
+
+    def close(self):
+        with self._lock:
+            self._close_map()
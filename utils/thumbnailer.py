@@ -0,0 +1,114 @@
+import concurrent.futures
+import functools
+import heapq
+import itertools
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from utils.image_pool import get_image_pool
+from utils.image_workers import render_thumbnail
+
+
+class Thumbnailer:
+    """Очередь миниатюр с приоритетами поверх общего пула процессов.
+
+    Декодирование упирается в CPU и под GIL в потоках не параллелится, поэтому
+    работают процессы ImagePool, по одному на ядро. Задания ждут в куче
+    (меньший приоритет — раньше), а в пул одновременно отдаётся не больше
+    двух на процесс: повторный request() с новым приоритетом (прокрутка)
+    влияет на всё, что ещё не начато. Результаты передаются в
+    on_ready(key, png | None, token) по мере готовности из служебного потока
+    пула. token — версия источника на момент запроса (например, FileKey):
+    если key уже считается для другой версии, новый запрос ждёт его
+    завершения и выполняется следом, а не теряется.
+    """
+
+    IN_FLIGHT_PER_WORKER = 2
+
+    def __init__(self, size: int, on_ready: Callable[[str, Optional[bytes], Any], None], workers: Optional[int] = None):
+        self.size = size
+        self.on_ready = on_ready
+        self._images = get_image_pool()
+        self.workers = workers or self._images.workers
+        self._lock = threading.RLock()
+        self._heap = []
+        self._pending: Dict[str, tuple] = {}  # key -> актуальная запись в куче
+        self._running: Dict[str, Tuple[Future, Any]] = {}  # key -> (future, token)
+        self._seq = itertools.count()
+
+    def request(self, key: str, source: str, priority: int = 0, token: Any = None):
+        """Ставит (или переприоритизирует) миниатюру key в очередь."""
+        with self._lock:
+            running = self._running.get(key)
+            if running is not None and running[1] == token:
+                return
+            entry = (priority, next(self._seq), key, source, token)
+            self._pending[key] = entry
+            heapq.heappush(self._heap, entry)
+            self._pump()
+
+    def cancel(self, key: str):
+        """Убирает ещё не начатое задание; устаревшая запись в куче пропускается при выборке."""
+        with self._lock:
+            self._pending.pop(key, None)
+
+    def retain(self, keys):
+        """Оставляет в очереди только keys (например, окно вокруг видимых элементов)."""
+        with self._lock:
+            for key in [k for k in self._pending if k not in keys]:
+                del self._pending[key]
+            # Заодно выбрасываем из кучи устаревшие записи (после переприоритизаций)
+            self._heap = list(self._pending.values())
+            heapq.heapify(self._heap)
+
+    def clear(self):
+        with self._lock:
+            self._pending.clear()
+            self._heap.clear()
+
+    def is_busy(self) -> bool:
+        with self._lock:
+            return bool(self._pending or self._running)
+
+    def _pump(self):
+        # Вызывается под self._lock
+        while self._heap and len(self._running) < self.workers * self.IN_FLIGHT_PER_WORKER:
+            entry = heapq.heappop(self._heap)
+            _priority, _seq, key, source, token = entry
+            if self._pending.get(key) is not entry or key in self._running:
+                # Устаревшая запись; или источник изменился, пока key считается:
+                # запись остаётся в _pending, и _on_done вернёт её в кучу
+                continue
+            del self._pending[key]
+            future = self._images.submit(render_thumbnail, source, self.size)
+            self._running[key] = (future, token)
+            future.add_done_callback(functools.partial(self._on_done, key, token))
+
+    def _on_done(self, key: str, token, future):
+        try:
+            data = future.result()
+        except Exception:
+            data = None
+        with self._lock:
+            running = self._running.get(key)
+            if running is not None and running[0] is future:
+                del self._running[key]
+            entry = self._pending.get(key)
+            if entry is not None:
+                heapq.heappush(self._heap, entry)
+            self._pump()
+        self.on_ready(key, data, token)
+
+    def shutdown(self, wait: bool = False):
+        """Снимает очередь и ещё не начатые задания; пул остаётся общим.
+
+        С wait=True ждёт завершения уже начатых миниатюр.
+        """
+        with self._lock:
+            self.clear()
+            running = [future for future, _token in self._running.values()]
+        for future in running:
+            future.cancel()
+        if wait:
+            concurrent.futures.wait(running)
@@ -0,0 +1,168 @@
+import collections
+import os
+import threading
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+from gi.repository import GLib
+
+from utils.image_pool import get_image_pool
+from utils.image_workers import render_variant
+from utils.monitor_manager import get_monitor_manager
+
+
+class WallpaperVariants:
+    """Кэш обоев, заранее подогнанных под разрешение каждого монитора.
+
+    awww при каждой смене обоев декодирует исходный файл и масштабирует его
+    под каждый выход, а 8K WebP — это секунды и сотни мегабайт в демоне.
+    Здесь то же самое делается заранее в общем пуле процессов, и resolve()
+    отдаёт для каждого монитора готовый файл его размера. Пока варианта
+    нет, используется оригинал, а вариант ставится в очередь. Имя варианта —
+    (inode, размер, mtime_ns) исходника и размер выхода, так что изменённый
+    файл получает новые варианты, а старые вытесняются по давности
+    использования при превышении MAX_BYTES.
+    """
+
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    CACHE_DIR = Path(GLib.get_user_cache_dir()) / "vidgex-shell" / "variants"
+    MAX_BYTES = 512 * 1024 * 1024
+
+    def __new__(cls, *args, **kwargs):
+        with cls._instance_lock:
+            if not cls._instance:
+                cls._instance = super().__new__(cls)
+            return cls._instance
+
+    def __init__(self):
+        if hasattr(self, '_init'): return
+        self._init = True
+        # RLock: готовый future вызывает _on_done прямо из submit() под замком
+        self._lock = threading.RLock()
+        self._pending = set()  # варианты в очереди и в работе
+        self._failed = set()   # анимированные и нечитаемые: всегда оригинал
+        self._queue = collections.deque()  # (обои, ширина, высота, вариант)
+        self._busy = False
+        self._images = get_image_pool()
+        self._monitors = get_monitor_manager()
+        self.CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        for stale in self.CACHE_DIR.glob("*.tmp"):
+            try:
+                stale.unlink()
+            except OSError:
+                pass
+
+    # ----------------------
+    # Публичный интерфейс
+    # ----------------------
+    def resolve(self, wallpaper: str) -> List[Tuple[Optional[str], str]]:
+        """Пары (выход, файл) для awww img; выход None — все мониторы с оригиналом.
+
+        Недостающие варианты ставятся в очередь и пригодятся при следующем применении.
+        """
+        outputs = []
+        missing = []
+        for name, width, height in self._outputs():
+            dest = self._variant_path(wallpaper, width, height)
+            if dest is not None and dest.exists():
+                try:
+                    os.utime(dest)  # Для вытеснения по давности использования
+                except OSError:
+                    pass
+                outputs.append((name, str(dest)))
+            else:
+                missing.append(name)
+        self.prepare([wallpaper])
+        if not outputs:
+            return [(None, wallpaper)]
+        if len(outputs) == 1 and not missing:
+            # Один монитор — без -o (и без имени-заглушки, если hyprctl не ответил)
+            return [(None, outputs[0][1])]
+        return outputs + [(name, wallpaper) for name in missing]
+
+    def prepare(self, wallpapers):
+        """Ставит в очередь варианты wallpapers для всех подключённых мониторов."""
+        sizes = {(width, height) for _name, width, height in self._outputs()}
+        with self._lock:
+            for wallpaper in wallpapers:
+                for width, height in sizes:
+                    dest = self._variant_path(wallpaper, width, height)
+                    if dest is None or dest in self._pending or dest in self._failed or dest.exists():
+                        continue
+                    self._pending.add(dest)
+                    self._queue.append((wallpaper, width, height, dest))
+            self._pump()
+
+    def shutdown(self):
+        with self._lock:
+            self._queue.clear()
+            self._pending.clear()
+
+    # ----------------------
+    # Внутреннее
+    # ----------------------
+    def _outputs(self) -> List[Tuple[str, int, int]]:
+        outputs = []
+        for monitor in self._monitors.get_monitors():
+            width, height = monitor.get("width", 0), monitor.get("height", 0)
+            if monitor.get("transform", 0) % 2:
+                # Повороты на 90/270: awww видит выход уже повёрнутым
+                width, height = height, width
+            if monitor.get("name") and width > 0 and height > 0:
+                outputs.append((monitor["name"], width, height))
+        return outputs
+
+    def _variant_path(self, wallpaper: str, width: int, height: int) -> Optional[Path]:
+        try:
+            st = os.stat(wallpaper)
+        except OSError:
+            return None
+        return self.CACHE_DIR / f"{st.st_ino}-{st.st_size}-{st.st_mtime_ns}-{width}x{height}.png"
+
+    def _pump(self):
+        # Вызывается под self._lock. По одному варианту: это фоновая работа,
+        # а не интерактивная, и процессы пула нужнее миниатюрам
+        if self._busy or not self._queue:
+            return
+        wallpaper, width, height, dest = self._queue.popleft()
+        self._busy = True
+        future = self._images.submit(render_variant, wallpaper, width, height, str(dest))
+        future.add_done_callback(lambda f, dest=dest: self._on_done(dest, f))
+
+    def _on_done(self, dest: Path, future):
+        try:
+            ok = future.result()
+        except Exception:
+            ok = False
+        with self._lock:
+            self._busy = False
+            self._pending.discard(dest)
+            if not ok:
+                self._failed.add(dest)
+            self._pump()
+        if ok:
+            self._prune()
+
+    def _prune(self):
+        try:
+            entries = [(e.stat(), e.path) for e in os.scandir(self.CACHE_DIR) if e.name.endswith(".png")]
+        except OSError:
+            return
+        total = sum(st.st_size for st, _path in entries)
+        if total <= self.MAX_BYTES:
+            return
+        entries.sort(key=lambda e: e[0].st_mtime)
+        for st, path in entries:
+            if total <= self.MAX_BYTES:
+                break
+            try:
+                os.unlink(path)
+                total -= st.st_size
+            except OSError:
+                pass
+
+
+def get_wallpaper_variants() -> WallpaperVariants:
+    return WallpaperVariants()
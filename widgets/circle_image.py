@@ -3,12 +3,199 @@ from fabric.widgets.widget import Widget
 
 import gi
 gi.require_version("Gtk", "3.0")
-from gi.repository import GLib, Gdk, GdkPixbuf, Gtk
+from gi.repository import GLib, Gdk, GdkPixbuf, Gio, Gtk
 
+import collections
 import math
+import os
 import cairo
 import threading
-from typing import Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+
+
+def crop_square(pixbuf: GdkPixbuf.Pixbuf, target_size: int) -> GdkPixbuf.Pixbuf:
+    """Квадрат из центра изображения, масштабированный до target_size."""
+    width, height = pixbuf.get_width(), pixbuf.get_height()
+
+    # Если изображение уже нужного размера и квадратное
+    if width == height and width == target_size:
+        return pixbuf
+
+    # Если изображение не квадратное, обрезаем до квадрата
+    if width != height:
+        square_size = min(width, height)
+        x_offset = (width - square_size) // 2
+        y_offset = (height - square_size) // 2
+        pixbuf = pixbuf.new_subpixbuf(x_offset, y_offset, square_size, square_size)
+        width = height = square_size
+
+    # Масштабируем до целевого размера если нужно
+    if width != target_size:
+        # Используем лучшее качество при уменьшении, быстрее при увеличении
+        interp_type = (GdkPixbuf.InterpType.HYPER if target_size < width
+                       else GdkPixbuf.InterpType.BILINEAR)
+        pixbuf = pixbuf.scale_simple(target_size, target_size, interp_type)
+
+    return pixbuf
+
+
+def circle_surface(pixbuf: GdkPixbuf.Pixbuf, pixel_size: int, angle: int = 0) -> cairo.ImageSurface:
+    """Круглая поверхность pixel_size x pixel_size в пикселях устройства."""
+    surface = cairo.ImageSurface(cairo.FORMAT_ARGB32, pixel_size, pixel_size)
+    ctx = cairo.Context(surface)
+    ctx.arc(pixel_size / 2, pixel_size / 2, pixel_size / 2, 0, 2 * math.pi)
+    ctx.clip()
+    if angle:
+        ctx.translate(pixel_size / 2, pixel_size / 2)
+        ctx.rotate(angle * math.pi / 180.0)
+        ctx.translate(-pixel_size / 2, -pixel_size / 2)
+    Gdk.cairo_set_source_pixbuf(ctx, pixbuf, 0, 0)
+    ctx.paint()
+    return surface
+
+
+def decode_square(path: str, pixel_size: int) -> GdkPixbuf.Pixbuf:
+    """Декодирует файл сразу в размер, достаточный для квадрата pixel_size.
+
+    Размеры читаются из заголовка (get_file_info), и new_from_file_at_scale
+    распаковывает 4K-обои сразу в ~pixel_size по меньшей стороне, без
+    полноразмерного пиксбуфа в памяти.
+    """
+    fmt, width, height = GdkPixbuf.Pixbuf.get_file_info(path)
+    if fmt is not None and width > 0 and height > 0:
+        scale = pixel_size / min(width, height)
+        if scale < 1:
+            pixbuf = GdkPixbuf.Pixbuf.new_from_file_at_scale(
+                path, max(1, round(width * scale)), max(1, round(height * scale)), True
+            )
+            return crop_square(pixbuf, pixel_size)
+    return crop_square(GdkPixbuf.Pixbuf.new_from_file(path), pixel_size)
+
+
+class DecodedImage:
+    """Готовый к отрисовке результат: квадратный пиксбуф и круглая поверхность без поворота."""
+
+    __slots__ = ("pixbuf", "surface")
+
+    def __init__(self, pixbuf: GdkPixbuf.Pixbuf, surface: cairo.ImageSurface):
+        self.pixbuf = pixbuf
+        self.surface = surface
+
+
+class DecodedImageCache:
+    """Общий для процесса кэш декодированных изображений CircleImage.
+
+    Ключ — (путь, mtime_ns, размер, масштаб экрана): все обложки с одними
+    обоями получают один и тот же DecodedImage, а одновременные запросы
+    одного ключа ждут одно декодирование. Для отслеживания файла (watch)
+    на каждый путь заводится один Gio.FileMonitor, и серия событий от
+    одной замены файла сливается в одно уведомление подписчиков.
+    """
+
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    MAX_ENTRIES = 16
+    CHANGE_DELAY_MS = 150
+
+    def __new__(cls, *args, **kwargs):
+        with cls._instance_lock:
+            if not cls._instance:
+                cls._instance = super().__new__(cls)
+            return cls._instance
+
+    def __init__(self):
+        if hasattr(self, '_init'): return
+        self._init = True
+        self._lock = threading.Lock()
+        self._entries = collections.OrderedDict()  # ключ -> DecodedImage
+        self._inflight: Dict[tuple, List[Callable]] = {}
+        self._executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="circle-image")
+        self._watches: Dict[str, list] = {}  # путь -> [монитор, подписчики, id таймера]
+
+    def request(self, path: str, size: int, scale: int, callback: Callable[[Optional[DecodedImage]], None]):
+        """Вызывает callback(DecodedImage | None) в главном потоке."""
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            GLib.idle_add(callback, None)
+            return
+        key = (path, mtime, size, scale)
+        with self._lock:
+            image = self._entries.get(key)
+            if image is not None:
+                self._entries.move_to_end(key)
+                GLib.idle_add(callback, image)
+                return
+            waiting = self._inflight.get(key)
+            if waiting is not None:
+                waiting.append(callback)
+                return
+            self._inflight[key] = [callback]
+        self._executor.submit(self._decode, key)
+
+    def _decode(self, key):
+        path, _mtime, size, scale = key
+        pixel_size = size * scale
+        try:
+            pixbuf = decode_square(path, pixel_size)
+            image = DecodedImage(pixbuf, circle_surface(pixbuf, pixel_size))
+        except Exception:
+            image = None
+        with self._lock:
+            callbacks = self._inflight.pop(key, [])
+            if image is not None:
+                self._entries[key] = image
+                while len(self._entries) > self.MAX_ENTRIES:
+                    self._entries.popitem(last=False)
+        for callback in callbacks:
+            GLib.idle_add(callback, image)
+
+    def watch(self, path: str, callback: Callable[[], None]):
+        """Подписывает callback() на изменения path (общий монитор на путь)."""
+        watch = self._watches.get(path)
+        if watch is None:
+            monitor = Gio.File.new_for_path(path).monitor_file(Gio.FileMonitorFlags.NONE, None)
+            monitor.connect("changed", self._on_file_changed, path)
+            watch = self._watches[path] = [monitor, [], 0]
+        watch[1].append(callback)
+
+    def unwatch(self, path: str, callback: Callable[[], None]):
+        watch = self._watches.get(path)
+        if watch is None or callback not in watch[1]:
+            return
+        watch[1].remove(callback)
+        if not watch[1]:
+            monitor, _callbacks, timeout_id = self._watches.pop(path)
+            if timeout_id:
+                GLib.source_remove(timeout_id)
+            monitor.cancel()
+
+    def _on_file_changed(self, monitor, file, other_file, event, path):
+        watch = self._watches.get(path)
+        if watch is None:
+            return
+        if watch[2]:
+            GLib.source_remove(watch[2])
+        watch[2] = GLib.timeout_add(self.CHANGE_DELAY_MS, self._notify_watchers, path)
+
+    def _notify_watchers(self, path):
+        watch = self._watches.get(path)
+        if watch is None:
+            return False
+        watch[2] = 0
+        # Старые версии файла больше никому не понадобятся
+        with self._lock:
+            for key in [k for k in self._entries if k[0] == path]:
+                del self._entries[key]
+        for callback in list(watch[1]):
+            callback()
+        return False
+
+
+def get_decoded_image_cache() -> DecodedImageCache:
+    return DecodedImageCache()
 
 
 class CircleImage(Gtk.DrawingArea, Widget):
@@ -46,248 +233,206 @@ class CircleImage(Gtk.DrawingArea, Widget):
             size=size,
             **kwargs,
         )
-        
+
         self._default_size = size if size is not None else 100
         self._current_size = self._default_size
         self._angle = 0
-        
-        # Основные ресурсы
+
+        # Основные ресурсы. Файлы декодирует общий DecodedImageCache,
+        # _orig_image хранится только для изображений из пиксбуфа
+        self._image_file: Optional[str] = None
         self._orig_image: Optional[GdkPixbuf.Pixbuf] = None
         self._processed_image: Optional[GdkPixbuf.Pixbuf] = None
+        self._shared_surface: Optional[cairo.ImageSurface] = None
         self._cached_surface: Optional[cairo.ImageSurface] = None
-        
+
         # Блокировки для thread-safe операций
         self._image_lock = threading.RLock()
         self._draw_lock = threading.RLock()
-        
-        # Флаги состояния
-        self._loading = False
-        self._size_requested = False
-        
+
+        # Номер последнего запроса: результаты устаревших отбрасываются
+        self._request_seq = 0
+
         # Устанавливаем минимальный размер
         self.set_size_request(self._default_size, self._default_size)
-        
+
         # Обработчики событий
         self.connect("draw", self.on_draw)
         self.connect("size-allocate", self._on_size_allocate)
-        
+        self.connect("notify::scale-factor", lambda *_: self._reload_image())
+
         # Загружаем изображение если предоставлено
         if image_file:
             self.load_image_from_file_async(image_file)
         elif pixbuf:
             self.set_image_from_pixbuf(pixbuf)
-    
+
     def _on_size_allocate(self, widget: Gtk.Widget, allocation: Gdk.Rectangle):
         """Обработчик изменения размера виджета"""
         new_size = min(allocation.width, allocation.height)
         if new_size > 0 and new_size != self._current_size:
             self._current_size = new_size
             # Пересчитываем изображение только если размер изменился
-            self._reprocess_image_async()
-    
+            self._reload_image()
+
+    def _pixel_size(self) -> int:
+        return self._current_size * self.get_scale_factor()
+
     def _process_image(self, pixbuf: GdkPixbuf.Pixbuf, target_size: int) -> GdkPixbuf.Pixbuf:
-        """Обработка изображения с кэшированием промежуточных результатов"""
-        width, height = pixbuf.get_width(), pixbuf.get_height()
-        
-        # Если изображение уже нужного размера и квадратное
-        if width == height and width == target_size:
-            return pixbuf
-        
-        # Если изображение не квадратное, обрезаем до квадрата
-        if width != height:
-            square_size = min(width, height)
-            x_offset = (width - square_size) // 2
-            y_offset = (height - square_size) // 2
-            pixbuf = pixbuf.new_subpixbuf(x_offset, y_offset, square_size, square_size)
-            width = height = square_size
-        
-        # Масштабируем до целевого размера если нужно
-        if width != target_size:
-            # Используем лучшее качество при уменьшении, быстрее при увеличении
-            interp_type = (GdkPixbuf.InterpType.HYPER if target_size < width 
-                          else GdkPixbuf.InterpType.BILINEAR)
-            pixbuf = pixbuf.scale_simple(target_size, target_size, interp_type)
-        
-        return pixbuf
-    
-    def _create_clip_path(self, size: int, dpi: float = 1.0) -> cairo.Path:
-        """Создание пути клипа без кэширования - для упрощения"""
-        surface = cairo.ImageSurface(cairo.FORMAT_ARGB32, 1, 1)
-        ctx = cairo.Context(surface)
-        ctx.scale(dpi, dpi)
-        ctx.arc(size / 2, size / 2, size / 2, 0, 2 * math.pi)
-        return ctx.copy_path()
-    
+        """Обрезка до квадрата и масштабирование (в пикселях устройства)"""
+        return crop_square(pixbuf, target_size)
+
     def _create_cached_surface(self) -> Optional[cairo.ImageSurface]:
         """Создание кэшированной поверхности для отрисовки"""
         with self._image_lock:
             if not self._processed_image:
                 return None
-            
+
+            # Без поворота подходит общая поверхность из DecodedImageCache
+            if self._angle == 0 and self._shared_surface is not None:
+                return self._shared_surface
             try:
-                # Создаем поверхность с учетом DPI экрана
-                scale = self.get_scale_factor()
-                surface_size = self._current_size * scale
-                
-                surface = cairo.ImageSurface(
-                    cairo.FORMAT_ARGB32, 
-                    surface_size, 
-                    surface_size
-                )
-                ctx = cairo.Context(surface)
-                ctx.scale(scale, scale)
-                
-                # Применяем клип
-                clip_path = self._create_clip_path(self._current_size)
-                ctx.append_path(clip_path)
-                ctx.clip()
-                
-                # Применяем вращение
-                ctx.translate(self._current_size / 2, self._current_size / 2)
-                ctx.rotate(self._angle * math.pi / 180.0)
-                ctx.translate(-self._current_size / 2, -self._current_size / 2)
-                
-                # Рисуем изображение
-                Gdk.cairo_set_source_pixbuf(ctx, self._processed_image, 0, 0)
-                ctx.paint()
-                
-                return surface
+                return circle_surface(self._processed_image, self._pixel_size(), self._angle)
             except Exception:
                 return None
-    
+
     def on_draw(self, widget: "CircleImage", ctx: cairo.Context):
         """Отрисовка виджета"""
         with self._draw_lock:
             if not self._processed_image:
                 return
-            
+
             # Используем кэшированную поверхность если есть
             if self._cached_surface is None:
                 self._cached_surface = self._create_cached_surface()
-            
+
             if self._cached_surface:
-                # Масштабируем с учетом DPI
+                # Поверхность в пикселях устройства
                 scale = self.get_scale_factor()
                 ctx.scale(1/scale, 1/scale)
                 ctx.set_source_surface(self._cached_surface, 0, 0)
                 ctx.paint()
-    
+
     def load_image_from_file_async(self, image_file: str):
-        """Асинхронная загрузка изображения из файла"""
-        if self._loading:
-            return
-        
-        self._loading = True
-        
-        def load_task():
-            try:
-                # Проверяем существование файла
-                import os
-                if not os.path.isfile(image_file):
-                    GLib.idle_add(self._on_image_load_error, image_file)
-                    return
-                
-                # Загружаем в фоновом потоке
-                pixbuf = GdkPixbuf.Pixbuf.new_from_file(image_file)
-                GLib.idle_add(self._on_image_loaded, pixbuf)
-                
-            except Exception as e:
-                GLib.idle_add(self._on_image_load_error, str(e))
-            finally:
-                self._loading = False
-        
-        thread = threading.Thread(target=load_task, daemon=True)
-        thread.start()
-    
-    def _on_image_loaded(self, pixbuf: GdkPixbuf.Pixbuf):
-        """Обработка загруженного изображения в главном потоке"""
+        """Асинхронная загрузка изображения из файла (сразу в нужном размере)"""
+        self._image_file = image_file
+        self._orig_image = None
+        self._request_file()
+
+    def _request_file(self):
+        self._request_seq += 1
+        seq = self._request_seq
+        get_decoded_image_cache().request(
+            self._image_file,
+            self._current_size,
+            self.get_scale_factor(),
+            lambda image: self._on_image_decoded(seq, image),
+        )
+
+    def _on_image_decoded(self, seq: int, image: Optional[DecodedImage]):
+        """Результат DecodedImageCache в главном потоке"""
+        if seq != self._request_seq:
+            return False
+        if image is None:
+            self._on_image_load_error(self._image_file)
+            return False
         with self._image_lock:
-            # Освобождаем старые ресурсы
-            if self._orig_image:
-                self._orig_image = None
-            
-            self._orig_image = pixbuf
-            self._processed_image = self._process_image(pixbuf, self._current_size)
+            self._processed_image = image.pixbuf
+            self._shared_surface = image.surface
             self._cached_surface = None  # Инвалидируем кэш
-        
+
         self.queue_draw()
-    
+        return False
+
     def _on_image_load_error(self, error_info):
         """Обработка ошибки загрузки"""
         print(f"Error loading image: {error_info}")
-    
+
     def set_image_from_file(self, image_file: str):
-        """Синхронная установка изображения из файла"""
+        """Установка изображения из файла (декодируется в фоне)"""
         self.load_image_from_file_async(image_file)
-    
+
     def set_image_from_pixbuf(self, pixbuf: GdkPixbuf.Pixbuf):
         """Установка изображения из пиксбуфера"""
+        self._request_seq += 1  # Ещё не готовый файл больше не нужен
         with self._image_lock:
-            # Освобождаем старые ресурсы
-            if self._orig_image:
-                self._orig_image = None
-            
+            self._image_file = None
             self._orig_image = pixbuf
-            self._processed_image = self._process_image(pixbuf, self._current_size)
+            self._processed_image = self._process_image(pixbuf, self._pixel_size())
+            self._shared_surface = None
             self._cached_surface = None  # Инвалидируем кэш
-        
+
         self.queue_draw()
-    
+
     def set_image_size(self, size: int):
         """Установка размера изображения"""
         if size <= 0 or size == self._current_size:
             return
-        
+
         self._current_size = size
         self.set_size_request(size, size)
-        self._reprocess_image_async()
-    
+        self._reload_image()
+
+    def _reload_image(self):
+        """Пересчёт под новый размер или масштаб экрана"""
+        if self._image_file:
+            self._request_file()
+        elif self._orig_image:
+            self._reprocess_image_async()
+
     def _reprocess_image_async(self):
         """Асинхронный пересчет изображения"""
         def reprocess_task():
             with self._image_lock:
                 if self._orig_image:
                     self._processed_image = self._process_image(
-                        self._orig_image, 
-                        self._current_size
+                        self._orig_image,
+                        self._pixel_size()
                     )
+                    self._shared_surface = None
                     self._cached_surface = None
                     GLib.idle_add(self.queue_draw)
-        
+
         thread = threading.Thread(target=reprocess_task, daemon=True)
         thread.start()
-    
+
     def get_pixbuf(self) -> Optional[GdkPixbuf.Pixbuf]:
         """Получить текущий пиксбуфер"""
         with self._image_lock:
             return self._processed_image
-    
+
     def clear_image(self):
         """Очистить изображение"""
+        self._request_seq += 1
         with self._image_lock:
+            self._image_file = None
             self._orig_image = None
             self._processed_image = None
+            self._shared_surface = None
             self._cached_surface = None
-        
+
         self.queue_draw()
-    
+
     def do_get_request_mode(self) -> Gtk.SizeRequestMode:
         """Запрос режима измерения размера"""
         return Gtk.SizeRequestMode.CONSTANT_SIZE
-    
+
     def do_get_preferred_width(self) -> Tuple[int, int]:
         """Предпочтительная ширина"""
         size = self._current_size
         return (size, size)
-    
+
     def do_get_preferred_height(self) -> Tuple[int, int]:
         """Предпочтительная высота"""
         size = self._current_size
         return (size, size)
-    
+
     def cleanup(self):
         """Очистка ресурсов"""
+        self._request_seq += 1
         with self._image_lock:
+            self._image_file = None
             self._orig_image = None
             self._processed_image = None
-            self._cached_surface = None
\ No newline at end of file
+            self._shared_surface = None
+            self._cached_surface = None
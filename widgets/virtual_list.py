@@ -0,0 +1,206 @@
+from fabric.widgets.box import Box
+from fabric.widgets.eventbox import EventBox
+
+import gi
+gi.require_version("Gtk", "3.0")
+from gi.repository import Gdk, GLib, Gtk
+
+from typing import Any, Callable, List, Optional
+
+
+class VirtualList(Box):
+    """Список с переиспользуемыми строками.
+
+    Виджеты создаются только под видимую область (пул фиксированного размера),
+    а прокрутка и выбор — это арифметика индексов: строка пула `i` показывает
+    элемент `top + i` модели, которой может быть обычный Python-список.
+    """
+
+    def __init__(
+        self,
+        row_height: int,
+        create_row: Callable[[], Gtk.Widget],
+        bind_row: Callable[[Gtk.Widget, Any, int], None],
+        spacing: int = 4,
+        **kwargs,
+    ):
+        super().__init__(orientation="h", **kwargs)
+        self.row_height = row_height
+        self.row_spacing = spacing
+        self._create_row = create_row
+        self._bind_row = bind_row
+
+        self.items: List[Any] = []
+        self.rows: List[Gtk.Widget] = []
+        self.top = 0
+        self.selected_index = -1
+        self._scroll_accum = 0.0
+        self._resize_id = 0
+        self._syncing = False
+
+        self.adjustment = Gtk.Adjustment(
+            value=0, lower=0, upper=0, step_increment=1, page_increment=1, page_size=1
+        )
+        self.adjustment.connect("value-changed", self._on_adjustment_changed)
+
+        self.rows_box = Box(orientation="v", spacing=spacing, v_align="start", h_expand=True)
+        self.event_box = EventBox(h_expand=True, v_expand=True)
+        self.event_box.add_events(Gdk.EventMask.SCROLL_MASK | Gdk.EventMask.SMOOTH_SCROLL_MASK)
+        self.event_box.add(self.rows_box)
+        self.event_box.connect("scroll-event", self._on_scroll)
+        self.event_box.connect("size-allocate", self._on_size_allocate)
+
+        self.scrollbar = Gtk.Scrollbar(orientation=Gtk.Orientation.VERTICAL, adjustment=self.adjustment)
+        self.scrollbar.set_no_show_all(True)
+
+        self.add(self.event_box)
+        self.add(self.scrollbar)
+
+    # ----------------------
+    # Модель
+    # ----------------------
+    def set_items(self, items: List[Any], selected: int = -1):
+        self.items = items
+        self.top = 0
+        self.selected_index = min(selected, len(items) - 1)
+        self.refresh()
+        if self.selected_index >= 0:
+            self._scroll_into_view(self.selected_index)
+
+    def refresh(self):
+        """Перепривязывает строки пула к текущему окну модели."""
+        total = len(self.items)
+        visible = len(self.rows)
+        self.top = max(0, min(self.top, total - visible))
+
+        for i, row in enumerate(self.rows):
+            index = self.top + i
+            style = row.get_style_context()
+            if index < total:
+                row.virtual_index = index
+                self._bind_row(row, self.items[index], index)
+                if index == self.selected_index:
+                    style.add_class("selected")
+                else:
+                    style.remove_class("selected")
+                row.show()
+            else:
+                row.virtual_index = -1
+                style.remove_class("selected")
+                row.hide()
+
+        self._sync_adjustment()
+
+    def _sync_adjustment(self):
+        total = len(self.items)
+        page = max(1, len(self.rows))
+        self._syncing = True
+        try:
+            self.adjustment.configure(self.top, 0, max(total, page), 1, page, page)
+        finally:
+            self._syncing = False
+        self.scrollbar.set_visible(total > len(self.rows))
+
+    # ----------------------
+    # Пул строк
+    # ----------------------
+    def _on_size_allocate(self, widget, allocation):
+        count = max(1, (allocation.height + self.row_spacing) // (self.row_height + self.row_spacing))
+        if count != len(self.rows) and not self._resize_id:
+            # Менять дерево виджетов внутри size-allocate нельзя — откладываем
+            self._resize_id = GLib.idle_add(self._resize_pool, count)
+
+    def _resize_pool(self, count: int):
+        self._resize_id = 0
+        while len(self.rows) < count:
+            row = self._create_row()
+            row.virtual_index = -1
+            row.set_size_request(-1, self.row_height)
+            self.rows_box.add(row)
+            self.rows.append(row)
+        while len(self.rows) > count:
+            self.rows.pop().destroy()
+        self.refresh()
+        return False
+
+    def row_for_index(self, index: int) -> Optional[Gtk.Widget]:
+        offset = index - self.top
+        if 0 <= offset < len(self.rows):
+            return self.rows[offset]
+        return None
+
+    # ----------------------
+    # Прокрутка
+    # ----------------------
+    def scroll_to(self, top: int):
+        top = max(0, min(top, len(self.items) - len(self.rows)))
+        if top != self.top:
+            self.top = top
+            self.refresh()
+
+    def _on_adjustment_changed(self, adjustment):
+        if not self._syncing:
+            self.scroll_to(int(round(adjustment.get_value())))
+
+    def _on_scroll(self, widget, event):
+        if event.direction == Gdk.ScrollDirection.UP:
+            step = -1
+        elif event.direction == Gdk.ScrollDirection.DOWN:
+            step = 1
+        elif event.direction == Gdk.ScrollDirection.SMOOTH:
+            self._scroll_accum += event.get_scroll_deltas()[2]
+            step = int(self._scroll_accum)
+            self._scroll_accum -= step
+        else:
+            return False
+        if step:
+            self.scroll_to(self.top + step)
+        return True
+
+    def _scroll_into_view(self, index: int):
+        if index < self.top:
+            self.scroll_to(index)
+        elif index >= self.top + len(self.rows):
+            self.scroll_to(index - len(self.rows) + 1)
+
+    # ----------------------
+    # Выбор
+    # ----------------------
+    def select(self, index: int):
+        total = len(self.items)
+        if not total:
+            self.selected_index = -1
+            return
+
+        index = max(0, min(index, total - 1))
+        old = self.row_for_index(self.selected_index)
+        if old is not None:
+            old.get_style_context().remove_class("selected")
+
+        self.selected_index = index
+        self._scroll_into_view(index)
+        row = self.row_for_index(index)
+        if row is not None:
+            row.get_style_context().add_class("selected")
+
+    def move_selection(self, step: int, wrap: bool = False):
+        total = len(self.items)
+        if not total:
+            return
+        if wrap:
+            self.select((self.selected_index + step) % total)
+        else:
+            self.select(self.selected_index + step)
+
+    def selected_item(self) -> Optional[Any]:
+        if 0 <= self.selected_index < len(self.items):
+            return self.items[self.selected_index]
+        return None
+
+    def destroy(self):
+        if self._resize_id:
+            GLib.source_remove(self._resize_id)
+            self._resize_id = 0
+        self.items = []
+        self.rows = []
+        super().destroy()